@@ -1,10 +1,12 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from aanvraagapp.routers import auth_router, home_router, client_router, provider_router
 from aanvraagapp.config import settings
+from aanvraagapp.lifecycle import resources
 
 
 # Configure logging to output to stdout/stderr for Docker
@@ -16,7 +18,13 @@ logging.basicConfig(
     ]
 )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with resources():
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
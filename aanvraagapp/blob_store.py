@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Iterator
+
+import zstandard
+from sqlalchemy import select, text, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aanvraagapp import models
+from aanvraagapp.config import StorageSettings, settings
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+@dataclass
+class BlobStoreStats:
+    writes: int = 0
+    deduplicated: int = 0
+    reads: int = 0
+    bytes_written: int = 0
+
+
+class BlobStore:
+    """
+    Content-addressed store for large texts like raw and cleaned HTML.
+
+    A text is stored once, zstd compressed, in a file named after the sha256
+    digest of the text, sharded over two levels of directories
+    (ab/cd/abcd...). Storing the same text again, e.g. an unchanged page on a
+    re-crawl or the same url for two owners, only returns the digest. Files
+    are written atomically and read through mmap.
+    """
+
+    def __init__(self, config: StorageSettings):
+        self.root = Path(config.blob_dir)
+        self.compression_level = config.compression_level
+        self.stats = BlobStoreStats()
+
+    @staticmethod
+    def digest(content: str) -> str:
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, content: str) -> str:
+        """Store the text and return its digest."""
+        digest = self.digest(content)
+        path = self.path(digest)
+        try:
+            # Mark the blob as in use again, see collect_garbage. Unlike
+            # touch(), utime never creates an empty file when the garbage
+            # collection just removed the blob.
+            os.utime(path)
+            self.stats.deduplicated += 1
+            return digest
+        except FileNotFoundError:
+            pass
+
+        data = zstandard.compress(content.encode(), self.compression_level)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file in the same directory and rename it, so
+        # a reader never sees a partial blob.
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.stats.writes += 1
+        self.stats.bytes_written += len(data)
+        return digest
+
+    def get(self, digest: str) -> str:
+        with open(self.path(digest), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self.stats.reads += 1
+            return zstandard.decompress(data).decode()
+
+    def delete(self, digest: str) -> None:
+        self.path(digest).unlink(missing_ok=True)
+
+    def blobs(self) -> Iterator[tuple[str, float]]:
+        """The digest and modification time of every stored blob."""
+        for path in self.root.glob("??/??/*"):
+            if not path.name.startswith(".tmp-"):
+                yield path.name, path.stat().st_mtime
+
+    async def aput(self, content: str) -> str:
+        return await asyncio.to_thread(self.put, content)
+
+    async def aget(self, digest: str) -> str:
+        return await asyncio.to_thread(self.get, digest)
+
+    async def aget_optional(self, digest: str | None) -> str | None:
+        return await self.aget(digest) if digest is not None else None
+
+    def log_stats(self) -> None:
+        logger.info(f"Blob store stats: {asdict(self.stats)}")
+
+
+blob_store = BlobStore(settings.storage)
+
+
+async def collect_garbage(session: AsyncSession, store: BlobStore = blob_store) -> int:
+    """
+    Delete the blobs no webpage refers to, and return how many. Blobs that
+    were stored or reused within the grace period are kept, since the
+    webpage referring to them may not be committed yet.
+    """
+    result = await session.execute(
+        union(
+            select(models.Webpage.original_content_digest),
+            select(models.Webpage.filtered_content_digest),
+        )
+    )
+    referenced = {digest for digest in result.scalars().all() if digest is not None}
+    cutoff = time.time() - settings.storage.gc_grace_seconds
+
+    def sweep() -> int:
+        removed = 0
+        for digest, modified_at in list(store.blobs()):
+            if digest not in referenced and modified_at < cutoff:
+                store.delete(digest)
+                removed += 1
+        return removed
+
+    removed = await asyncio.to_thread(sweep)
+    logger.info(f"Removed {removed} unreferenced blobs, {len(referenced)} in use")
+    return removed
+
+
+def decode_legacy_content(value: str | bytes) -> str:
+    """Text from the old webpage columns, either plain text or zstd compressed bytes."""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(ZSTD_MAGIC):
+        return zstandard.decompress(value).decode()
+    return value.decode()
+
+
+LEGACY_COLUMNS = {
+    "original_content": "original_content_digest",
+    "filtered_content": "filtered_content_digest",
+}
+
+
+async def migrate_webpage_content(
+    session: AsyncSession, batch_size: int = 100, store: BlobStore = blob_store
+) -> int:
+    """
+    Move the raw and cleaned HTML that is still in the webpage table into the
+    blob store, keep only their digests, and drop the old columns. Returns
+    the number of values moved; running it again is a no-op.
+    """
+    result = await session.execute(
+        text("SELECT column_name FROM information_schema.columns WHERE table_name = 'webpage'")
+    )
+    columns = set(result.scalars().all())
+
+    moved = 0
+    for column, digest_column in LEGACY_COLUMNS.items():
+        await session.execute(text(f"ALTER TABLE webpage ADD COLUMN IF NOT EXISTS {digest_column} VARCHAR"))
+        await session.execute(
+            text(f"CREATE INDEX IF NOT EXISTS ix_webpage_{digest_column} ON webpage ({digest_column})")
+        )
+        if column not in columns:
+            continue
+
+        last_id = 0
+        while True:
+            # Page by id, so memory stays bounded by the batch size.
+            result = await session.execute(
+                text(
+                    f"SELECT id, {column} FROM webpage WHERE {column} IS NOT NULL AND id > :last_id "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            rows = result.all()
+            if not rows:
+                break
+            updates = [
+                {"id": row_id, "digest": await store.aput(decode_legacy_content(value))}
+                for row_id, value in rows
+            ]
+            await session.execute(
+                text(f"UPDATE webpage SET {digest_column} = :digest WHERE id = :id"), updates
+            )
+            moved += len(rows)
+            last_id = rows[-1][0]
+            logger.info(f"Moved {moved} values of webpage.{column} to the blob store")
+
+        await session.execute(text(f"ALTER TABLE webpage DROP COLUMN {column}"))
+
+    await session.commit()
+    store.log_stats()
+    return moved
@@ -1,12 +1,27 @@
 import asyncio
+from pathlib import Path
 import click
 import numpy as np
-from sqlalchemy import select, text
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from aanvraagapp.blob_store import collect_garbage, migrate_webpage_content
 from aanvraagapp.database import async_session_maker
-from aanvraagapp.models import Listing, Client, Chunk, Webpage, ChunkOwnerType, WebpageOwnerType
-from aanvraagapp.parsing.ai import create_ai_client
+from aanvraagapp.lifecycle import resources
+from aanvraagapp.models import Listing, Client, Chunk, Webpage, WebpageOwnerType, Provider, webpage_chunk_association
+from aanvraagapp.parsing.ai_client import get_client
+from aanvraagapp.parsing.backfill import backfill_chunks
+from aanvraagapp.parsing.boilerplate import learn_provider_boilerplate
+from aanvraagapp.parsing.retrieval import enable_iterative_index_scan, rank_chunks_by_similarity
+from aanvraagapp.parsing.router import ai_router
+from aanvraagapp.types import AIProvider
+from aanvraagapp.parsing.batch import (
+    BatchBackend,
+    GeminiBatchBackend,
+    LocalBatchBackend,
+    batch_extract_listing_field_data,
+    batch_score_client_listing_matches,
+)
 
 
 @click.group()
@@ -30,11 +45,10 @@ def search_listing(listing_url: str, query: str, limit: int):
 
 async def _search_listing_async(listing_url: str, query: str, limit: int):
     """Async implementation of search_listing."""
-    async with async_session_maker() as session:
+    async with resources(), async_session_maker() as session:
         # Create embedding for the query
         click.echo(f"🔍 Creating embedding for query: '{query}'")
-        ai_client = create_ai_client("gemini")  # Use ollama by default like in existing patterns
-        query_embedding = await ai_client.embed_query(query)
+        query_embedding = await ai_router.embed_query(query)
         
         # Perform similarity search with single query filtered by listing
         await _perform_listing_similarity_search(session, listing_url, query_embedding, limit)
@@ -55,11 +69,10 @@ def search_client(client_name: str, query: str, limit: int):
 
 async def _search_client_async(client_name: str, query: str, limit: int):
     """Async implementation of search_client."""
-    async with async_session_maker() as session:
+    async with resources(), async_session_maker() as session:
         # Create embedding for the query
         click.echo(f"🔍 Creating embedding for query: '{query}'")
-        ai_client = create_ai_client("gemini")  # Use ollama by default like in existing patterns
-        query_embedding = await ai_client.embed_query(query)
+        query_embedding = await ai_router.embed_query(query)
         
         # Perform similarity search with single query filtered by client
         await _perform_client_similarity_search(session, client_name, query_embedding, limit)
@@ -74,17 +87,20 @@ async def _perform_listing_similarity_search(session: AsyncSession, listing_url:
     stmt = (
         select(
             Chunk.content,
-            Webpage.url,
+            func.array_agg(Webpage.url.distinct()).label('urls'),
             (-Chunk.emb.cosine_distance(query_vector) + 1).label('cosine_similarity')
         )
         .select_from(Chunk)
-        .join(Webpage, (Chunk.owner_id == Webpage.id) & (Chunk.owner_type == ChunkOwnerType.WEBPAGE))
+        .join(webpage_chunk_association, webpage_chunk_association.c.chunk_id == Chunk.id)
+        .join(Webpage, webpage_chunk_association.c.webpage_id == Webpage.id)
         .join(Listing, (Webpage.owner_id == Listing.id) & (Webpage.owner_type == WebpageOwnerType.LISTING))
         .where(Listing.website == listing_url)
-        .order_by(Chunk.emb.cosine_distance(query_vector).asc())
-        .limit(limit)
+        # A chunk shared by several pages of the owner is one result.
+        .group_by(Chunk.id)
     )
+    stmt = rank_chunks_by_similarity(stmt, query_embedding, limit)
     
+    await enable_iterative_index_scan(session)
     result = await session.execute(stmt)
     similar_chunks = result.fetchall()
     
@@ -104,17 +120,20 @@ async def _perform_client_similarity_search(session: AsyncSession, client_name:
     stmt = (
         select(
             Chunk.content,
-            Webpage.url,
+            func.array_agg(Webpage.url.distinct()).label('urls'),
             (-Chunk.emb.cosine_distance(query_vector) + 1).label('cosine_similarity')
         )
         .select_from(Chunk)
-        .join(Webpage, (Chunk.owner_id == Webpage.id) & (Chunk.owner_type == ChunkOwnerType.WEBPAGE))
+        .join(webpage_chunk_association, webpage_chunk_association.c.chunk_id == Chunk.id)
+        .join(Webpage, webpage_chunk_association.c.webpage_id == Webpage.id)
         .join(Client, (Webpage.owner_id == Client.id) & (Webpage.owner_type == WebpageOwnerType.CLIENT))
         .where(Client.name == client_name)
-        .order_by(Chunk.emb.cosine_distance(query_vector).asc())
-        .limit(limit)
+        # A chunk shared by several pages of the owner is one result.
+        .group_by(Chunk.id)
     )
+    stmt = rank_chunks_by_similarity(stmt, query_embedding, limit)
     
+    await enable_iterative_index_scan(session)
     result = await session.execute(stmt)
     similar_chunks = result.fetchall()
     
@@ -130,14 +149,132 @@ def _display_results(similar_chunks):
     """Display the similarity search results in a formatted way."""
     click.echo("=" * 80)
     
-    for i, (content, url, similarity) in enumerate(similar_chunks, 1):
+    for i, (content, urls, similarity) in enumerate(similar_chunks, 1):
         click.echo(f"\n{i}. Similarity: {similarity:.4f}")
-        click.echo(f"   URL: {url}")
+        click.echo(f"   URL: {', '.join(urls)}")
         click.echo(f"   Content: {content}")
         if i < len(similar_chunks):
             click.echo("-" * 40)
 
 
+def _create_batch_backend(backend: str, provider: AIProvider) -> BatchBackend:
+    if backend == 'gemini':
+        return GeminiBatchBackend()
+    return LocalBatchBackend(get_client(provider), provider)
+
+
+def _batch_options(func):
+    func = click.option('--backend', type=click.Choice(['gemini', 'local']), default='gemini',
+                        help='Run on the Gemini Batch API or locally through the interactive API (default: gemini)')(func)
+    func = click.option('--provider', type=click.Choice(['gemini', 'ollama']), default='gemini',
+                        help='AI provider whose task route the local backend runs on (default: gemini)')(func)
+    func = click.option('--work-dir', default='batch_jobs', type=click.Path(file_okay=False, path_type=Path),
+                        help='Directory for the request and result files (default: batch_jobs)')(func)
+    func = click.option('--poll-interval', default=30.0, help='Seconds between job status checks (default: 30)')(func)
+    return func
+
+
+@cli.command('batch-extract-listings')
+@_batch_options
+def batch_extract_listings(backend: str, provider: AIProvider, work_dir: Path, poll_interval: float):
+    """Re-extract the field data of all parsed listings as one batch job."""
+    asyncio.run(_batch_async(batch_extract_listing_field_data, backend, provider, work_dir, poll_interval))
+
+
+@cli.command('batch-score-matches')
+@_batch_options
+def batch_score_matches(backend: str, provider: AIProvider, work_dir: Path, poll_interval: float):
+    """Score all client and listing pairs as one batch job."""
+    asyncio.run(_batch_async(batch_score_client_listing_matches, backend, provider, work_dir, poll_interval))
+
+
+async def _batch_async(batch_job, backend: str, provider: AIProvider, work_dir: Path, poll_interval: float):
+    """Async implementation of the batch commands."""
+    async with resources(), async_session_maker() as session:
+        count = await batch_job(session, _create_batch_backend(backend, provider), work_dir, poll_interval)
+        click.echo(f"✅ Stored {count} results")
+
+
+@cli.command('learn-boilerplate')
+@click.option('--provider-id', type=int, default=None, help='Only learn the boilerplate of this provider')
+def learn_boilerplate(provider_id: int | None):
+    """Learn the page chrome that repeats across the listing pages of each provider.
+
+    The learned boilerplate is dropped from listing pages the next time they
+    are parsed.
+    """
+    asyncio.run(_learn_boilerplate_async(provider_id))
+
+
+async def _learn_boilerplate_async(provider_id: int | None):
+    """Async implementation of learn_boilerplate."""
+    async with resources(), async_session_maker() as session:
+        stmt = select(Provider)
+        if provider_id is not None:
+            stmt = stmt.where(Provider.id == provider_id)
+        providers = (await session.execute(stmt)).scalars().all()
+        for provider in providers:
+            count = await learn_provider_boilerplate(provider, session)
+            click.echo(f"✅ {provider.name}: {count} boilerplate blocks from {provider.boilerplate_pages} pages")
+        await session.commit()
+
+
+@cli.command('gc-blobs')
+def gc_blobs():
+    """Delete the stored HTML blobs that no webpage refers to anymore."""
+    asyncio.run(_gc_blobs_async())
+
+
+async def _gc_blobs_async():
+    """Async implementation of gc_blobs."""
+    async with async_session_maker() as session:
+        removed = await collect_garbage(session)
+        click.echo(f"✅ Removed {removed} unreferenced blobs")
+
+
+@cli.command('migrate-blobs')
+@click.option('--batch-size', default=100, help='Webpages moved per round trip (default: 100)')
+def migrate_blobs(batch_size: int):
+    """Move the HTML still stored in the webpage table into the blob store."""
+    asyncio.run(_migrate_blobs_async(batch_size))
+
+
+async def _migrate_blobs_async(batch_size: int):
+    """Async implementation of migrate_blobs."""
+    async with async_session_maker() as session:
+        moved = await migrate_webpage_content(session, batch_size)
+        click.echo(f"✅ Moved {moved} values to the blob store")
+
+
+@cli.command('backfill-chunks')
+@click.option('--concurrency', default=4, help='Webpages processed at the same time (default: 4)')
+@click.option('--checkpoint', default='backfill_chunks.json', type=click.Path(dir_okay=False, path_type=Path),
+              help='File with the progress, to resume from after a restart (default: backfill_chunks.json)')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint, e.g. after recreating the database, and retry failed webpages')
+@click.option('--report-interval', default=5.0, help='Seconds between progress reports (default: 5)')
+def backfill_chunks_command(concurrency: int, checkpoint: Path, restart: bool, report_interval: float):
+    """Chunk and embed every webpage that has markdown but no chunks.
+
+    Progress is checkpointed after every webpage, so running the command again
+    after a crash or interrupt resumes where it stopped.
+    """
+    asyncio.run(_backfill_chunks_async(concurrency, checkpoint, restart, report_interval))
+
+
+async def _backfill_chunks_async(concurrency: int, checkpoint: Path, restart: bool, report_interval: float):
+    """Async implementation of backfill_chunks_command."""
+    if restart:
+        checkpoint.unlink(missing_ok=True)
+    async with resources():
+        progress = await backfill_chunks(
+            async_session_maker, checkpoint, concurrency, report_interval, report=click.echo
+        )
+    if progress.errors:
+        click.echo(f"❌ {progress.errors} webpages failed, see {checkpoint}; run again with --restart to retry them")
+    else:
+        click.echo(f"✅ Backfilled the chunks of {progress.processed} webpages")
+
+
 def main():
     """Main CLI entry point."""
     cli()
@@ -4,6 +4,8 @@ from pydantic import BaseModel, Discriminator, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
 
+from aanvraagapp.types import AIProvider, AITask
+
 
 class LocalMailSettings(BaseModel):
     provider: Literal["local"]
@@ -63,6 +65,272 @@ class DeploymentDatabaseSettings(BaseModel):
 DatabaseSettings = Annotated[DeploymentDatabaseSettings | LocalDatabaseSettings, Discriminator("provider")]
 
 
+class AIClientPoolSettings(BaseModel):
+    # Connection pool limits for the long-lived HTTP clients behind the AI
+    # clients. These are shared by all requests in the process.
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    # Open a connection to each provider at startup, so the first real
+    # request does not pay for the TLS handshake.
+    warm_up: bool = True
+
+
+class FetchSettings(BaseModel):
+    # Shared HTTP client for fetching webpages.
+    max_connections: int = 50
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    # Concurrent requests per host, so a bulk re-check does not hammer one site.
+    per_host_limit: int = 4
+    timeout_seconds: float = 30.0
+    # Only used when the h2 package is installed (httpx[http2]).
+    http2: bool = True
+
+
+class CrawlSettings(BaseModel):
+    # Breadth-first crawl from the website of a listing or client. With
+    # max_depth 0 only the entry page is parsed.
+    max_depth: int = 2
+    max_pages: int = 10
+    # Pages fetched and parsed at the same time; the per host limit of the
+    # fetcher applies on top.
+    concurrency: int = 4
+    # Minimum time between the starts of two requests to the same host.
+    delay_seconds: float = 0.5
+    # "path" stays below the path of the entry page, "domain" on its host.
+    scope: Literal["path", "domain"] = "path"
+    use_sitemaps: bool = True
+    max_sitemaps: int = 5
+    respect_robots: bool = True
+
+
+class StorageSettings(BaseModel):
+    # Content-addressed store for the raw and cleaned HTML of webpages.
+    blob_dir: str = "blob_store"
+    # zstd level for the stored blobs, 1 (fast) to 22 (small).
+    compression_level: int = 9
+    # Unreferenced blobs younger than this are kept by the garbage collection.
+    gc_grace_seconds: int = 3600
+
+
+class CPUPoolSettings(BaseModel):
+    # Run CPU-heavy parsing steps in a process pool, off the event loop.
+    enabled: bool = True
+    # None uses one worker per CPU.
+    max_workers: int | None = None
+    # "spawn" starts clean workers; forking a process with a running event
+    # loop and open connections is not safe.
+    start_method: Literal["spawn", "forkserver", "fork"] = "spawn"
+    # Inputs smaller than this many characters are processed inline, since
+    # sending them to a worker costs more than processing them.
+    min_input_size: int = 20_000
+
+
+class BoilerplateSettings(BaseModel):
+    # Drop the blocks that repeat across the pages of a provider while
+    # cleaning, see parsing.boilerplate.
+    enabled: bool = True
+    # A block is boilerplate when it is on at least this many pages, and at
+    # least this share of the pages the provider has.
+    min_pages: int = 3
+    min_page_ratio: float = 0.5
+    # Shorter blocks, e.g. labels like "Laatst gecontroleerd op:", are kept.
+    min_chars: int = 40
+
+
+class MarkdownConversionSettings(BaseModel):
+    # Convert cleaned HTML to markdown with rules, and only ask the LLM to
+    # rewrite pages where the result fails the quality checks below.
+    fast_path: bool = True
+    min_chars: int = 400
+    min_headings: int = 2
+    # The <main>/<article> region must hold at least this share of the page text.
+    min_text_ratio: float = 0.2
+    max_link_density: float = 0.5
+    # Shrink the HTML that goes into the rewrite prompt, see compact_html.
+    compact_html: bool = True
+    compact_tables: bool = False
+
+
+class ChunkingSettings(BaseModel):
+    # Markdown headers up to this level (1 = "#", 2 = "##") start a new section.
+    header_levels: int = 2
+    # Long sections are split on paragraphs, then lines, sentences and words
+    # into chunks of about target_tokens, and never more than max_tokens.
+    target_tokens: int = 300
+    max_tokens: int = 500
+    # Tokens repeated from the end of a chunk at the start of the next one,
+    # when a section is split.
+    overlap_tokens: int = 40
+    # Chunks smaller than this are merged into a neighbour.
+    min_tokens: int = 50
+
+
+class ModelQuotaSettings(BaseModel):
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+class AIRateLimitSettings(BaseModel):
+    # Upper bound on concurrent requests to the provider, across all models.
+    max_in_flight: int = 32
+    # Retries on 429/503 responses, with exponential backoff that respects
+    # the Retry-After hint of the provider.
+    max_retries: int = 6
+    base_backoff_seconds: float = 1.0
+    max_backoff_seconds: float = 60.0
+    default_quota: ModelQuotaSettings = ModelQuotaSettings(
+        requests_per_minute=1000, tokens_per_minute=1_000_000
+    )
+    models: dict[str, ModelQuotaSettings] = {
+        "gemini-2.5-flash": ModelQuotaSettings(
+            requests_per_minute=1000, tokens_per_minute=1_000_000
+        ),
+        "gemini-embedding-001": ModelQuotaSettings(
+            requests_per_minute=3000, tokens_per_minute=1_000_000
+        ),
+    }
+
+
+class EmbeddingBatchSettings(BaseModel):
+    # Merge concurrent embedding requests into batched API calls.
+    enabled: bool = True
+    # How long to wait for more requests before sending a batch.
+    window_ms: float = 10.0
+    # Gemini accepts at most 100 texts per batched embed call.
+    max_batch_size: int = 100
+
+
+class ChunkEmbeddingSettings(BaseModel):
+    # Texts per embedding call when chunking a webpage, capped at
+    # EmbeddingBatchSettings.max_batch_size, the provider maximum.
+    batch_size: int = 100
+    # Embedding calls in flight at the same time, over all webpages.
+    max_concurrent_batches: int = 4
+
+
+class FakeLatencySettings(BaseModel):
+    distribution: Literal["fixed", "uniform", "lognormal"] = "lognormal"
+    median_ms: float = 0.0
+    # Uniform: latencies range over median * (1 +- spread). Lognormal: sigma.
+    spread: float = 0.5
+
+
+class FakeAISettings(BaseModel):
+    # Serve every provider with the deterministic FakeAIClient, for offline
+    # benchmarks and load tests.
+    enabled: bool = False
+    seed: int = 0
+    generate_latency: FakeLatencySettings = FakeLatencySettings()
+    embed_latency: FakeLatencySettings = FakeLatencySettings()
+    # Fraction of requests that fail with an injected error.
+    error_rate: float = 0.0
+
+
+class RetrievalSettings(BaseModel):
+    # Search the short chunk embeddings first, then rerank at full dimension.
+    two_stage: bool = True
+    # The coarse pass keeps this many candidates per requested result.
+    rerank_factor: int = 10
+    # pgvector hnsw.iterative_scan for filtered searches. The candidates are
+    # reranked anyway, so relaxed_order is enough.
+    iterative_scan: Literal["off", "strict_order", "relaxed_order"] = "relaxed_order"
+
+
+class ModelRouteSettings(BaseModel):
+    provider: AIProvider
+    model: str
+    # None leaves the model default, 0 disables thinking.
+    thinking_budget: int | None = None
+    # Context window in tokens, for backends where it is configurable.
+    context_size: int | None = None
+    # Declared price, used when a task prefers the cheapest healthy backend.
+    cost_per_million_tokens: float = 0.0
+
+
+class TaskRouteSettings(BaseModel):
+    # Candidate backends, in order of preference.
+    candidates: list[ModelRouteSettings]
+    # "order" keeps the declared order, "cost" tries the cheapest backend
+    # first and "latency" the one with the lowest recent median latency.
+    prefer: Literal["order", "cost", "latency"] = "order"
+    # A backend whose recent p95 latency is above this is considered slow.
+    max_latency_seconds: float = 60.0
+
+
+class AIRouterSettings(BaseModel):
+    # How long a backend is skipped after a failed request.
+    cooldown_seconds: float = 30.0
+    # Latencies older than this no longer count towards the health of a backend.
+    latency_window_seconds: float = 300.0
+    # Send a duplicate generate request when the first one takes longer than
+    # the recent p95 latency of the backend, and use whichever answers first.
+    # Costs extra requests on the slowest 5% of calls.
+    hedging: bool = False
+    hedge_percentile: float = 95.0
+    # Never hedge sooner than this, and only once this many latencies are known.
+    hedge_min_delay_seconds: float = 2.0
+    hedge_min_samples: int = 20
+    tasks: dict[AITask, TaskRouteSettings] = {
+        AITask.REWRITE_MARKDOWN: TaskRouteSettings(
+            candidates=[
+                # Rewriting is a transformation, thinking does not help here.
+                ModelRouteSettings(
+                    provider="gemini", model="gemini-2.5-flash", thinking_budget=0,
+                    cost_per_million_tokens=0.30,
+                ),
+                ModelRouteSettings(
+                    provider="ollama", model="reader-lm:1.5b", context_size=32768
+                ),
+            ],
+            max_latency_seconds=60.0,
+        ),
+        AITask.FIELD_EXTRACTION: TaskRouteSettings(
+            candidates=[
+                ModelRouteSettings(
+                    provider="gemini", model="gemini-2.5-flash", cost_per_million_tokens=0.30
+                ),
+                ModelRouteSettings(
+                    provider="ollama", model="gemma3:12b", context_size=16384
+                ),
+            ],
+            max_latency_seconds=45.0,
+        ),
+        AITask.MATCH_SCORING: TaskRouteSettings(
+            candidates=[
+                ModelRouteSettings(
+                    provider="gemini", model="gemini-2.5-flash", cost_per_million_tokens=0.30
+                ),
+                ModelRouteSettings(
+                    provider="ollama", model="gemma3:12b", context_size=16384
+                ),
+            ],
+            max_latency_seconds=45.0,
+        ),
+        # No fallback: embeddings of different models live in different vector
+        # spaces and can not be searched together.
+        AITask.EMBEDDING: TaskRouteSettings(
+            candidates=[
+                ModelRouteSettings(
+                    provider="gemini", model="gemini-embedding-001", cost_per_million_tokens=0.15
+                ),
+            ],
+            max_latency_seconds=10.0,
+        ),
+    }
+
+
+class AICacheSettings(BaseModel):
+    # Where cached AI responses are stored, "none" disables caching.
+    backend: Literal["redis", "postgres", "none"] = "redis"
+    ttl_seconds: int = 60 * 60 * 24 * 30
+    # Least recently used entries are evicted above this number of entries.
+    max_entries: int = 100_000
+    # Size of the in-process LRU tier in front of the embedding cache backend.
+    embedding_memory_entries: int = 50_000
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_nested_delimiter="__")
 
@@ -75,6 +343,25 @@ class Settings(BaseSettings):
     # Google
     gemini_api_key: str
 
+    # Webpage fetching
+    fetch: FetchSettings = FetchSettings()
+    crawl: CrawlSettings = CrawlSettings()
+    storage: StorageSettings = StorageSettings()
+    cpu_pool: CPUPoolSettings = CPUPoolSettings()
+    boilerplate: BoilerplateSettings = BoilerplateSettings()
+    markdown_conversion: MarkdownConversionSettings = MarkdownConversionSettings()
+    chunking: ChunkingSettings = ChunkingSettings()
+
+    # AI clients
+    ai_pool: AIClientPoolSettings = AIClientPoolSettings()
+    ai_cache: AICacheSettings = AICacheSettings()
+    ai_rate_limit: AIRateLimitSettings = AIRateLimitSettings()
+    embedding_batch: EmbeddingBatchSettings = EmbeddingBatchSettings()
+    chunk_embedding: ChunkEmbeddingSettings = ChunkEmbeddingSettings()
+    ai_fake: FakeAISettings = FakeAISettings()
+    retrieval: RetrievalSettings = RetrievalSettings()
+    ai_router: AIRouterSettings = AIRouterSettings()
+
     # Auth
     session_cookie_name: str = "session_token"
     session_expiry_hours: int = 24 * 14
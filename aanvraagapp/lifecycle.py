@@ -0,0 +1,50 @@
+import logging
+from contextlib import asynccontextmanager
+
+from aanvraagapp.blob_store import blob_store
+from aanvraagapp.parsing.ai_cache import response_cache
+from aanvraagapp.parsing.ai_client import registry as ai_client_registry
+from aanvraagapp.parsing.cpu_pool import cpu_pool
+from aanvraagapp.parsing.embed_pipeline import embedding_pipeline
+from aanvraagapp.parsing.embedding_cache import embedding_cache
+from aanvraagapp.parsing.fetch import fetcher
+from aanvraagapp.parsing.rate_limit import rate_limiter
+from aanvraagapp.parsing.router import ai_router
+from aanvraagapp.parsing.single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+
+async def startup():
+    """Create and warm up the long-lived, process-wide resources."""
+    await ai_client_registry.startup()
+    cpu_pool.startup()
+
+
+async def shutdown():
+    """Close the long-lived, process-wide resources."""
+    await ai_client_registry.shutdown()
+    await fetcher.aclose()
+    await cpu_pool.aclose()
+    await response_cache.aclose()
+    await embedding_pipeline.aclose()
+    await embedding_cache.aclose()
+    await rate_limiter.aclose()
+    await ai_router.aclose()
+    await single_flight.aclose()
+    blob_store.log_stats()
+
+
+@asynccontextmanager
+async def resources():
+    """
+    Keep the process-wide resources alive for the duration of the block.
+
+    Used by the FastAPI lifespan and by the CLI entry points, which each run
+    their own event loop.
+    """
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
@@ -1,9 +1,10 @@
 from datetime import datetime, timezone, date
 from typing import List, Optional, Literal
-from aanvraagapp.types import TargetAudience, FinancialInstrument, BusinessIdentity
+from aanvraagapp.types import TargetAudience, FinancialInstrument, BusinessIdentity, MatchEval
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Table, types, CheckConstraint, Boolean, Date
+from sqlalchemy import Column, ForeignKey, Integer, String, Table, types, CheckConstraint, Boolean, Date, LargeBinary, UniqueConstraint, Computed, Index
 from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
@@ -139,6 +140,8 @@ class Client(TimestampMixin, Base):
 
     business_identity: Mapped[BusinessIdentity | None] = mapped_column(String, nullable=True)
     audience_desc: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Hash of the prompt template version and markdown the field data was extracted from.
+    field_data_hash: Mapped[str | None] = mapped_column(String, nullable=True)
 
     users: Mapped[List["User"]] = relationship(
         secondary=user_client_association, back_populates="clients", lazy="select"
@@ -195,6 +198,8 @@ class Listing(TimestampMixin, Base):
     name: Mapped[str | None] = mapped_column(String, nullable=True)
     financial_instrument: Mapped[FinancialInstrument | None] = mapped_column(String, nullable=True)
     target_audience_desc: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Hash of the prompt template version and markdown the field data was extracted from.
+    field_data_hash: Mapped[str | None] = mapped_column(String, nullable=True)
 
     provider: Mapped["Provider"] = relationship(
         back_populates="listings", lazy="select"
@@ -235,6 +240,11 @@ class Provider(TimestampMixin, Base):
 
     name: Mapped[str] = mapped_column(String, nullable=False)
     website: Mapped[str] = mapped_column(String, nullable=False)
+    # Fingerprints of the page chrome that repeats across the listing pages of
+    # this provider, dropped while cleaning, see parsing.boilerplate.
+    boilerplate: Mapped[list[str] | None] = mapped_column(ARRAY(String), nullable=True)
+    # The number of pages the boilerplate was learned from.
+    boilerplate_pages: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     listings: Mapped[List["Listing"]] = relationship(
         back_populates="provider", lazy="select"
@@ -266,9 +276,25 @@ class Webpage(TimestampMixin, Base):
     owner_id: Mapped[int] = mapped_column(Integer, nullable=False)
 
     url: Mapped[str] = mapped_column(String, nullable=False)
-    original_content: Mapped[str] = mapped_column(String, nullable=True)
-    filtered_content: Mapped[str] = mapped_column(String, nullable=True)
+    # The raw and cleaned HTML live in the blob store, see blob_store.
+    original_content_digest: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    filtered_content_digest: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    # Not deferred: the rewrite skip check, chunking, and the extraction and
+    # scoring hashes read it wherever webpages are loaded.
     markdown_content: Mapped[str] = mapped_column(String, nullable=True)
+    # HTTP validators of the fetched page, sent along on the next fetch so an
+    # unchanged page comes back as a 304.
+    etag: Mapped[str] = mapped_column(String, nullable=True)
+    last_modified: Mapped[str] = mapped_column(String, nullable=True)
+    # Hashes of the contents after stripping volatile fragments, see
+    # parsing.content_hash. A pipeline stage is skipped when its input hash
+    # did not change since the last run. The original content hash includes
+    # the provider boilerplate the page was cleaned with, the filtered content
+    # hash the markdown conversion prompt version and settings.
+    original_content_hash: Mapped[str] = mapped_column(String, nullable=True)
+    filtered_content_hash: Mapped[str] = mapped_column(String, nullable=True)
+    # Hash of the markdown content the current chunks were made from.
+    chunked_content_hash: Mapped[str] = mapped_column(String, nullable=True)
 
     __table_args__ = (
         CheckConstraint("owner_type IN ('client', 'listing')", name='webpage_valid_owner_type'),
@@ -286,36 +312,88 @@ class Webpage(TimestampMixin, Base):
         overlaps="listing,websites",
     )
 
-    chunks = relationship(
-        "Chunk",
-        primaryjoin="and_(foreign(Webpage.id)==Chunk.owner_id, Chunk.owner_type=='webpage')",
-        back_populates="webpage",
+    chunks: Mapped[List["Chunk"]] = relationship(
+        secondary="webpage_chunk_association",
+        back_populates="webpages",
     )
 
 
-class ChunkOwnerType(str, Enum):
-    WEBPAGE = "webpage"
+# Links a webpage to the distinct chunks of its markdown. The header path is
+# per page, since the same text can sit under other headers on other pages.
+webpage_chunk_association = Table(
+    "webpage_chunk_association",
+    Base.metadata,
+    Column("webpage_id", Integer, ForeignKey("webpage.id"), primary_key=True),
+    Column("chunk_id", Integer, ForeignKey("chunk.id"), primary_key=True, index=True),
+    # Titles of the markdown headers the chunk is under, outermost first.
+    Column("header_path", ARRAY(String), nullable=False, default=list),
+)
 
 
 class Chunk(TimestampMixin, Base):
+    """
+    A distinct chunk text and its embedding, shared by all webpages that
+    contain it, see webpage_chunk_association.
+    """
     id: Mapped[int] = mapped_column(primary_key=True)
 
-    owner_type: Mapped[ChunkOwnerType] = mapped_column(String, nullable=False)
-    owner_id: Mapped[int] = mapped_column(Integer, nullable=False)
-
     content: Mapped[str] = mapped_column(String, nullable=False)
+    # Hash of the normalised content, see parsing.chunking.chunk_content_hash.
+    content_hash: Mapped[str] = mapped_column(String, nullable=False, unique=True)
     emb: Mapped[NDArray[np.float32]] = mapped_column(Vector(768))
+    # Matryoshka prefix of emb for the coarse pass of a two-stage search. Cosine
+    # distance ignores the vector length, so the prefix needs no renormalization.
+    emb_short: Mapped[NDArray[np.float32]] = mapped_column(
+        Vector(256), Computed("subvector(emb, 1, 256)::vector(256)", persisted=True)
+    )
 
     __table_args__ = (
-        CheckConstraint("owner_type IN ('webpage')", name='chunk_valid_owner_type'),
+        Index(
+            "chunk_emb_short_hnsw",
+            "emb_short",
+            postgresql_using="hnsw",
+            postgresql_ops={"emb_short": "vector_cosine_ops"},
+        ),
     )
 
-    webpage: Mapped[Webpage] = relationship(
-        primaryjoin="and_(Chunk.owner_id==foreign(Webpage.id), Chunk.owner_type=='webpage')",
-        back_populates="chunks"
+    webpages: Mapped[List[Webpage]] = relationship(
+        secondary=webpage_chunk_association,
+        back_populates="chunks",
     )
 
 
+class ClientListingMatch(TimestampMixin, Base):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    client_id: Mapped[int] = mapped_column(ForeignKey("client.id"), index=True)
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listing.id"), index=True)
+
+    match_quality: Mapped[MatchEval] = mapped_column(String, nullable=False)
+    listing_ambiguous: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    # The full ClientListingMatchResult as JSON, including the conditions.
+    result: Mapped[str] = mapped_column(String, nullable=False)
+    # Hash of the prompt template version and both markdown contents.
+    input_hash: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("client_id", "listing_id", name="client_listing_match_unique"),
+    )
+
+    client: Mapped["Client"] = relationship(lazy="select")
+    listing: Mapped["Listing"] = relationship(lazy="select")
+
+
+class AICacheEntry(TimestampMixin, Base):
+    table_name = "ai_cache_entry"
+
+    namespace: Mapped[str] = mapped_column(String, primary_key=True)
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+
+    value: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(types.DateTime(timezone=True), nullable=False)
+    accessed_at: Mapped[datetime] = mapped_column(
+        types.DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
 
 # class ClientDocument(TimestampMixin, Base):
 #     id: Mapped[int] = mapped_column(primary_key=True)
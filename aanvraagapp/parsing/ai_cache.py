@@ -0,0 +1,349 @@
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from typing import Type
+
+import redis.asyncio as redis
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from aanvraagapp import models
+from aanvraagapp.config import settings
+from aanvraagapp.database import async_session_maker
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CacheBackend(ABC):
+    """Abstract base class for a key-value store of cached AI results."""
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> bytes | None:
+        """Return the cached value, or None if missing or expired."""
+        pass
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: bytes) -> int:
+        """Store a value and return the number of entries evicted to make room."""
+        pass
+
+    @abstractmethod
+    async def get_many(self, namespace: str, keys: list[str]) -> dict[str, bytes]:
+        """Return the cached values for the keys that are present."""
+        pass
+
+    @abstractmethod
+    async def set_many(self, namespace: str, items: dict[str, bytes]) -> int:
+        """Store several values and return the number of entries evicted."""
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Stores entries as plain Redis keys with a TTL. A sorted set per namespace
+    keeps track of the last access time of each key, so the least recently
+    used keys can be evicted once the namespace grows beyond max_entries.
+    A second sorted set holds the expiry time of each key, so keys that Redis
+    expired are dropped from the index before it is counted.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.client = redis.Redis.from_url(settings.redis_uri)
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"aicache:{namespace}:{key}"
+
+    def _index(self, namespace: str) -> str:
+        return f"aicache:{namespace}:index"
+
+    def _expiries(self, namespace: str) -> str:
+        return f"aicache:{namespace}:expiries"
+
+    async def get(self, namespace: str, key: str) -> bytes | None:
+        value = await self.client.get(self._key(namespace, key))
+        if value is not None:
+            await self.client.zadd(self._index(namespace), {key: time.time()})
+        return value
+
+    async def set(self, namespace: str, key: str, value: bytes) -> int:
+        return await self.set_many(namespace, {key: value})
+
+    async def get_many(self, namespace: str, keys: list[str]) -> dict[str, bytes]:
+        if not keys:
+            return {}
+        values = await self.client.mget([self._key(namespace, k) for k in keys])
+        found = {k: v for k, v in zip(keys, values) if v is not None}
+        if found:
+            now = time.time()
+            await self.client.zadd(self._index(namespace), {k: now for k in found})
+        return found
+
+    async def _prune_expired(self, namespace: str, now: float) -> int:
+        """Drop the keys that expired from the index, and return how many there were."""
+        expiries = self._expiries(namespace)
+        expired = await self.client.zrangebyscore(expiries, "-inf", now)
+        if not expired:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zrem(self._index(namespace), *expired)
+            pipe.zrem(expiries, *expired)
+            await pipe.execute()
+        return len(expired)
+
+    async def set_many(self, namespace: str, items: dict[str, bytes]) -> int:
+        if not items:
+            return 0
+        index = self._index(namespace)
+        expiries = self._expiries(namespace)
+        now = time.time()
+        evicted_count = await self._prune_expired(namespace, now)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self._key(namespace, key), value, ex=self.ttl_seconds)
+            pipe.zadd(index, {key: now for key in items})
+            pipe.zadd(expiries, {key: now + self.ttl_seconds for key in items})
+            pipe.zcard(index)
+            *_, size = await pipe.execute()
+
+        overflow = size - self.max_entries
+        if overflow <= 0:
+            return evicted_count
+        evicted = await self.client.zpopmin(index, overflow)
+        evicted_keys = [k.decode() if isinstance(k, bytes) else k for k, _ in evicted]
+        if evicted_keys:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.delete(*[self._key(namespace, k) for k in evicted_keys])
+                pipe.zrem(expiries, *evicted_keys)
+                await pipe.execute()
+        return evicted_count + len(evicted_keys)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class PostgresCacheBackend(CacheBackend):
+    """Stores entries in the ai_cache_entry table."""
+
+    # Expired and overflowing rows are cleaned up every this many writes,
+    # instead of on every write.
+    EVICT_EVERY_WRITES = 100
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes = 0
+
+    async def get(self, namespace: str, key: str) -> bytes | None:
+        now = datetime.now(timezone.utc)
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(models.AICacheEntry)
+                .where(
+                    models.AICacheEntry.namespace == namespace,
+                    models.AICacheEntry.key == key,
+                    models.AICacheEntry.expires_at > now,
+                )
+                .values(accessed_at=now)
+                .returning(models.AICacheEntry.value)
+            )
+            value = result.scalar_one_or_none()
+            await session.commit()
+        return value
+
+    async def set(self, namespace: str, key: str, value: bytes) -> int:
+        return await self.set_many(namespace, {key: value})
+
+    async def get_many(self, namespace: str, keys: list[str]) -> dict[str, bytes]:
+        if not keys:
+            return {}
+        now = datetime.now(timezone.utc)
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(models.AICacheEntry)
+                .where(
+                    models.AICacheEntry.namespace == namespace,
+                    models.AICacheEntry.key.in_(keys),
+                    models.AICacheEntry.expires_at > now,
+                )
+                .values(accessed_at=now)
+                .returning(models.AICacheEntry.key, models.AICacheEntry.value)
+            )
+            found = {key: value for key, value in result.all()}
+            await session.commit()
+        return found
+
+    async def set_many(self, namespace: str, items: dict[str, bytes]) -> int:
+        if not items:
+            return 0
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        stmt = insert(models.AICacheEntry).values(
+            [
+                {
+                    "namespace": namespace,
+                    "key": key,
+                    "value": value,
+                    "expires_at": expires_at,
+                    "accessed_at": now,
+                }
+                for key, value in items.items()
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["namespace", "key"],
+            set_={
+                "value": stmt.excluded.value,
+                "expires_at": stmt.excluded.expires_at,
+                "accessed_at": stmt.excluded.accessed_at,
+            },
+        )
+        async with async_session_maker() as session:
+            await session.execute(stmt)
+            evicted = 0
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY_WRITES == 0:
+                evicted = await self._evict(session, namespace, now)
+            await session.commit()
+        return evicted
+
+    async def _evict(self, session, namespace: str, now: datetime) -> int:
+        expired = await session.execute(
+            delete(models.AICacheEntry).where(
+                models.AICacheEntry.namespace == namespace,
+                models.AICacheEntry.expires_at <= now,
+            )
+        )
+        keep = (
+            select(models.AICacheEntry.key)
+            .where(models.AICacheEntry.namespace == namespace)
+            .order_by(models.AICacheEntry.accessed_at.desc())
+            .limit(self.max_entries)
+        )
+        overflow = await session.execute(
+            delete(models.AICacheEntry).where(
+                models.AICacheEntry.namespace == namespace,
+                models.AICacheEntry.key.not_in(keep),
+            )
+        )
+        return expired.rowcount + overflow.rowcount
+
+
+def create_cache_backend() -> CacheBackend | None:
+    """Create the cache backend configured in the settings."""
+    backend = settings.ai_cache.backend
+    if backend == "redis":
+        return RedisCacheBackend(settings.ai_cache.ttl_seconds, settings.ai_cache.max_entries)
+    elif backend == "postgres":
+        return PostgresCacheBackend(settings.ai_cache.ttl_seconds, settings.ai_cache.max_entries)
+    elif backend == "none":
+        return None
+    else:
+        raise ValueError(f"Unsupported AI cache backend: {backend}")
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for generate_content responses.
+
+    Entries are keyed on a hash of everything that determines the response:
+    the model, the rendered prompt, the output schema and the version of the
+    prompt template. A failing cache backend never fails the request, it is
+    treated as a miss.
+    """
+
+    namespace = "generate"
+
+    def __init__(self):
+        self._backend: CacheBackend | None = None
+        self._backend_created = False
+        self.stats = CacheStats()
+
+    @property
+    def backend(self) -> CacheBackend | None:
+        if not self._backend_created:
+            self._backend = create_cache_backend()
+            self._backend_created = True
+        return self._backend
+
+    @staticmethod
+    def key(
+        model: str,
+        prompt: str,
+        output_schema: Type[BaseModel] | None,
+        template_version: str,
+    ) -> str:
+        schema = output_schema.model_json_schema() if output_schema is not None else None
+        payload = json.dumps(
+            {
+                "model": model,
+                "prompt": prompt,
+                "schema": schema,
+                "template_version": template_version,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get(self, key: str) -> str | None:
+        if self.backend is None:
+            return None
+        try:
+            value = await self.backend.get(self.namespace, key)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"AI response cache lookup failed: {str(e)}")
+            value = None
+
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return value.decode()
+
+    async def set(self, key: str, response: str) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.stats.evictions += await self.backend.set(
+                self.namespace, key, response.encode()
+            )
+            self.stats.writes += 1
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"AI response cache write failed: {str(e)}")
+
+    async def aclose(self) -> None:
+        if self._backend is not None:
+            await self._backend.aclose()
+        logger.info(
+            f"AI response cache stats: {asdict(self.stats)}, hit rate {self.stats.hit_rate:.1%}"
+        )
+        self._backend = None
+        self._backend_created = False
+
+
+response_cache = ResponseCache()
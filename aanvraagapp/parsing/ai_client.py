@@ -1,29 +1,94 @@
 import asyncio
+import hashlib
 import logging
+import random
+import types
+from datetime import date, timedelta
+from enum import Enum
+import httpx
 import numpy as np
 from numpy.linalg import norm
-from typing import Literal, Optional, Type
+from typing import Any, Literal, Optional, Type, Union, get_args, get_origin
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
 import ollama
 from google import genai
-from aanvraagapp.config import settings
+from aanvraagapp.config import FakeAISettings, FakeLatencySettings, settings
 from pydantic import BaseModel
 from aanvraagapp.types import AIProvider
+from .embedding_cache import embedding_cache
+from .rate_limit import estimate_tokens, is_backend_failure, rate_limiter, retry_after_seconds
 
 logger = logging.getLogger(__name__)
 
 
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """L2 normalize each row of a (n, dim) array, or a single (dim,) vector."""
+    norms = norm(embeddings, axis=-1, keepdims=True)
+    # Leave all-zero rows as they are instead of dividing by zero.
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+@dataclass
+class ClientPoolStats:
+    """Usage counters for a single pooled AI client."""
+
+    requests: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    errors: int = 0
+
+
 class AIClient(ABC):
     """Abstract base class for AI clients."""
+
+    default_generate_model: str
+    default_embed_model: str
+
+    def __init__(self):
+        self.stats = ClientPoolStats()
+
+    def unwrap(self) -> "AIClient":
+        """Return the client that talks to the provider, below any wrapping clients."""
+        return self
+
+    @contextmanager
+    def _track_request(self):
+        """Keep the usage counters up to date around a single API request."""
+        self.stats.requests += 1
+        self.stats.in_flight += 1
+        self.stats.max_in_flight = max(self.stats.max_in_flight, self.stats.in_flight)
+        try:
+            yield
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.in_flight -= 1
+
+    async def warm_up(self) -> None:
+        """Open a connection to the provider ahead of the first request."""
+        pass
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        pass
     
     @abstractmethod
     async def generate_content(
         self, 
         prompt: str, 
         model: Optional[str] = None,
-        output_schema: Type[BaseModel] | None = None
+        output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
     ) -> str:
-        """Generate text content from a prompt."""
+        """
+        Generate text content from a prompt. The thinking budget and context
+        size are only used by backends that support them, None leaves the
+        model default.
+        """
         pass
     
     @abstractmethod
@@ -44,19 +109,59 @@ class AIClient(ABC):
         """Create embeddings for search queries."""
         pass
 
+    async def embed_queries(
+        self,
+        queries: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        """Create embeddings for several search queries at once."""
+        embeddings = await asyncio.gather(*[self.embed_query(q, model) for q in queries])
+        return np.stack(embeddings)
+
+
+def _pool_transport() -> httpx.AsyncHTTPTransport:
+    """
+    The connection pool of an AI client. The SDKs take it as the transport
+    of the httpx client they build, and the AI client closes it itself, since
+    the SDKs have no public close method in the versions we pin.
+    """
+    return httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=settings.ai_pool.max_connections,
+            max_keepalive_connections=settings.ai_pool.max_keepalive_connections,
+            keepalive_expiry=settings.ai_pool.keepalive_expiry,
+        )
+    )
+
 
 class GeminiAIClient(AIClient):
     """Gemini AI client implementation."""
+
+    default_generate_model = "gemini-2.5-flash"
+    default_embed_model = "gemini-embedding-001"
+    embedding_dim = 768
     
     def __init__(self):
-        self.client = genai.Client(api_key=settings.gemini_api_key).aio
+        super().__init__()
+        self.transport = _pool_transport()
+        self.client = genai.Client(
+            api_key=settings.gemini_api_key,
+            http_options=genai.types.HttpOptions(
+                async_client_args={"transport": self.transport}
+            ),
+        ).aio
+
+    async def warm_up(self) -> None:
+        # Fetching model metadata is free and sets up the TLS connection.
+        await self.client.models.get(model=self.default_generate_model)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
     
     def _normalize_embedding_if_needed(self, embedding: np.ndarray) -> np.ndarray:
         """Normalize embedding using L2 normalization if output size is not 3072."""
         if embedding.shape[-1] != 3072:
-            # Apply L2 normalization
-            normed_embedding = embedding / norm(embedding)
-            return normed_embedding
+            return normalize_embeddings(embedding)
         return embedding
     
     async def generate_content(
@@ -64,9 +169,11 @@ class GeminiAIClient(AIClient):
         prompt: str, 
         model: Optional[str] = None,
         output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
         include_thinking: bool = False
     ) -> str:
-        model = model or "gemini-2.5-flash"
+        model = model or self.default_generate_model
         if output_schema:
             config = genai.types.GenerateContentConfig(
                 response_mime_type="application/json",
@@ -75,16 +182,21 @@ class GeminiAIClient(AIClient):
         else:
             config = genai.types.GenerateContentConfig()
         
-        if include_thinking:
+        if include_thinking or thinking_budget is not None:
             config.thinking_config = genai.types.ThinkingConfig(
-                include_thoughts=True
+                include_thoughts=include_thinking,
+                thinking_budget=thinking_budget,
             )
         
-        response = await self.client.models.generate_content(
-            model=model,
-            contents=prompt,
-            config=config,
-        )
+        async def request():
+            with self._track_request():
+                return await self.client.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=config,
+                )
+
+        response = await rate_limiter.call(model, estimate_tokens(prompt), request)
         
         # Print all thoughts and final answer if thinking is enabled
         if include_thinking:
@@ -106,23 +218,39 @@ class GeminiAIClient(AIClient):
         assert response.text is not None
         return response.text
     
+    async def _embed(self, texts: list[str], model: str, task_type: str) -> np.ndarray:
+        async def request():
+            with self._track_request():
+                return await self.client.models.embed_content(
+                    model=model,
+                    contents=texts,
+                    config=genai.types.EmbedContentConfig(
+                        task_type=task_type, output_dimensionality=self.embedding_dim
+                    ),
+                )
+
+        tokens = sum(estimate_tokens(t) for t in texts)
+        result = await rate_limiter.call(model, tokens, request)
+        assert result.embeddings is not None
+        # Shape of the array is (len(texts), output_dimensionality).
+        embeddings = np.array([i.values for i in result.embeddings], dtype=np.float32)
+        # Apply normalization if needed
+        return self._normalize_embedding_if_needed(embeddings)
+
     async def embed_content(
         self, 
         texts: list[str], 
         model: Optional[str] = None
     ) -> np.ndarray:
-        model = model or "gemini-embedding-001"
-        result = await self.client.models.embed_content(
-            model=model,
-            contents=texts,
-            config=genai.types.EmbedContentConfig(task_type="RETRIEVAL_DOCUMENT", output_dimensionality=768),
+        model = model or self.default_embed_model
+        task_type = "RETRIEVAL_DOCUMENT"
+        return await embedding_cache.embed(
+            texts,
+            model,
+            task_type,
+            self.embedding_dim,
+            lambda missing: self._embed(missing, model, task_type),
         )
-        assert result.embeddings is not None
-        # TODO: Shape of array that's returned?
-        # (len(texts), output_dimensionality)
-        embeddings = np.array([i.values for i in result.embeddings], dtype=np.float32)
-        # Apply normalization if needed
-        return self._normalize_embedding_if_needed(embeddings)
     
     async def embed_query(
         self, 
@@ -130,42 +258,62 @@ class GeminiAIClient(AIClient):
         model: Optional[str] = None
     ) -> np.ndarray:
         """Create embeddings for search queries (as opposed to documents in the corpus)."""
-        model = model or "gemini-embedding-001"
-        result = await self.client.models.embed_content(
-            model=model,
-            contents=query,
-            config=genai.types.EmbedContentConfig(task_type="RETRIEVAL_QUERY", output_dimensionality=768),
+        embeddings = await self.embed_queries([query], model)
+        return embeddings[0]
+
+    async def embed_queries(
+        self,
+        queries: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        model = model or self.default_embed_model
+        task_type = "RETRIEVAL_QUERY"
+        return await embedding_cache.embed(
+            queries,
+            model,
+            task_type,
+            self.embedding_dim,
+            lambda missing: self._embed(missing, model, task_type),
         )
-        assert result.embeddings is not None
-        embedding_values = result.embeddings[0].values
-        # TODO: Shape of array that's returned?
-        embedding = np.array(embedding_values, dtype=np.float32)
-        # Apply normalization if needed
-        return self._normalize_embedding_if_needed(embedding)
 
 
 class OllamaAIClient(AIClient):
     """Ollama AI client implementation."""
+
+    default_generate_model = "reader-lm:1.5b"
+    default_embed_model = "embeddinggemma:300m"  # Has output dimensionality of 768.
     
     def __init__(self):
-        self.base_url = "http://localhost:11434"
+        super().__init__()
+        self.transport = _pool_transport()
+        self.client = ollama.AsyncClient(host=settings.ollama_uri, transport=self.transport)
+
+    async def warm_up(self) -> None:
+        await self.client.ps()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
     
     async def generate_content(
         self, 
         prompt: str, 
         model: Optional[str] = None,
-        output_schema: Type[BaseModel] | None = None
+        output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
     ) -> str:
-        model = model or "reader-lm:1.5b"
-        if output_schema is not None:
-            raise RuntimeError("No output schema support for Ollama")
-        response = await ollama.AsyncClient(host=settings.ollama_uri).generate(
-            model=model,
-            prompt=prompt,
-            options={
-                'num_ctx': 4096 * 8,  # Set context to 32K tokens,
-            }
-        )
+        model = model or self.default_generate_model
+        with self._track_request():
+            response = await self.client.generate(
+                model=model,
+                prompt=prompt,
+                # Ollama constrains the output to a JSON schema with the format option.
+                format=output_schema.model_json_schema() if output_schema is not None else None,
+                think=thinking_budget != 0 if thinking_budget is not None else None,
+                options={
+                    'num_ctx': context_size or 4096 * 8,  # Default context of 32K tokens,
+                }
+            )
         return response['response']
     
     async def embed_content(
@@ -173,15 +321,16 @@ class OllamaAIClient(AIClient):
         texts: list[str], 
         model: Optional[str] = None
     ) -> np.ndarray:
-        model = model or "embeddinggemma:300m"  # Has output dimensionality of 768.
+        model = model or self.default_embed_model
         
         # EmbeddingGemma requires specific prompt formatting for documents
         formatted_texts = [f"title: none | text: {t}" for t in texts]
         
-        response = await ollama.AsyncClient(host=settings.ollama_uri).embed(
-            model=model,
-            input=formatted_texts,
-        )
+        with self._track_request():
+            response = await self.client.embed(
+                model=model,
+                input=formatted_texts,
+            )
         embedding_values = response.embeddings
         # TODO: Shape of array that's returned?
         return np.array(embedding_values, dtype=np.float32)
@@ -192,25 +341,399 @@ class OllamaAIClient(AIClient):
         model: Optional[str] = None
     ) -> np.ndarray:
         """Create embeddings for search queries (as opposed to documents in the corpus)."""
-        model = model or "embeddinggemma:300m"  # Has output dimensionality of 768.
+        embeddings = await self.embed_queries([query], model)
+        return embeddings[0]
+
+    async def embed_queries(
+        self,
+        queries: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        model = model or self.default_embed_model
         
         # EmbeddingGemma requires specific prompt formatting for queries
-        formatted_query = f"task: search result | query: {query}"
+        formatted_queries = [f"task: search result | query: {q}" for q in queries]
         
-        response = await ollama.AsyncClient(host=settings.ollama_uri).embed(
+        with self._track_request():
+            response = await self.client.embed(
+                model=model,
+                input=formatted_queries,
+            )
+        # Shape of the array is (len(queries), output_dimensionality).
+        return np.array(response.embeddings, dtype=np.float32)
+
+
+@dataclass
+class PendingEmbedding:
+    texts: list[str]
+    future: asyncio.Future[np.ndarray]
+
+
+class MicroBatchingAIClient(AIClient):
+    """
+    Wraps an AIClient to merge concurrent embedding requests into batches.
+
+    Requests for the same model and kind (documents or queries) are collected
+    for a short window, or until max_batch_size texts are waiting, and then
+    sent as one batched embed call. Every caller gets its own rows back.
+    Generation requests are passed through as is.
+    """
+
+    def __init__(self, inner: AIClient, window_ms: float, max_batch_size: int):
+        # Share the usage counters of the wrapped client instead of keeping our own.
+        self.stats = inner.stats
+        self.inner = inner
+        self.default_generate_model = inner.default_generate_model
+        self.default_embed_model = inner.default_embed_model
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: dict[tuple[str, str], list[PendingEmbedding]] = {}
+        self._timers: dict[tuple[str, str], asyncio.Task] = {}
+        self._flushes: set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_requests = 0
+
+    def unwrap(self) -> AIClient:
+        return self.inner.unwrap()
+
+    async def warm_up(self) -> None:
+        await self.inner.warm_up()
+
+    async def aclose(self) -> None:
+        for key in list(self._pending):
+            await self._flush(key)
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        if self.batches:
+            logger.info(
+                f"Merged {self.batched_requests} embedding requests into {self.batches} batches"
+            )
+        await self.inner.aclose()
+
+    async def generate_content(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
+    ) -> str:
+        return await self.inner.generate_content(
+            prompt,
             model=model,
-            input=formatted_query,
+            output_schema=output_schema,
+            thinking_budget=thinking_budget,
+            context_size=context_size,
         )
-        embedding_values = response.embeddings
-        # TODO: Shape of array that's returned?
-        return np.array(embedding_values, dtype=np.float32).squeeze(0)
 
+    async def embed_content(
+        self,
+        texts: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        return await self._enqueue("document", model or self.default_embed_model, texts)
 
-def get_client(provider: AIProvider = "gemini") -> AIClient:
-    """Create an AI client instance based on the provider."""
-    if provider == "gemini":
-        return GeminiAIClient()
+    async def embed_query(
+        self,
+        query: str,
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        embeddings = await self._enqueue("query", model or self.default_embed_model, [query])
+        return embeddings[0]
+
+    async def embed_queries(
+        self,
+        queries: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        return await self._enqueue("query", model or self.default_embed_model, queries)
+
+    def _start_flush(self, key: tuple[str, str]) -> None:
+        task = asyncio.create_task(self._flush(key))
+        # Keep a reference, so the task is not garbage collected while running.
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush_after_window(self, key: tuple[str, str]) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._timers.pop(key, None)
+        self._start_flush(key)
+
+    async def _enqueue(self, kind: str, model: str, texts: list[str]) -> np.ndarray:
+        key = (kind, model)
+        pending = PendingEmbedding(texts, asyncio.get_running_loop().create_future())
+        self._pending.setdefault(key, []).append(pending)
+
+        if sum(len(p.texts) for p in self._pending[key]) >= self.max_batch_size:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._start_flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_after_window(key))
+
+        return await pending.future
+
+    async def _flush(self, key: tuple[str, str]) -> None:
+        pending = self._pending.pop(key, [])
+        timer = self._timers.pop(key, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+        # Split into batches of at most max_batch_size texts, without
+        # splitting up the texts of a single request.
+        batches: list[list[PendingEmbedding]] = []
+        size = 0
+        for p in pending:
+            if not batches or size + len(p.texts) > self.max_batch_size:
+                batches.append([])
+                size = 0
+            batches[-1].append(p)
+            size += len(p.texts)
+
+        self.batches += len(batches)
+        self.batched_requests += len(pending)
+        await asyncio.gather(*[self._embed_batch(key, batch) for batch in batches])
+
+    async def _embed(self, key: tuple[str, str], texts: list[str]) -> np.ndarray:
+        kind, model = key
+        if kind == "query":
+            return await self.inner.embed_queries(texts, model)
+        return await self.inner.embed_content(texts, model)
+
+    async def _embed_batch(self, key: tuple[str, str], batch: list[PendingEmbedding]) -> None:
+        texts = [t for p in batch for t in p.texts]
+        try:
+            embeddings = await self._embed(key, texts)
+        except Exception as e:
+            if len(batch) == 1 or is_backend_failure(e) or retry_after_seconds(e) is not None:
+                # The backend is down or throttling, and the rate limiter
+                # already retried: every request would fail the same way.
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+                return
+            # Retry every request on its own, so one bad request only fails
+            # its own caller.
+            logger.warning(f"Embedding batch of {len(batch)} requests failed, retrying them one by one: {str(e)}")
+            await asyncio.gather(*[self._embed_batch(key, [p]) for p in batch])
+            return
+
+        start = 0
+        for p in batch:
+            if not p.future.done():
+                p.future.set_result(embeddings[start : start + len(p.texts)])
+            start += len(p.texts)
+
+
+class FakeAIError(ConnectionError):
+    """Error injected by the FakeAIClient, standing in for a backend failure."""
+
+
+class FakeAIClient(AIClient):
+    """
+    Deterministic offline stand-in for the real AI clients, for benchmarks
+    and load tests.
+
+    Embeddings are unit vectors seeded by a hash of the text, so the same
+    text always gets the same vector (as a query and as a document).
+    Structured outputs are random but schema-valid instances of the output
+    schema, seeded by a hash of the prompt. Latencies and errors are drawn
+    from the distributions in the settings.
+    """
+
+    default_generate_model = "fake-generate"
+    default_embed_model = "fake-embed"
+    embedding_dim = 768
+
+    def __init__(self, config: FakeAISettings | None = None):
+        super().__init__()
+        self.config = config or settings.ai_fake
+        # Separate generator for latencies and errors, so they do not change the outputs.
+        self.random = random.Random(self.config.seed)
+
+    def _rng(self, *parts: str) -> np.random.Generator:
+        digest = hashlib.sha256(":".join([str(self.config.seed), *parts]).encode()).digest()
+        return np.random.default_rng(int.from_bytes(digest[:8], "big"))
+
+    def _latency_seconds(self, latency: FakeLatencySettings) -> float:
+        if latency.median_ms <= 0:
+            return 0.0
+        if latency.distribution == "uniform":
+            ms = latency.median_ms * self.random.uniform(1 - latency.spread, 1 + latency.spread)
+        elif latency.distribution == "lognormal":
+            ms = self.random.lognormvariate(np.log(latency.median_ms), latency.spread)
+        else:
+            ms = latency.median_ms
+        return max(ms, 0.0) / 1000
+
+    async def _simulate(self, latency: FakeLatencySettings) -> None:
+        with self._track_request():
+            await asyncio.sleep(self._latency_seconds(latency))
+            if self.random.random() < self.config.error_rate:
+                raise FakeAIError("Injected fake AI error")
+
+    def _fake_value(self, annotation: Any, rng: np.random.Generator, min_length: int = 0) -> Any:
+        origin = get_origin(annotation)
+        if origin in (Union, types.UnionType):
+            options = [a for a in get_args(annotation) if a is not type(None)]
+            return self._fake_value(options[int(rng.integers(len(options)))], rng)
+        if origin is list:
+            (item,) = get_args(annotation)
+            length = int(rng.integers(max(min_length, 1), max(min_length, 1) + 3))
+            return [self._fake_value(item, rng) for _ in range(length)]
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            return {
+                name: self._fake_value(
+                    field.annotation,
+                    rng,
+                    min_length=next((m.min_length for m in field.metadata if hasattr(m, "min_length")), 0),
+                )
+                for name, field in annotation.model_fields.items()
+            }
+        if isinstance(annotation, type) and issubclass(annotation, Enum):
+            members = list(annotation)
+            return members[int(rng.integers(len(members)))].value
+        if annotation is bool:
+            return bool(rng.integers(2))
+        if annotation is int:
+            return int(rng.integers(1000))
+        if annotation is float:
+            return float(rng.random())
+        if annotation is date:
+            return (date(2025, 1, 1) + timedelta(days=int(rng.integers(730)))).isoformat()
+        if annotation is str:
+            return f"fake text {int(rng.integers(1_000_000))}"
+        raise TypeError(f"FakeAIClient can not generate values of type {annotation}")
+
+    async def generate_content(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
+    ) -> str:
+        await self._simulate(self.config.generate_latency)
+        rng = self._rng("generate", prompt)
+        if output_schema is not None:
+            value = self._fake_value(output_schema, rng)
+            return output_schema.model_validate(value).model_dump_json()
+        # Markdown of roughly the same length as the text in the prompt.
+        words = prompt.split()
+        return f"# Fake response {int(rng.integers(1_000_000))}\n\n" + " ".join(words[: len(words) // 2])
+
+    def _embedding(self, text: str) -> np.ndarray:
+        return normalize_embeddings(self._rng("embed", text).standard_normal(self.embedding_dim)).astype(np.float32)
+
+    async def embed_content(
+        self,
+        texts: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        await self._simulate(self.config.embed_latency)
+        if not texts:
+            return np.empty((0, self.embedding_dim), dtype=np.float32)
+        return np.stack([self._embedding(t) for t in texts])
+
+    async def embed_query(
+        self,
+        query: str,
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        return (await self.embed_queries([query], model))[0]
+
+    async def embed_queries(
+        self,
+        queries: list[str],
+        model: Optional[str] = None
+    ) -> np.ndarray:
+        return await self.embed_content(queries, model)
+
+
+def create_client(provider: AIProvider = "gemini") -> AIClient:
+    """Create a new AI client instance based on the provider."""
+    if provider == "fake" or settings.ai_fake.enabled:
+        client = FakeAIClient()
+    elif provider == "gemini":
+        client = GeminiAIClient()
     elif provider == "ollama":
-        return OllamaAIClient()
+        client = OllamaAIClient()
     else:
         raise ValueError(f"Unsupported AI provider: {provider}")
+
+    if settings.embedding_batch.enabled:
+        return MicroBatchingAIClient(
+            client,
+            window_ms=settings.embedding_batch.window_ms,
+            max_batch_size=settings.embedding_batch.max_batch_size,
+        )
+    return client
+
+
+class AIClientRegistry:
+    """
+    Process-wide registry of long-lived AI clients, one per provider.
+
+    Clients are created lazily on first use, so scripts that never call
+    startup() still share a single client (and connection pool) per provider.
+    startup() and shutdown() are called from the FastAPI lifespan and the CLI
+    entry points.
+    """
+
+    def __init__(self):
+        self._clients: dict[AIProvider, AIClient] = {}
+        self.created = 0
+        self.acquired = 0
+
+    def get(self, provider: AIProvider = "gemini") -> AIClient:
+        client = self._clients.get(provider)
+        if client is None:
+            client = create_client(provider)
+            self._clients[provider] = client
+            self.created += 1
+            logger.info(f"Created pooled AI client for {provider}")
+        self.acquired += 1
+        return client
+
+    async def startup(self, providers: tuple[AIProvider, ...] = ("gemini",)) -> None:
+        for provider in providers:
+            client = self.get(provider)
+            if not settings.ai_pool.warm_up:
+                continue
+            try:
+                await client.warm_up()
+                logger.info(f"Warmed up AI client for {provider}")
+            except Exception as e:
+                # A failed warm-up should never prevent the app from starting,
+                # the first real request will simply open the connection.
+                logger.warning(f"Warm-up of AI client for {provider} failed: {str(e)}")
+
+    async def shutdown(self) -> None:
+        stats = self.stats()
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for provider, client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Closing AI client for {provider} failed: {str(e)}")
+        logger.info(f"Shut down AI clients, pool stats: {stats}")
+
+    def stats(self) -> dict:
+        return {
+            "created": self.created,
+            "acquired": self.acquired,
+            "clients": {
+                provider: asdict(client.stats)
+                for provider, client in self._clients.items()
+            },
+        }
+
+
+registry = AIClientRegistry()
+
+
+def get_client(provider: AIProvider = "gemini") -> AIClient:
+    """Get the pooled AI client instance for the provider."""
+    return registry.get(provider)
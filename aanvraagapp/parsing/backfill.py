@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field, asdict
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from aanvraagapp import models
+from .parsing import chunk_webpage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BackfillCheckpoint:
+    """
+    The part of a backfill's progress that survives a restart. Every webpage
+    up to and including last_id has been processed, so a restart continues
+    after it.
+    """
+
+    last_id: int = 0
+    done: int = 0
+    failed: list[int] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, path: Path) -> "BackfillCheckpoint":
+        if not path.exists():
+            return cls()
+        return cls(**json.loads(path.read_text()))
+
+    def save(self, path: Path) -> None:
+        """Write the checkpoint atomically, so a crash never leaves half a file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(asdict(self), f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+class BackfillProgress:
+    """
+    Tracks the webpages of a backfill run. Webpages are started in id order
+    but finish in any order, so the checkpoint only moves up to just below
+    the lowest webpage still in flight.
+    """
+
+    def __init__(self, checkpoint: BackfillCheckpoint, total: int):
+        self.checkpoint = checkpoint
+        self.total = total
+        self.processed = 0
+        self.errors = 0
+        self.chunks = 0
+        self.in_flight: set[int] = set()
+        self.highest_started = checkpoint.last_id
+        self.started_at = time.monotonic()
+
+    def start(self, webpage_id: int) -> None:
+        self.in_flight.add(webpage_id)
+        self.highest_started = max(self.highest_started, webpage_id)
+
+    def finish(self, webpage_id: int, chunks: int | None) -> None:
+        """Record a processed webpage and the chunks embedded for it, None if it failed."""
+        self.in_flight.discard(webpage_id)
+        self.processed += 1
+        if chunks is None:
+            self.errors += 1
+            self.checkpoint.failed.append(webpage_id)
+        else:
+            self.chunks += chunks
+            self.checkpoint.done += 1
+        self.checkpoint.last_id = (
+            min(self.in_flight) - 1 if self.in_flight else self.highest_started
+        )
+
+    def summary(self) -> str:
+        seconds = time.monotonic() - self.started_at
+        rate = self.processed / seconds if seconds else 0.0
+        remaining = self.total - self.processed
+        eta = str(timedelta(seconds=round(remaining / rate))) if rate else "unknown"
+        return (
+            f"{self.processed}/{self.total} webpages, {rate:.2f} webpages/s, "
+            f"{self.chunks / seconds if seconds else 0.0:.1f} chunks/s embedded, "
+            f"ETA {eta}, {self.errors} errors"
+        )
+
+
+async def backfill_chunks(
+    session_maker: async_sessionmaker[AsyncSession],
+    checkpoint_path: Path,
+    concurrency: int = 4,
+    report_interval: float = 5.0,
+    report: Callable[[str], None] = logger.info,
+) -> BackfillProgress:
+    """
+    Chunk and embed every webpage that has markdown but no chunks yet.
+
+    The webpage ids come from a server-side cursor in id order, and
+    `concurrency` workers each process a webpage in their own session and
+    commit it. The checkpoint is saved after every webpage, so a restarted
+    backfill resumes where the previous one stopped; webpages that failed
+    are listed in it and skipped until the checkpoint is removed.
+    """
+    checkpoint = BackfillCheckpoint.load(checkpoint_path)
+    links = models.webpage_chunk_association
+    conditions = (
+        models.Webpage.markdown_content.is_not(None),
+        models.Webpage.id > checkpoint.last_id,
+        ~select(links.c.webpage_id).where(links.c.webpage_id == models.Webpage.id).exists(),
+    )
+
+    async with session_maker() as session:
+        total = await session.scalar(select(func.count()).select_from(models.Webpage).where(*conditions))
+        progress = BackfillProgress(checkpoint, total or 0)
+        if checkpoint.last_id:
+            report(f"Resuming after webpage {checkpoint.last_id}, {checkpoint.done} done before")
+        report(f"Backfilling the chunks of {progress.total} webpages")
+
+        # Bounded, so the cursor is only read as fast as the workers go.
+        queue: asyncio.Queue[int | None] = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def worker():
+            while (webpage_id := await queue.get()) is not None:
+                try:
+                    async with session_maker() as task_session:
+                        webpage = await task_session.get(models.Webpage, webpage_id)
+                        chunks = await chunk_webpage(webpage, task_session, force=True)
+                        await task_session.commit()
+                except Exception as e:
+                    logger.error(f"Could not chunk webpage {webpage_id}: {str(e)}")
+                    chunks = None
+                progress.finish(webpage_id, chunks)
+                checkpoint.save(checkpoint_path)
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(report_interval)
+                report(progress.summary())
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        reporter_task = asyncio.create_task(reporter())
+        try:
+            webpage_ids = await session.stream_scalars(
+                select(models.Webpage.id)
+                .where(*conditions)
+                .order_by(models.Webpage.id)
+                .execution_options(yield_per=500)
+            )
+            async for webpage_id in webpage_ids:
+                progress.start(webpage_id)
+                await queue.put(webpage_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            reporter_task.cancel()
+            for task in workers:
+                task.cancel()
+
+    report(f"Done: {progress.summary()}")
+    return progress
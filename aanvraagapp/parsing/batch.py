@@ -0,0 +1,440 @@
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+
+from google import genai
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from aanvraagapp import models
+from aanvraagapp.config import ModelRouteSettings, settings
+from aanvraagapp.types import AIProvider, AITask
+from .ai_cache import response_cache
+from .ai_client import AIClient, GeminiAIClient, get_client
+from .parsing import (
+    aggregate_markdown,
+    apply_listing_field_data,
+    field_data_input_hash,
+    get_target_audience_labels,
+    match_input_hash,
+    render_prompt,
+)
+from .prompts import get_template_version
+from .structured_outputs import ClientFieldData, ClientListingMatchResult, ListingFieldData
+
+logger = logging.getLogger(__name__)
+
+# Output schemas by the title they carry in their JSON schema.
+OUTPUT_SCHEMAS: dict[str, type[BaseModel]] = {
+    schema.__name__: schema
+    for schema in (ListingFieldData, ClientFieldData, ClientListingMatchResult)
+}
+
+
+class BatchState(Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass
+class BatchRequest:
+    key: str
+    prompt_name: str
+    prompt: str
+    output_schema: type[BaseModel]
+
+    def to_json_line(self, thinking_budget: int | None = None) -> str:
+        """
+        A line of the batch request file, in the Gemini Batch API format. The
+        thinking budget is set like GeminiAIClient.generate_content does.
+        """
+        generation_config: dict = {
+            "response_mime_type": "application/json",
+            "response_json_schema": self.output_schema.model_json_schema(),
+        }
+        if thinking_budget is not None:
+            generation_config["thinking_config"] = {
+                "include_thoughts": False,
+                "thinking_budget": thinking_budget,
+            }
+        return json.dumps(
+            {
+                "key": self.key,
+                "request": {
+                    "contents": [{"role": "user", "parts": [{"text": self.prompt}]}],
+                    "generation_config": generation_config,
+                },
+            }
+        )
+
+
+def parse_result_line(line: str) -> tuple[str, str | None, str | None]:
+    """
+    Parse a line of the batch results file into (key, text, error). Exactly
+    one of text and error is set.
+    """
+    result = json.loads(line)
+    key = result["key"]
+    if "error" in result:
+        return key, None, json.dumps(result["error"])
+    try:
+        parts = result["response"]["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError):
+        return key, None, f"No content in response: {line[:200]}"
+    text = "".join(p.get("text", "") for p in parts if not p.get("thought"))
+    return key, text, None
+
+
+class BatchBackend(ABC):
+    """Abstract base class for running batch jobs of generate requests."""
+
+    # The provider whose routes the jobs run on.
+    provider: AIProvider = "gemini"
+
+    @abstractmethod
+    async def submit(self, requests_path: Path, route: ModelRouteSettings) -> str:
+        """Submit the request file as a batch job on the route's model and return the job name."""
+        pass
+
+    @abstractmethod
+    async def poll(self, job_name: str) -> BatchState:
+        pass
+
+    @abstractmethod
+    async def download_results(self, job_name: str, results_path: Path) -> None:
+        pass
+
+
+class GeminiBatchBackend(BatchBackend):
+    """Runs batch jobs with the Gemini Batch API, at half the interactive price."""
+
+    def __init__(self, ai_client: AIClient | None = None):
+        ai_client = (ai_client or get_client("gemini")).unwrap()
+        assert isinstance(ai_client, GeminiAIClient)
+        self.client = ai_client.client
+
+    async def submit(self, requests_path: Path, route: ModelRouteSettings) -> str:
+        uploaded = await self.client.files.upload(
+            file=str(requests_path),
+            config=genai.types.UploadFileConfig(
+                display_name=requests_path.stem, mime_type="jsonl"
+            ),
+        )
+        assert uploaded.name is not None
+        job = await self.client.batches.create(
+            model=route.model,
+            src=uploaded.name,
+            config=genai.types.CreateBatchJobConfig(display_name=requests_path.stem),
+        )
+        assert job.name is not None
+        return job.name
+
+    async def poll(self, job_name: str) -> BatchState:
+        job = await self.client.batches.get(name=job_name)
+        state = job.state
+        if state in (
+            genai.types.JobState.JOB_STATE_SUCCEEDED,
+            # Failed requests are reported per line in the results file.
+            genai.types.JobState.JOB_STATE_PARTIALLY_SUCCEEDED,
+        ):
+            return BatchState.SUCCEEDED
+        if state in (
+            genai.types.JobState.JOB_STATE_FAILED,
+            genai.types.JobState.JOB_STATE_CANCELLED,
+            genai.types.JobState.JOB_STATE_EXPIRED,
+        ):
+            logger.error(f"Batch job {job_name} ended in state {state}: {job.error}")
+            return BatchState.FAILED
+        if state == genai.types.JobState.JOB_STATE_RUNNING:
+            return BatchState.RUNNING
+        return BatchState.PENDING
+
+    async def download_results(self, job_name: str, results_path: Path) -> None:
+        job = await self.client.batches.get(name=job_name)
+        assert job.dest is not None and job.dest.file_name is not None
+        content = await self.client.files.download(file=job.dest.file_name)
+        results_path.write_bytes(content)
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Stand-in for the Gemini Batch API that runs the requests of a job through
+    a regular AIClient in the background. Used to test the batch mode offline.
+    """
+
+    def __init__(self, ai_client: AIClient, provider: AIProvider = "gemini", concurrency: int = 8):
+        self.ai_client = ai_client
+        self.provider = provider
+        self.concurrency = concurrency
+        self._jobs: dict[str, asyncio.Task[list[str]]] = {}
+
+    async def _run_request(self, line: str, route: ModelRouteSettings, semaphore: asyncio.Semaphore) -> str:
+        request = json.loads(line)
+        prompt = request["request"]["contents"][0]["parts"][0]["text"]
+        json_schema = request["request"]["generation_config"].get("response_json_schema")
+        output_schema = OUTPUT_SCHEMAS[json_schema["title"]] if json_schema else None
+        async with semaphore:
+            try:
+                text = await self.ai_client.generate_content(
+                    prompt,
+                    model=route.model,
+                    output_schema=output_schema,
+                    thinking_budget=route.thinking_budget,
+                    context_size=route.context_size,
+                )
+            except Exception as e:
+                return json.dumps({"key": request["key"], "error": {"message": str(e)}})
+        return json.dumps(
+            {
+                "key": request["key"],
+                "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]},
+            }
+        )
+
+    async def _run_job(self, lines: list[str], route: ModelRouteSettings) -> list[str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *[self._run_request(line, route, semaphore) for line in lines]
+        )
+
+    async def submit(self, requests_path: Path, route: ModelRouteSettings) -> str:
+        lines = [line for line in requests_path.read_text().splitlines() if line.strip()]
+        job_name = f"local-{uuid.uuid4().hex}"
+        self._jobs[job_name] = asyncio.create_task(self._run_job(lines, route))
+        return job_name
+
+    async def poll(self, job_name: str) -> BatchState:
+        job = self._jobs[job_name]
+        if not job.done():
+            return BatchState.RUNNING
+        return BatchState.FAILED if job.exception() else BatchState.SUCCEEDED
+
+    async def download_results(self, job_name: str, results_path: Path) -> None:
+        results_path.write_text("\n".join(self._jobs.pop(job_name).result()) + "\n")
+
+
+def batch_route(task: AITask, provider: AIProvider) -> ModelRouteSettings:
+    """The route the router would use for the task on the provider."""
+    for route in settings.ai_router.tasks[task].candidates:
+        if route.provider == provider:
+            return route
+    raise ValueError(f"No {provider} route for task {task}")
+
+
+async def run_batch(
+    requests: list[BatchRequest],
+    backend: BatchBackend,
+    work_dir: Path,
+    task: AITask,
+    poll_interval: float = 30.0,
+) -> dict[str, str]:
+    """
+    Run the requests as one batch job on the task's model for the backend's
+    provider and return the response text per key.
+
+    Requests with a response in the response cache are not submitted, and
+    new responses are added to the cache, so batch and interactive runs share
+    their results. Failed requests are logged and left out of the result.
+    """
+    route = batch_route(task, backend.provider)
+    responses: dict[str, str] = {}
+    cache_keys: dict[str, str] = {}
+    to_submit: list[BatchRequest] = []
+    for request in requests:
+        cache_key = response_cache.key(
+            route.model, request.prompt, request.output_schema, get_template_version(request.prompt_name)
+        )
+        cached_response = await response_cache.get(cache_key)
+        if cached_response is not None:
+            responses[request.key] = cached_response
+        else:
+            cache_keys[request.key] = cache_key
+            to_submit.append(request)
+
+    logger.info(f"Batch of {len(requests)} requests, {len(responses)} answered from cache")
+    if not to_submit:
+        return responses
+
+    work_dir.mkdir(parents=True, exist_ok=True)
+    requests_path = work_dir / f"batch-{uuid.uuid4().hex}.jsonl"
+    requests_path.write_text(
+        "\n".join(r.to_json_line(route.thinking_budget) for r in to_submit) + "\n"
+    )
+
+    job_name = await backend.submit(requests_path, route)
+    logger.info(f"Submitted batch job {job_name} with {len(to_submit)} requests")
+
+    while (state := await backend.poll(job_name)) not in (BatchState.SUCCEEDED, BatchState.FAILED):
+        logger.info(f"Batch job {job_name} is {state.value}, checking again in {poll_interval}s")
+        await asyncio.sleep(poll_interval)
+    if state == BatchState.FAILED:
+        raise RuntimeError(f"Batch job {job_name} failed")
+
+    results_path = requests_path.with_suffix(".results.jsonl")
+    await backend.download_results(job_name, results_path)
+
+    failed = 0
+    for line in results_path.read_text().splitlines():
+        if not line.strip():
+            continue
+        key, text, error = parse_result_line(line)
+        if text is None:
+            failed += 1
+            logger.error(f"Batch request {key} failed: {error}")
+            continue
+        responses[key] = text
+        await response_cache.set(cache_keys[key], text)
+
+    logger.info(f"Batch job {job_name} done: {len(to_submit) - failed} succeeded, {failed} failed")
+    return responses
+
+
+async def batch_extract_listing_field_data(
+    session: AsyncSession, backend: BatchBackend, work_dir: Path, poll_interval: float = 30.0
+) -> int:
+    """Extract the field data of all listings with a new or changed webpage in one batch job."""
+    result = await session.execute(
+        select(models.Listing).options(
+            selectinload(models.Listing.websites),
+            selectinload(models.Listing.target_audience_labels),
+        )
+    )
+    # Listings whose markdown did not change since the last extraction are skipped.
+    parsed_listings = [l for l in result.scalars().all() if len(l.websites) > 0]
+    md_contents = {l.id: aggregate_markdown(l.websites, l.website) for l in parsed_listings}
+    listings = {
+        l.id: l
+        for l in parsed_listings
+        if l.field_data_hash != field_data_input_hash(md_contents[l.id])
+    }
+
+    requests = [
+        BatchRequest(
+            key=f"listing-{listing.id}",
+            prompt_name="extract_field_data_from_md.jinja",
+            prompt=render_prompt(
+                "extract_field_data_from_md.jinja",
+                md_content=md_contents[listing.id],
+                schema=ListingFieldData,
+            ),
+            output_schema=ListingFieldData,
+        )
+        for listing in listings.values()
+    ]
+    responses = await run_batch(
+        requests, backend, work_dir, AITask.FIELD_EXTRACTION, poll_interval=poll_interval
+    )
+
+    field_data: dict[int, ListingFieldData] = {}
+    for key, text in responses.items():
+        try:
+            field_data[int(key.removeprefix("listing-"))] = ListingFieldData.model_validate_json(text)
+        except ValidationError as e:
+            logger.error(f"Invalid field data for {key}: {str(e)}")
+
+    # Create all labels in one go instead of per listing.
+    names = [t.value for data in field_data.values() for t in data.target_audiences]
+    labels = await get_target_audience_labels(names, session)
+    for listing_id, data in field_data.items():
+        listing = listings[listing_id]
+        await apply_listing_field_data(listing, data, session, labels)
+        listing.field_data_hash = field_data_input_hash(md_contents[listing_id])
+    await session.commit()
+
+    logger.info(f"Updated field data of {len(field_data)} of {len(listings)} listings")
+    return len(field_data)
+
+
+async def batch_score_client_listing_matches(
+    session: AsyncSession, backend: BatchBackend, work_dir: Path, poll_interval: float = 30.0
+) -> int:
+    """Score all new or changed client and listing pairs with parsed webpages in one batch job."""
+    result = await session.execute(select(models.Client).options(selectinload(models.Client.websites)))
+    clients = [c for c in result.scalars().all() if len(c.websites) > 0]
+    result = await session.execute(select(models.Listing).options(selectinload(models.Listing.websites)))
+    listings = [l for l in result.scalars().all() if len(l.websites) > 0]
+
+    # Pairs whose markdown did not change since they were last scored are skipped.
+    result = await session.execute(
+        select(
+            models.ClientListingMatch.client_id,
+            models.ClientListingMatch.listing_id,
+            models.ClientListingMatch.input_hash,
+        )
+    )
+    stored_hashes = {(client_id, listing_id): h for client_id, listing_id, h in result.all()}
+    client_md = {c.id: aggregate_markdown(c.websites, c.website) for c in clients}
+    listing_md = {l.id: aggregate_markdown(l.websites, l.website) for l in listings}
+    input_hashes = {
+        (client.id, listing.id): match_input_hash(client_md[client.id], listing_md[listing.id])
+        for client in clients
+        for listing in listings
+    }
+
+    requests = [
+        BatchRequest(
+            key=f"match-{client.id}-{listing.id}",
+            prompt_name="score_client_listing_match.jinja",
+            prompt=render_prompt(
+                "score_client_listing_match.jinja",
+                schema=ClientListingMatchResult,
+                client_md_content=client_md[client.id],
+                subsidy_md_content=listing_md[listing.id],
+            ),
+            output_schema=ClientListingMatchResult,
+        )
+        for client in clients
+        for listing in listings
+        if stored_hashes.get((client.id, listing.id)) != input_hashes[(client.id, listing.id)]
+    ]
+    responses = await run_batch(
+        requests, backend, work_dir, AITask.MATCH_SCORING, poll_interval=poll_interval
+    )
+
+    rows = []
+    for key, text in responses.items():
+        client_id, listing_id = key.removeprefix("match-").split("-")
+        try:
+            match_result = ClientListingMatchResult.model_validate_json(text)
+        except ValidationError as e:
+            logger.error(f"Invalid match result for {key}: {str(e)}")
+            continue
+        rows.append(
+            {
+                "client_id": int(client_id),
+                "listing_id": int(listing_id),
+                "match_quality": match_result.match_quality,
+                "listing_ambiguous": match_result.listing_ambiguous,
+                "result": match_result.model_dump_json(),
+                "input_hash": input_hashes[(int(client_id), int(listing_id))],
+            }
+        )
+
+    # Stay well below the bind parameter limit of Postgres per statement.
+    for i in range(0, len(rows), 1000):
+        stmt = insert(models.ClientListingMatch).values(rows[i : i + 1000])
+        stmt = stmt.on_conflict_do_update(
+            constraint="client_listing_match_unique",
+            set_={
+                "match_quality": stmt.excluded.match_quality,
+                "listing_ambiguous": stmt.excluded.listing_ambiguous,
+                "result": stmt.excluded.result,
+                "input_hash": stmt.excluded.input_hash,
+                "updated_at": func.now(),
+            },
+        )
+        await session.execute(stmt)
+    await session.commit()
+
+    logger.info(f"Stored {len(rows)} of {len(requests)} client listing match scores")
+    return len(rows)
@@ -0,0 +1,80 @@
+import logging
+import math
+from collections import Counter
+
+from lxml import etree
+from lxml import html as lxml_html
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aanvraagapp import models
+from aanvraagapp.blob_store import blob_store
+from aanvraagapp.config import BoilerplateSettings, settings
+from .clean import block_fingerprints, clean_html
+from .content_hash import stage_input_hash
+from .cpu_pool import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+
+def learn_boilerplate(pages: list[str], config: BoilerplateSettings) -> list[str]:
+    """
+    Return the fingerprints of the blocks that repeat across the pages of
+    one provider, like cookie banners, contact blocks and site-wide lists.
+
+    Each page is cleaned first, so the fingerprints match the blocks that
+    clean_html sees when it is given the boilerplate.
+    """
+    counts: Counter[str] = Counter()
+    for page in pages:
+        cleaned = clean_html(page)
+        root = etree.fromstring(cleaned.encode("utf-8"), lxml_html.HTMLParser(encoding="utf-8"))
+        if root is not None:
+            # Count a block once per page, however often it is on the page.
+            counts.update(set(block_fingerprints(root, config.min_chars)))
+
+    threshold = max(config.min_pages, math.ceil(config.min_page_ratio * len(pages)))
+    return sorted(fingerprint for fingerprint, count in counts.items() if count >= threshold)
+
+
+def boilerplate_version(boilerplate: frozenset[str]) -> str:
+    return stage_input_hash(*sorted(boilerplate))
+
+
+async def get_provider_boilerplate(listing: models.Listing) -> frozenset[str]:
+    """The boilerplate to clean the listing page with."""
+    if not settings.boilerplate.enabled:
+        return frozenset()
+    provider = await listing.awaitable_attrs.provider
+    return frozenset(provider.boilerplate or ())
+
+
+async def learn_provider_boilerplate(provider: models.Provider, session: AsyncSession) -> int:
+    """
+    Learn the boilerplate of the provider from the stored listing pages, and
+    store it on the provider. Returns the number of fingerprints.
+    """
+    result = await session.execute(
+        select(models.Webpage.original_content_digest)
+        .join(
+            models.Listing,
+            (models.Webpage.owner_id == models.Listing.id)
+            & (models.Webpage.owner_type == models.WebpageOwnerType.LISTING),
+        )
+        .where(
+            models.Listing.provider_id == provider.id,
+            models.Webpage.original_content_digest.is_not(None),
+        )
+    )
+    pages = [await blob_store.aget(digest) for digest in result.scalars().all()]
+    boilerplate = await cpu_pool.run(
+        learn_boilerplate, pages, settings.boilerplate, input_size=sum(len(p) for p in pages)
+    )
+
+    provider.boilerplate = boilerplate
+    provider.boilerplate_pages = len(pages)
+    logger.info(
+        f"Learned {len(boilerplate)} boilerplate blocks for provider {provider.name} "
+        f"from {len(pages)} pages"
+    )
+    return len(boilerplate)
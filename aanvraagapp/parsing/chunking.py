@@ -0,0 +1,204 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import cached_property
+
+from aanvraagapp.config import ChunkingSettings
+from .content_hash import stage_input_hash
+from .rate_limit import estimate_tokens
+
+WHITESPACE = re.compile(r"\s+")
+HEADER = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+FENCE = re.compile(r"^\s*(```|~~~)")
+# Where to split a section that is too long, coarsest first: paragraphs,
+# lines, sentences and words, with the text that joins the pieces again.
+SEPARATORS = [
+    (re.compile(r"\n\s*\n"), "\n\n"),
+    (re.compile(r"\n"), "\n"),
+    (re.compile(r"(?<=[.!?;:])\s+"), " "),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@dataclass
+class MarkdownChunk:
+    text: str
+    # Titles of the enclosing headers, outermost first.
+    header_path: tuple[str, ...]
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @cached_property
+    def content_hash(self) -> str:
+        return chunk_content_hash(self.text)
+
+
+def chunk_content_hash(text: str) -> str:
+    """Hash of the text, equal for texts that only differ in whitespace or unicode normal form."""
+    return stage_input_hash(WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip())
+
+
+def split_sections(markdown: str, header_levels: int) -> list[MarkdownChunk]:
+    """Split markdown into header sections, keeping the headers. Headers in code blocks are ignored."""
+    sections: list[MarkdownChunk] = []
+    path: list[tuple[int, str]] = []
+    lines: list[str] = []
+    in_fence = False
+
+    def flush():
+        text = "\n".join(lines).strip()
+        if text:
+            sections.append(MarkdownChunk(text, tuple(title for _, title in path)))
+
+    for line in markdown.splitlines():
+        if FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADER.match(line)
+        if match and len(match.group(1)) <= header_levels:
+            flush()
+            lines = []
+            level = len(match.group(1))
+            path = [(l, title) for l, title in path if l < level] + [(level, match.group(2))]
+        lines.append(line)
+    flush()
+    return sections
+
+
+def _common_prefix(a: tuple[str, ...], b: tuple[str, ...]) -> tuple[str, ...]:
+    prefix = []
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        prefix.append(x)
+    return tuple(prefix)
+
+
+def merge_small_sections(sections: list[MarkdownChunk], config: ChunkingSettings) -> list[MarkdownChunk]:
+    """Merge sections below min_tokens into the previous or next one, as long as the result fits in max_tokens."""
+    merged: list[MarkdownChunk] = []
+    for section in sections:
+        if merged:
+            previous = merged[-1]
+            small = previous.tokens < config.min_tokens or section.tokens < config.min_tokens
+            if small and previous.tokens + section.tokens <= config.max_tokens:
+                merged[-1] = MarkdownChunk(
+                    f"{previous.text}\n\n{section.text}",
+                    _common_prefix(previous.header_path, section.header_path),
+                )
+                continue
+        merged.append(section)
+    return merged
+
+
+def split_text(text: str, config: ChunkingSettings, level: int = 0) -> list[str]:
+    """
+    Split text into pieces of about target_tokens and at most max_tokens, at
+    the coarsest separator that makes the pieces fit. Consecutive pieces
+    share the whole units (paragraphs, sentences, ...) at their boundary that
+    fit in overlap_tokens.
+    """
+    if estimate_tokens(text) <= config.max_tokens:
+        return [text]
+    if level == len(SEPARATORS):
+        # A single word longer than max_tokens, e.g. an inlined data url.
+        size = (config.max_tokens - 1) * 4
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    separator, joiner = SEPARATORS[level]
+    pieces: list[str] = []
+    current: list[str] = []
+    current_tokens = 0
+    overlap = 0  # Units at the start of current that repeat the previous piece.
+
+    for unit in separator.split(text):
+        if not unit.strip():
+            continue
+        tokens = estimate_tokens(unit)
+        if tokens > config.max_tokens:
+            sub_pieces = split_text(unit, config, level + 1)
+            if len(current) > overlap:
+                fresh = joiner.join(current[overlap:])
+                fresh_tokens = estimate_tokens(fresh)
+                # Keep e.g. a header line together with the text that follows it.
+                if fresh_tokens < config.min_tokens and fresh_tokens + estimate_tokens(sub_pieces[0]) <= config.max_tokens:
+                    sub_pieces[0] = joiner.join([fresh, sub_pieces[0]])
+                else:
+                    pieces.append(joiner.join(current))
+            current, current_tokens, overlap = [], 0, 0
+            pieces.extend(sub_pieces)
+            continue
+
+        if len(current) > overlap and current_tokens + tokens > config.target_tokens:
+            pieces.append(joiner.join(current))
+            # Carry the last units over, as far as they fit in the overlap.
+            carried: list[str] = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous)
+                if carried_tokens + previous_tokens > config.overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            if carried_tokens + tokens > config.max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens, overlap = carried, carried_tokens, len(carried)
+
+        current.append(unit)
+        current_tokens += tokens
+
+    if len(current) > overlap:
+        tail = current[overlap:]
+        tail_tokens = sum(estimate_tokens(unit) for unit in tail)
+        # Append a small remainder to the previous piece instead of making it a chunk of its own.
+        if pieces and tail_tokens < config.min_tokens and estimate_tokens(pieces[-1]) + tail_tokens <= config.max_tokens:
+            pieces[-1] = joiner.join([pieces[-1], *tail])
+        else:
+            pieces.append(joiner.join(current))
+    return pieces
+
+
+def chunk_markdown(markdown: str, config: ChunkingSettings) -> list[MarkdownChunk]:
+    """
+    Chunk markdown for embedding: split it into header sections, merge the
+    small ones, and split the long ones into token bounded pieces. Every
+    chunk keeps the header path of its section.
+    """
+    sections = merge_small_sections(split_sections(markdown, config.header_levels), config)
+    return [
+        MarkdownChunk(text, section.header_path)
+        for section in sections
+        for text in split_text(section.text, config)
+    ]
+
+
+@dataclass
+class ChunkDiff:
+    # Ids of the linked chunks to keep, with the new chunk each one stands for.
+    kept: list[tuple[int, MarkdownChunk]]
+    # Distinct new chunks the page does not link to yet.
+    added: list[MarkdownChunk]
+    # Ids of the linked chunks that are no longer on the page.
+    removed: list[int]
+
+
+def diff_chunks(chunks: list[MarkdownChunk], stored: list[tuple[int, str]]) -> ChunkDiff:
+    """
+    Match the new chunks of a page to the (id, content hash) of the chunks it
+    links to. A text that occurs more than once on the page is linked once.
+    """
+    stored_ids = {content_hash: chunk_id for chunk_id, content_hash in stored}
+    kept: list[tuple[int, MarkdownChunk]] = []
+    added: list[MarkdownChunk] = []
+    seen: set[str] = set()
+    for chunk in chunks:
+        if chunk.content_hash in seen:
+            continue
+        seen.add(chunk.content_hash)
+        if chunk.content_hash in stored_ids:
+            kept.append((stored_ids[chunk.content_hash], chunk))
+        else:
+            added.append(chunk)
+    removed = [chunk_id for content_hash, chunk_id in stored_ids.items() if content_hash not in seen]
+    return ChunkDiff(kept, added, removed)
@@ -1,4 +1,10 @@
+import hashlib
+import re
+from typing import Iterator
+
 from bs4 import BeautifulSoup, Tag, Comment
+from lxml import etree
+from lxml import html as lxml_html
 
 # Define tags and attributes to remove
 TAGS_TO_REMOVE = ['script', 'style', 'link', 'meta', 'noscript', 'header', 'footer', 'nav', 'aside']
@@ -6,11 +12,229 @@ UNWANTED_ATTRS = [
     'class', 'id', 'style', 'role', 'aria-label', 'aria-hidden', 'aria-expanded',
     'tabindex', 'onclick', 'onmouseover', 'onfocus', 'onblur',
 ]
+IMG_ATTRS = ['src', 'alt']
+
+_TAGS_TO_REMOVE = frozenset(TAGS_TO_REMOVE)
+_UNWANTED_ATTRS = frozenset(UNWANTED_ATTRS)
+# Elements whose whitespace is content.
+_PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+# Wrappers that can go when they have no attributes. Block wrappers are only
+# unwrapped when they hold no text of their own, so paragraphs do not merge.
+_INLINE_WRAPPERS = frozenset(['span', 'font'])
+_BLOCK_WRAPPERS = frozenset(['div', 'section', 'article', 'main', 'center'])
+# The only attributes that carry content for a prompt.
+_CONTENT_ATTRS = frozenset(['href', 'src', 'alt', 'colspan', 'rowspan'])
+# Elements that mean something without content.
+_KEEP_EMPTY = frozenset(['html', 'head', 'body', 'br', 'hr', 'img', 'td', 'th'])
+_BLOCK_TAGS = frozenset([
+    'address', 'article', 'blockquote', 'body', 'dd', 'div', 'dl', 'dt', 'figure', 'h1', 'h2',
+    'h3', 'h4', 'h5', 'h6', 'head', 'hr', 'html', 'li', 'main', 'ol', 'p', 'pre', 'section',
+    'table', 'tbody', 'td', 'th', 'thead', 'title', 'tr', 'ul',
+])
+_WHITESPACE = re.compile(r'\s+')
+# Elements that can hold page chrome, fingerprinted for boilerplate learning.
+_BOILERPLATE_TAGS = frozenset([
+    'article', 'aside', 'blockquote', 'div', 'dl', 'figure', 'form', 'ol', 'p', 'section',
+    'table', 'ul',
+])
+
+
+def _is_unwanted_attr(tag: str, attr: str) -> bool:
+    if tag == 'img':
+        return attr not in IMG_ATTRS
+    return attr in _UNWANTED_ATTRS or attr.startswith('data-')
+
+
+def _boilerplate_fingerprint(element, min_chars: int = 0) -> str | None:
+    text = _WHITESPACE.sub(' ', element.text_content()).strip()
+    if len(text) < max(min_chars, 1):
+        return None
+    return hashlib.blake2b(f"{element.tag}:{text}".encode(), digest_size=8).hexdigest()
+
+
+def block_fingerprints(root, min_chars: int) -> Iterator[str]:
+    """Fingerprints of the text of the blocks with at least min_chars characters."""
+    for element in root.iter(*_BOILERPLATE_TAGS):
+        fingerprint = _boilerplate_fingerprint(element, min_chars)
+        if fingerprint is not None:
+            yield fingerprint
+
+
+def _drop_boilerplate(root, boilerplate: frozenset[str]) -> None:
+    to_remove = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        if not isinstance(element.tag, str):
+            continue
+        if element.tag in _BOILERPLATE_TAGS and _boilerplate_fingerprint(element) in boilerplate:
+            to_remove.append(element)
+            continue
+        stack.extend(element)
+    for element in to_remove:
+        element.drop_tree()
+
+
+def clean_html(html: str, extract_main: bool = False, boilerplate: frozenset[str] = frozenset()) -> str:
+    """
+    Cleans HTML to remove non-content elements and attributes.
+
+    Parses with lxml, which drops comments and processing instructions while
+    parsing, and then cleans the tree in a single walk. Gives the same
+    elements, attributes and text as clean_html_bs4, without the indentation
+    that prettify() adds.
+
+    Args:
+        html: The raw HTML string.
+        extract_main: If True, tries to extract only the <main> or <article> content.
+        boilerplate: Fingerprints of blocks to drop, learned from other pages
+            of the same provider, see parsing.boilerplate.
+
+    Returns:
+        A cleaned HTML string.
+    """
+    parser = lxml_html.HTMLParser(encoding='utf-8', remove_comments=True, remove_pis=True)
+    # Parse bytes, lxml refuses str input with an encoding declaration.
+    root = etree.fromstring(html.encode('utf-8'), parser)
+    if root is None:
+        return ''
+
+    if extract_main:
+        main_content = next(root.iter('main'), None)
+        if main_content is None:
+            main_content = next(root.iter('article'), None)
+        if main_content is not None:
+            head = root.find('head')
+            if head is not None:
+                head.clear()
+            body = root.find('body')
+            if body is not None:
+                main_content.tail = None
+                body.clear()
+                body.append(main_content)
 
-def clean_html(html: str, extract_main: bool = False) -> str:
+    # Walk the tree once, depth first, without descending into removed elements.
+    to_remove = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        tag = element.tag
+        if not isinstance(tag, str):
+            # Entities and anything else the parser kept that is not an element.
+            continue
+        if tag in _TAGS_TO_REMOVE:
+            to_remove.append(element)
+            continue
+
+        for attr in element.attrib.keys():
+            if _is_unwanted_attr(tag, attr):
+                del element.attrib[attr]
+
+        if tag not in _PRESERVE_WHITESPACE:
+            # Whitespace-only text between tags carries no content.
+            if element.text is not None and not element.text.strip():
+                element.text = None
+            if element.tail is not None and not element.tail.strip():
+                element.tail = '\n'
+            stack.extend(reversed(element))
+        elif element.tail is not None and not element.tail.strip():
+            element.tail = '\n'
+
+    for element in to_remove:
+        # drop_tree keeps the text that follows the element.
+        element.drop_tree()
+    if boilerplate:
+        _drop_boilerplate(root, boilerplate)
+
+    doctype = root.getroottree().docinfo.doctype
+    output = lxml_html.tostring(root, encoding='unicode')
+    return f"{doctype}\n{output}" if doctype else output
+
+
+def _has_own_text(element) -> bool:
+    if element.text is not None and element.text.strip():
+        return True
+    return any(child.tail is not None and child.tail.strip() for child in element)
+
+
+def _compact_table(table) -> None:
+    """Replace the table's markup with one line of cells per row."""
+    rows = []
+    for row in table.iter('tr'):
+        cells = [_WHITESPACE.sub(' ', cell.text_content()).strip() for cell in row if cell.tag in ('td', 'th')]
+        if any(cells):
+            rows.append(' | '.join(cells))
+    tail = table.tail
+    table.clear()
+    table.text = '\n' + '\n'.join(rows) + '\n'
+    table.tail = tail
+
+
+def _collapse_whitespace(root) -> None:
+    for element in root.iter():
+        if not isinstance(element.tag, str) or element.tag in _PRESERVE_WHITESPACE:
+            continue
+        block = element.tag in _BLOCK_TAGS
+        # A table without rows was compacted into lines by _compact_table.
+        if element.text is not None and not (element.tag == 'table' and len(element) == 0):
+            text = _WHITESPACE.sub(' ', element.text)
+            element.text = None if block and text == ' ' else text
+        if element.tail is not None:
+            tail = _WHITESPACE.sub(' ', element.tail)
+            element.tail = '\n' if block and tail == ' ' else tail
+
+
+def compact_html(html: str, compact_tables: bool = False) -> str:
+    """
+    Shrinks the output of clean_html for use in a prompt, without losing text.
+
+    Keeps only the attributes that carry content (links, image sources and
+    alt texts, table spans), drops images without alt text and elements
+    without content, unwraps wrapper elements and collapses whitespace.
+
+    Args:
+        html: The cleaned HTML string.
+        compact_tables: If True, replaces each table by its rows as lines of
+            cells separated by "|".
+
+    Returns:
+        A compacted HTML string.
+    """
+    root = etree.fromstring(html.encode('utf-8'), lxml_html.HTMLParser(encoding='utf-8'))
+    if root is None:
+        return ''
+
+    # Children come before their parents, so wrappers that only held empty
+    # elements are empty themselves by the time they are visited.
+    for element in reversed(list(root.iter())):
+        tag = element.tag
+        if not isinstance(tag, str) or element.getparent() is None:
+            continue
+        for attr in element.attrib.keys():
+            if attr not in _CONTENT_ATTRS:
+                del element.attrib[attr]
+        if tag == 'img' and not (element.get('alt') or '').strip():
+            element.drop_tree()
+        elif compact_tables and tag == 'table':
+            _compact_table(element)
+        elif tag not in _KEEP_EMPTY and len(element) == 0 and not (element.text or '').strip():
+            element.drop_tree()
+        elif not element.attrib and (
+            tag in _INLINE_WRAPPERS or (tag in _BLOCK_WRAPPERS and not _has_own_text(element))
+        ):
+            element.drop_tag()
+
+    _collapse_whitespace(root)
+    return lxml_html.tostring(root, encoding='unicode')
+
+
+def clean_html_bs4(html: str, extract_main: bool = False) -> str:
     """
     Cleans HTML using BeautifulSoup to remove non-content elements and attributes.
 
+    The previous implementation of clean_html, kept as the reference for the
+    equivalence test and the benchmark.
+
     Args:
         html: The raw HTML string.
         extract_main: If True, tries to extract only the <main> or <article> content.
@@ -0,0 +1,41 @@
+import hashlib
+import re
+
+# Fragments of a page that change on every request without changing its
+# content: inline scripts and styles, comments, nonces and CSRF tokens,
+# cache-busting query parameters and generated timestamps.
+VOLATILE_PATTERNS = [
+    re.compile(r"<(script|style|noscript)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL),
+    re.compile(r"<!--.*?-->", re.DOTALL),
+    re.compile(r"""\s(?:nonce|integrity|data-csrf[\w-]*|csrf[\w-]*)=(?:"[^"]*"|'[^']*')""", re.IGNORECASE),
+    re.compile(r"""<input\b[^>]*name=["'][^"']*(?:token|csrf)[^"']*["'][^>]*>""", re.IGNORECASE),
+    re.compile(r"(?<=[?&])(?:v|ver|version|t|ts|cb|_)=[\w.-]+", re.IGNORECASE),
+    re.compile(r"\b\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?\b"),
+    re.compile(r"\b\d{1,2}:\d{2}:\d{2}\b"),
+]
+WHITESPACE = re.compile(r"\s+")
+WHITESPACE_BETWEEN_TAGS = re.compile(r">\s+<")
+
+
+def normalize_volatile(content: str) -> str:
+    """Strip the volatile fragments from HTML, and collapse whitespace."""
+    for pattern in VOLATILE_PATTERNS:
+        content = pattern.sub("", content)
+    content = WHITESPACE_BETWEEN_TAGS.sub("><", content)
+    return WHITESPACE.sub(" ", content).strip()
+
+
+def html_content_hash(content: str) -> str:
+    """Stable hash of HTML, equal for pages that only differ in volatile fragments."""
+    return hashlib.sha256(normalize_volatile(content).encode()).hexdigest()
+
+
+def stage_input_hash(*parts: str | None) -> str:
+    """Hash of everything a pipeline stage reads, e.g. a template version and its input."""
+    digest = hashlib.sha256()
+    for part in parts:
+        # Prefix each part with its length, so ("ab", "c") and ("a", "bc") differ.
+        encoded = (part or "").encode()
+        digest.update(f"{len(encoded)}:".encode())
+        digest.update(encoded)
+    return digest.hexdigest()
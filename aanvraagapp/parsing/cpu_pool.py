@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from functools import partial
+from typing import Callable, TypeVar
+
+from aanvraagapp.config import CPUPoolSettings, settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class CPUPoolStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    inline: int = 0
+    # Tasks submitted to the pool that did not finish yet, waiting or running.
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    seconds_in_pool: float = 0.0
+
+
+class CPUPool:
+    """
+    Process pool for CPU-heavy parsing steps, so they do not block the event
+    loop (and with it every other request in the web process).
+
+    The functions and their arguments must be picklable, so use module level
+    functions. Small inputs are processed inline, see CPUPoolSettings.
+    """
+
+    def __init__(self, config: CPUPoolSettings):
+        self.config = config
+        self._executor: ProcessPoolExecutor | None = None
+        self.stats = CPUPoolStats()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.config.max_workers,
+                mp_context=multiprocessing.get_context(self.config.start_method),
+            )
+        return self._executor
+
+    def startup(self) -> None:
+        if self.config.enabled:
+            # Workers themselves are started on demand by the executor.
+            _ = self.executor
+
+    async def run(self, fn: Callable[..., T], *args, input_size: int | None = None) -> T:
+        """Run fn(*args) in the pool, or inline when the pool is disabled or the input is small."""
+        if not self.config.enabled or (
+            input_size is not None and input_size < self.config.min_input_size
+        ):
+            self.stats.inline += 1
+            return fn(*args)
+
+        loop = asyncio.get_running_loop()
+        self.stats.submitted += 1
+        self.stats.queue_depth += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+        started = time.monotonic()
+        try:
+            result = await loop.run_in_executor(self.executor, partial(fn, *args))
+        except Exception:
+            self.stats.failed += 1
+            raise
+        finally:
+            self.stats.queue_depth -= 1
+            self.stats.seconds_in_pool += time.monotonic() - started
+        self.stats.completed += 1
+        return result
+
+    async def aclose(self) -> None:
+        if self._executor is not None:
+            # Waiting for the workers blocks, so do it off the event loop.
+            await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+            self._executor = None
+        if self.stats.submitted or self.stats.inline:
+            logger.info(f"CPU pool stats: {asdict(self.stats)}")
+        self.stats = CPUPoolStats()
+
+
+cpu_pool = CPUPool(settings.cpu_pool)
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from lxml import etree
+from lxml import html as lxml_html
+
+from aanvraagapp.config import CrawlSettings, settings
+from .cpu_pool import cpu_pool
+from .fetch import WebpageFetcher, fetcher
+
+logger = logging.getLogger(__name__)
+
+# Links to files that are not webpages.
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".odt", ".zip", ".jpg", ".jpeg",
+    ".png", ".gif", ".svg", ".webp", ".mp3", ".mp4", ".srt", ".xml", ".json", ".ics",
+)
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str, base: str | None = None) -> str | None:
+    """
+    Resolve the url against the base, and normalise it so that equal pages
+    get equal urls: lower case scheme and host, no default port, fragment,
+    tracking parameters or trailing slash, and sorted query parameters.
+    Returns None for urls that are not http(s).
+    """
+    if base is not None:
+        url = urljoin(base, url.strip())
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    netloc = parts.hostname.lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def extract_links(html: str, base_url: str) -> list[str]:
+    """The normalised urls of the links on the page, in order and without duplicates."""
+    root = etree.fromstring(html.encode("utf-8"), lxml_html.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return []
+    links: dict[str, None] = {}
+    for anchor in root.iter("a"):
+        href = anchor.get("href")
+        if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            continue
+        url = normalize_url(href, base_url)
+        if url is not None and not urlsplit(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+            links[url] = None
+    return list(links)
+
+
+def parse_sitemap(xml: str) -> tuple[list[str], list[str]]:
+    """Return the page urls and the nested sitemap urls of a sitemap or sitemap index."""
+    try:
+        root = etree.fromstring(xml.encode("utf-8"), etree.XMLParser(recover=True, resolve_entities=False))
+    except etree.XMLSyntaxError:
+        return [], []
+    if root is None:
+        return [], []
+    pages, sitemaps = [], []
+    for loc in root.iter("{*}loc"):
+        if loc.text is None:
+            continue
+        parent = loc.getparent()
+        if parent is not None and etree.QName(parent).localname == "sitemap":
+            sitemaps.append(loc.text.strip())
+        else:
+            pages.append(loc.text.strip())
+    return pages, sitemaps
+
+
+@dataclass
+class CrawlStats:
+    pages: int = 0
+    failed: int = 0
+    skipped_by_robots: int = 0
+    from_sitemaps: int = 0
+
+
+class Crawler:
+    """
+    Breadth-first crawler from an entry page, bounded in depth and number of
+    pages, staying within the scope of the entry page.
+
+    Pages of one depth are visited concurrently, up to the configured
+    concurrency, with a delay between the requests to one host. The pages
+    listed in the sitemaps of the site are visited at depth 1. What a visit
+    does is up to the caller, e.g. fetching and parsing the page into a
+    Webpage; it returns the HTML to take the links from.
+    """
+
+    def __init__(self, config: CrawlSettings, fetcher: WebpageFetcher):
+        self.config = config
+        self.fetcher = fetcher
+        self.stats = CrawlStats()
+        self._last_request: dict[str, float] = {}
+        self._host_locks: dict[str, asyncio.Lock] = {}
+
+    def in_scope(self, url: str, entry_url: str) -> bool:
+        entry = urlsplit(entry_url)
+        parts = urlsplit(url)
+        if parts.netloc != entry.netloc:
+            return False
+        if self.config.scope == "domain":
+            return True
+        prefix = entry.path.rstrip("/")
+        return parts.path == prefix or parts.path.startswith(prefix + "/")
+
+    async def polite(self, url: str) -> None:
+        """Wait until the delay since the previous request to the host has passed."""
+        host = urlsplit(url).netloc
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._last_request.get(host, 0.0) + self.config.delay_seconds - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_request[host] = time.monotonic()
+
+    async def _fetch_text(self, url: str) -> str | None:
+        await self.polite(url)
+        try:
+            result = await self.fetcher.fetch(url)
+        except httpx.HTTPError as e:
+            logger.info(f"Could not fetch {url}: {str(e)}")
+            return None
+        return result.content
+
+    async def _robots(self, entry_url: str) -> RobotFileParser | None:
+        parts = urlsplit(entry_url)
+        robots_url = urlunsplit((parts.scheme, parts.netloc, "/robots.txt", "", ""))
+        content = await self._fetch_text(robots_url)
+        if content is None:
+            return None
+        robots = RobotFileParser(robots_url)
+        robots.parse(content.splitlines())
+        return robots
+
+    async def _sitemap_urls(self, entry_url: str, robots: RobotFileParser | None) -> list[str]:
+        parts = urlsplit(entry_url)
+        queue = list(robots.site_maps() or []) if robots is not None else []
+        if not queue:
+            queue = [urlunsplit((parts.scheme, parts.netloc, "/sitemap.xml", "", ""))]
+
+        pages: list[str] = []
+        fetched = 0
+        while queue and fetched < self.config.max_sitemaps:
+            content = await self._fetch_text(queue.pop(0))
+            fetched += 1
+            if content is None:
+                continue
+            sitemap_pages, sitemaps = await cpu_pool.run(parse_sitemap, content, input_size=len(content))
+            pages.extend(sitemap_pages)
+            queue.extend(sitemaps)
+        return pages
+
+    async def crawl(
+        self, entry_url: str, visit: Callable[[str], Awaitable[str | None]]
+    ) -> list[str]:
+        """
+        Crawl from the entry url and return the urls that were visited
+        successfully, in the order of the traversal. The entry url is visited
+        as given, the other urls are normalised.
+        """
+        entry = normalize_url(entry_url)
+        assert entry is not None, f"Not a webpage url: {entry_url}"
+        seen = {entry}
+        visited: list[str] = []
+        frontier = [entry_url]
+        semaphore = asyncio.Semaphore(self.config.concurrency)
+
+        robots = None
+        if self.config.max_depth > 0 and (self.config.respect_robots or self.config.use_sitemaps):
+            robots = await self._robots(entry)
+
+        def allowed(url: str) -> bool:
+            if not self.in_scope(url, entry) or url in seen:
+                return False
+            if self.config.respect_robots and robots is not None and not robots.can_fetch("*", url):
+                self.stats.skipped_by_robots += 1
+                return False
+            return True
+
+        sitemap_urls: list[str] = []
+        if self.config.max_depth > 0 and self.config.use_sitemaps:
+            sitemap_urls = [
+                url for url in dict.fromkeys(
+                    normalize_url(url) for url in await self._sitemap_urls(entry, robots)
+                )
+                if url is not None and allowed(url)
+            ]
+            self.stats.from_sitemaps += len(sitemap_urls)
+
+        async def visit_page(url: str) -> list[str] | None:
+            async with semaphore:
+                await self.polite(url)
+                html = await visit(url)
+            if html is None:
+                self.stats.failed += 1
+                return None
+            self.stats.pages += 1
+            return await cpu_pool.run(extract_links, html, url, input_size=len(html))
+
+        attempted = 0
+        depth = 0
+        while frontier:
+            frontier = frontier[: self.config.max_pages - attempted]
+            attempted += len(frontier)
+            links_per_page = await asyncio.gather(*(visit_page(url) for url in frontier))
+            visited.extend(url for url, links in zip(frontier, links_per_page) if links is not None)
+            if depth == 0:
+                # The pages in the sitemaps are as close to the entry as its links.
+                links_per_page.append(sitemap_urls)
+            depth += 1
+            if depth > self.config.max_depth or attempted >= self.config.max_pages:
+                break
+
+            frontier = []
+            for links in links_per_page:
+                for url in links or []:
+                    if allowed(url):
+                        seen.add(url)
+                        frontier.append(url)
+
+        logger.info(f"Crawled {entry_url}: {asdict(self.stats)}")
+        return visited
+
+
+def create_crawler() -> Crawler:
+    """A crawler with its own statistics, on the shared fetcher."""
+    return Crawler(settings.crawl, fetcher)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+from aanvraagapp.config import ChunkEmbeddingSettings, settings
+from .rate_limit import estimate_tokens
+from .router import ai_router
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EmbeddingThroughput:
+    chunks: int = 0
+    tokens: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+
+class EmbeddingPipeline:
+    """
+    Embeds the chunks of webpages in batches of up to the provider maximum,
+    with a bounded number of batches in flight over all callers.
+    """
+
+    def __init__(self, config: ChunkEmbeddingSettings):
+        self.config = config
+        self._semaphore: asyncio.Semaphore | None = None
+        self.stats = EmbeddingThroughput()
+
+    @property
+    def batch_size(self) -> int:
+        return max(1, min(self.config.batch_size, settings.embedding_batch.max_batch_size))
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrent_batches)
+        return self._semaphore
+
+    async def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        async with self.semaphore:
+            return await ai_router.embed_content(texts)
+
+    async def embed(self, texts: list[str]) -> tuple[list[np.ndarray], EmbeddingThroughput]:
+        """
+        Return the embeddings of the texts, in order, and the throughput of
+        this call. The batches run concurrently.
+        """
+        started = time.monotonic()
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        embeddings = [embedding for result in results for embedding in result]
+
+        throughput = EmbeddingThroughput(
+            chunks=len(texts),
+            tokens=sum(estimate_tokens(t) for t in texts),
+            batches=len(batches),
+            seconds=time.monotonic() - started,
+        )
+        self.stats.chunks += throughput.chunks
+        self.stats.tokens += throughput.tokens
+        self.stats.batches += throughput.batches
+        self.stats.seconds += throughput.seconds
+        return embeddings, throughput
+
+    async def aclose(self) -> None:
+        if self.stats.chunks:
+            # Seconds are summed over concurrent calls, so the rates are per caller.
+            logger.info(
+                f"Chunk embedding stats: {asdict(self.stats)}, "
+                f"{self.stats.chunks_per_second:.1f} chunks/s, "
+                f"{self.stats.tokens_per_second:.0f} tokens/s"
+            )
+        # Semaphores are bound to the event loop they were first used on.
+        self._semaphore = None
+        self.stats = EmbeddingThroughput()
+
+
+embedding_pipeline = EmbeddingPipeline(settings.chunk_embedding)
@@ -0,0 +1,142 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from aanvraagapp.config import settings
+from .ai_cache import CacheBackend, CacheStats, create_cache_backend
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for embeddings, keyed on the text hash, model, task type
+    and output dimensionality.
+
+    The in-process tier is a bounded LRU, the persistent tier is the cache
+    backend configured in Settings.ai_cache. Vectors are stored as float16
+    bytes, and returned as float32 arrays decoded from those same bytes, so a
+    cache hit returns exactly what a miss would have returned.
+    """
+
+    namespace = "embedding"
+
+    def __init__(self, max_memory_entries: int):
+        self.max_memory_entries = max_memory_entries
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._backend: CacheBackend | None = None
+        self._backend_created = False
+        self.stats = CacheStats()
+        # Texts that were dropped because they occur more than once in a batch.
+        self.deduplicated = 0
+
+    @property
+    def backend(self) -> CacheBackend | None:
+        if not self._backend_created:
+            self._backend = create_cache_backend()
+            self._backend_created = True
+        return self._backend
+
+    @staticmethod
+    def key(text: str, model: str, task_type: str, output_dimensionality: int) -> str:
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        return f"{model}:{task_type}:{output_dimensionality}:{text_hash}"
+
+    @staticmethod
+    def encode(embedding: np.ndarray) -> bytes:
+        return embedding.astype(np.float16).tobytes()
+
+    @staticmethod
+    def decode(value: bytes) -> np.ndarray:
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32)
+
+    def _remember(self, key: str, value: bytes) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def _lookup(self, keys: list[str]) -> dict[str, bytes]:
+        found: dict[str, bytes] = {}
+        for key in keys:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                found[key] = value
+
+        remaining = [key for key in keys if key not in found]
+        if remaining and self.backend is not None:
+            try:
+                persisted = await self.backend.get_many(self.namespace, remaining)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.warning(f"Embedding cache lookup failed: {str(e)}")
+                persisted = {}
+            for key, value in persisted.items():
+                self._remember(key, value)
+            found.update(persisted)
+        return found
+
+    async def _store(self, items: dict[str, bytes]) -> None:
+        for key, value in items.items():
+            self._remember(key, value)
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set_many(self.namespace, items)
+            self.stats.writes += len(items)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning(f"Embedding cache write failed: {str(e)}")
+
+    async def embed(
+        self,
+        texts: list[str],
+        model: str,
+        task_type: str,
+        output_dimensionality: int,
+        embed_missing: Callable[[list[str]], Awaitable[np.ndarray]],
+    ) -> np.ndarray:
+        """
+        Return a (len(texts), output_dimensionality) array of embeddings.
+
+        Duplicate texts are embedded once, and embed_missing is only called
+        for the unique texts that are in neither cache tier.
+        """
+        if not texts:
+            return np.empty((0, output_dimensionality), dtype=np.float32)
+
+        unique_texts = list(dict.fromkeys(texts))
+        self.deduplicated += len(texts) - len(unique_texts)
+
+        keys = {t: self.key(t, model, task_type, output_dimensionality) for t in unique_texts}
+        found = await self._lookup(list(keys.values()))
+        self.stats.hits += len(found)
+
+        missing_texts = [t for t in unique_texts if keys[t] not in found]
+        self.stats.misses += len(missing_texts)
+        if missing_texts:
+            embeddings = await embed_missing(missing_texts)
+            new_items = {keys[t]: self.encode(e) for t, e in zip(missing_texts, embeddings)}
+            await self._store(new_items)
+            found.update(new_items)
+
+        return np.stack([self.decode(found[keys[t]]) for t in texts])
+
+    async def aclose(self) -> None:
+        if self._backend is not None:
+            await self._backend.aclose()
+        logger.info(
+            f"Embedding cache stats: {asdict(self.stats)}, hit rate {self.stats.hit_rate:.1%}, "
+            f"{self.deduplicated} duplicate texts dropped"
+        )
+        self._backend = None
+        self._backend_created = False
+
+
+embedding_cache = EmbeddingCache(settings.ai_cache.embedding_memory_entries)
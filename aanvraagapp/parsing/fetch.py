@@ -0,0 +1,124 @@
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass, asdict
+from urllib.parse import urlsplit
+
+import httpx
+
+from aanvraagapp.config import FetchSettings, settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status_code: int
+    # None when the page was not modified since the validators were stored.
+    content: str | None
+    etag: str | None
+    last_modified: str | None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+
+@dataclass
+class FetchStats:
+    requests: int = 0
+    not_modified: int = 0
+    bytes_downloaded: int = 0
+    errors: int = 0
+
+
+class WebpageFetcher:
+    """
+    Shared HTTP client for fetching webpages.
+
+    Connections are pooled and kept alive across requests (over HTTP/2 when
+    available), the number of concurrent requests per host is bounded, and
+    stored ETag/Last-Modified validators are sent along, so unchanged pages
+    come back as an empty 304 response.
+    """
+
+    def __init__(self, config: FetchSettings):
+        self.config = config
+        self._client: httpx.AsyncClient | None = None
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self.stats = FetchStats()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            http2 = self.config.http2 and importlib.util.find_spec("h2") is not None
+            self._client = httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                timeout=self.config.timeout_seconds,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_keepalive_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+            )
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.config.per_host_limit)
+            self._hosts[host] = semaphore
+        return semaphore
+
+    async def fetch(
+        self, url: str, etag: str | None = None, last_modified: str | None = None
+    ) -> FetchResult:
+        headers = {}
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
+
+        async with self._host_limit(url):
+            self.stats.requests += 1
+            try:
+                response = await self.client.get(url, headers=headers)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except httpx.HTTPError:
+                self.stats.errors += 1
+                raise
+
+        if response.status_code == 304:
+            self.stats.not_modified += 1
+            # The validators may be omitted from a 304, then keep the old ones.
+            return FetchResult(
+                url=url,
+                status_code=304,
+                content=None,
+                etag=response.headers.get("etag", etag),
+                last_modified=response.headers.get("last-modified", last_modified),
+            )
+
+        self.stats.bytes_downloaded += len(response.content)
+        return FetchResult(
+            url=url,
+            status_code=response.status_code,
+            content=response.text,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            logger.info(f"Webpage fetch stats: {asdict(self.stats)}")
+        self._client = None
+        # Semaphores are bound to the event loop they were first used on.
+        self._hosts = {}
+
+
+fetcher = WebpageFetcher(settings.fetch)
@@ -0,0 +1,231 @@
+import re
+from dataclasses import dataclass, field
+
+from lxml import etree
+from lxml import html as lxml_html
+
+from aanvraagapp.config import MarkdownConversionSettings
+
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = frozenset([
+    "address", "article", "blockquote", "body", "dd", "details", "dialog", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "h1", "h2", "h3", "h4", "h5", "h6", "hr", "li", "main",
+    "ol", "p", "pre", "section", "summary", "table", "ul",
+])
+# Elements without readable content, or with only interface text.
+SKIP_TAGS = frozenset([
+    "audio", "button", "canvas", "form", "iframe", "img", "input", "object", "picture",
+    "select", "svg", "template", "textarea", "video",
+])
+WHITESPACE = re.compile(r"\s+")
+LIST_ITEM = re.compile(r"(\*   |\d+\. )")
+# Placeholder for <br>, which survives whitespace collapsing.
+LINE_BREAK = "\x00"
+
+
+def _collapse(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().replace(f" {LINE_BREAK} ", LINE_BREAK).replace(LINE_BREAK, "\n")
+
+
+def _inline_content(element) -> str:
+    parts = [element.text or ""]
+    for child in element:
+        parts.append(_inline(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _wrap(content: str, marker: str) -> str:
+    text = content.strip()
+    if not text:
+        return content
+    lead = " " if content[:1].isspace() else ""
+    trail = " " if content[-1:].isspace() else ""
+    return f"{lead}{marker}{text}{marker}{trail}"
+
+
+def _inline(element) -> str:
+    tag = element.tag
+    if not isinstance(tag, str) or tag in SKIP_TAGS:
+        return ""
+    if tag == "br":
+        return f" {LINE_BREAK} "
+    content = _inline_content(element)
+    if tag == "a":
+        text = _collapse(content)
+        href = element.get("href")
+        if text and href and not href.startswith(("#", "javascript:")):
+            return f"[{text}]({href})"
+        return content
+    if tag in ("strong", "b"):
+        return _wrap(content, "**")
+    if tag in ("em", "i"):
+        return _wrap(content, "*")
+    if tag == "code":
+        return _wrap(content, "`")
+    if tag in BLOCK_TAGS:
+        # A block inside inline content, e.g. a <div> in a link, becomes a space.
+        return f" {content} "
+    return content
+
+
+def _render_children(element, out: list[str]) -> None:
+    buffer = [element.text or ""]
+    for child in element:
+        if isinstance(child.tag, str) and child.tag in BLOCK_TAGS:
+            _flush(buffer, out)
+            buffer = []
+            _render_block(child, out)
+        else:
+            buffer.append(_inline(child))
+        buffer.append(child.tail or "")
+    _flush(buffer, out)
+
+
+def _flush(buffer: list[str], out: list[str]) -> None:
+    text = _collapse("".join(buffer))
+    if text:
+        out.append(text)
+
+
+def _render_list(element, out: list[str]) -> None:
+    items = []
+    ordered = element.tag == "ol"
+    for i, item in enumerate(c for c in element if c.tag == "li"):
+        blocks: list[str] = []
+        _render_children(item, blocks)
+        if not blocks:
+            continue
+        marker = f"{i + 1}. " if ordered else "*   "
+        indent = " " * len(marker)
+        # Nested lists stay tight, other blocks in the item are paragraphs.
+        text = blocks[0] + "".join(
+            ("\n" if LIST_ITEM.match(b) else "\n\n") + b for b in blocks[1:]
+        )
+        lines = text.split("\n")
+        items.append(marker + lines[0] + "".join(f"\n{indent}{l}" if l else "\n" for l in lines[1:]))
+    if items:
+        out.append("\n".join(items))
+
+
+def _render_table(element) -> str | None:
+    rows = []
+    for row in element.iter("tr"):
+        cells = [_collapse(_inline_content(c)).replace("|", "\\|").replace("\n", " ")
+                 for c in row if c.tag in ("td", "th")]
+        if any(cells):
+            rows.append(cells)
+    if not rows:
+        return None
+    width = max(len(r) for r in rows)
+    rows = [r + [""] * (width - len(r)) for r in rows]
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * width]
+    lines += ["| " + " | ".join(r) + " |" for r in rows[1:]]
+    return "\n".join(lines)
+
+
+def _render_block(element, out: list[str]) -> None:
+    tag = element.tag
+    if tag in SKIP_TAGS or tag == "hr":
+        return
+    if tag in HEADINGS:
+        text = _collapse(_inline_content(element)).replace("\n", " ")
+        if text:
+            out.append("#" * HEADINGS[tag] + " " + text)
+    elif tag in ("ul", "ol"):
+        _render_list(element, out)
+    elif tag == "pre":
+        out.append("```\n" + element.text_content().strip("\n") + "\n```")
+    elif tag == "blockquote":
+        blocks: list[str] = []
+        _render_children(element, blocks)
+        if blocks:
+            out.append("\n".join(f"> {line}" for line in "\n\n".join(blocks).split("\n")))
+    elif tag == "table":
+        table = _render_table(element)
+        if table:
+            out.append(table)
+    else:
+        _render_children(element, out)
+
+
+def _content_root(root):
+    """The <main> or <article> element if there is one, otherwise the <body>."""
+    for tag in ("main", "article"):
+        element = next(root.iter(tag), None)
+        if element is not None:
+            return element
+    body = root.find("body")
+    return body if body is not None else root
+
+
+def _text_length(element) -> int:
+    return len(WHITESPACE.sub(" ", element.text_content()).strip())
+
+
+@dataclass
+class MarkdownQuality:
+    chars: int
+    headings: int
+    top_level_headings: int
+    # Share of the page text that ended up in the converted content region.
+    text_ratio: float
+    # Share of the converted text that is link text.
+    link_density: float
+    problems: list[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.problems
+
+
+def assess_quality(
+    markdown: str, text_ratio: float, link_density: float, config: MarkdownConversionSettings
+) -> MarkdownQuality:
+    heading_levels = [len(m.group(1)) for m in re.finditer(r"^(#{1,6}) ", markdown, re.MULTILINE)]
+    quality = MarkdownQuality(
+        chars=len(markdown),
+        headings=len(heading_levels),
+        top_level_headings=heading_levels.count(1),
+        text_ratio=text_ratio,
+        link_density=link_density,
+    )
+    if quality.chars < config.min_chars:
+        quality.problems.append(f"only {quality.chars} characters")
+    if quality.top_level_headings != 1:
+        quality.problems.append(f"{quality.top_level_headings} top level headings instead of 1")
+    if quality.headings < config.min_headings:
+        quality.problems.append(f"only {quality.headings} headings")
+    if text_ratio < config.min_text_ratio:
+        quality.problems.append(f"content region holds {text_ratio:.0%} of the page text")
+    if link_density > config.max_link_density:
+        quality.problems.append(f"{link_density:.0%} of the text is link text")
+    return quality
+
+
+def convert_html_to_markdown(
+    cleaned_html: str, config: MarkdownConversionSettings
+) -> tuple[str, MarkdownQuality]:
+    """
+    Convert the output of clean_html into markdown with rules, and judge
+    whether the result is good enough to skip the LLM rewrite.
+    """
+    root = etree.fromstring(cleaned_html.encode("utf-8"), lxml_html.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return "", assess_quality("", 0.0, 0.0, config)
+
+    content = _content_root(root)
+    blocks: list[str] = []
+    _render_block(content, blocks)
+    markdown = "\n\n".join(blocks)
+
+    page_text = _text_length(root)
+    content_text = _text_length(content)
+    link_text = sum(_text_length(a) for a in content.iter("a"))
+    quality = assess_quality(
+        markdown,
+        text_ratio=content_text / page_text if page_text else 0.0,
+        link_density=link_text / content_text if content_text else 0.0,
+        config=config,
+    )
+    return markdown, quality
@@ -2,33 +2,157 @@ import httpx
 from sqlalchemy.dialects.postgresql import insert
 import logging
 from aanvraagapp import models
-from .ai_client import get_client
+from aanvraagapp.blob_store import blob_store
+from .ai_cache import response_cache
+from .router import ai_router
+from .single_flight import single_flight
 from aanvraagapp.config import settings
-from aanvraagapp.parsing.prompts import prompts
-from aanvraagapp.parsing.structured_outputs import StructuredOutputSchema, ListingFieldData, ClientFieldData, ClientListingMatchResult
-from .clean import clean_html
-from langchain_text_splitters import MarkdownHeaderTextSplitter
+from aanvraagapp.parsing.prompts import prompts, get_template_version
+from aanvraagapp.parsing.structured_outputs import StructuredOutputSchema, ListingFieldData, ClientFieldData, ClientListingMatchResult, parse_structured_output
+from .clean import clean_html, compact_html
+from .markdown import convert_html_to_markdown
+from .boilerplate import boilerplate_version, get_provider_boilerplate
+from .content_hash import html_content_hash, stage_input_hash
+from .fetch import FetchResult, fetcher
+from .crawl import create_crawler, normalize_url
+from .chunking import chunk_markdown, diff_chunks
+from .cpu_pool import cpu_pool
+from .embed_pipeline import embedding_pipeline
+from .rate_limit import estimate_tokens
 from typing import TypeVar, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, select, update
 from sqlalchemy.orm import selectinload
 from typing import Sequence
-from aanvraagapp.types import FinancialInstrument
+from aanvraagapp.types import AITask, FinancialInstrument
 from pydantic import BaseModel, Field
+from dataclasses import dataclass
 
 
 logger = logging.getLogger(__name__)
 
 
 # UTILS
-async def clean_and_parse_into_md(url: str, prompt_name: str):
+def render_prompt(prompt_name: str, **context) -> str:
+    template = prompts.get_template(prompt_name)
+    return template.render(**context)
+
+
+def markdown_input_hash(prompt_name: str, cleaned_html: str) -> str:
+    """Hash of everything the markdown conversion reads: the cleaned HTML, the prompt and the conversion settings."""
+    return stage_input_hash(
+        html_content_hash(cleaned_html),
+        get_template_version(prompt_name),
+        settings.markdown_conversion.model_dump_json(),
+    )
+
+
+def field_data_input_hash(md_content: str | None) -> str:
+    return stage_input_hash(get_template_version("extract_field_data_from_md.jinja"), md_content)
+
+
+def match_input_hash(client_md_content: str | None, listing_md_content: str | None) -> str:
+    return stage_input_hash(
+        get_template_version("score_client_listing_match.jinja"),
+        client_md_content,
+        listing_md_content,
+    )
+
+
+async def generate_from_template(
+    task: AITask,
+    prompt_name: str,
+    output_schema: type[BaseModel] | None = None,
+    **context,
+) -> str:
+    """
+    Render the prompt template and generate a response for it, on the
+    backend that the model router picks for the task. Responses are cached
+    on the model, rendered prompt, output schema and template version, so
+    byte-identical prompts are only paid for once, also when they are
+    requested concurrently.
+    """
+    prompt_content = render_prompt(prompt_name, **context)
+    template_version = get_template_version(prompt_name)
+
+    route = ai_router.route(task)
+    cache_key = response_cache.key(
+        route.model, prompt_content, output_schema, template_version
+    )
+
+    async def generate() -> str:
+        cached_response = await response_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"Using cached response for prompt {prompt_name}")
+            return cached_response
+
+        response, used_route = await ai_router.generate(task, prompt_content, output_schema)
+        used_cache_key = response_cache.key(
+            used_route.model, prompt_content, output_schema, template_version
+        )
+        await response_cache.set(used_cache_key, response)
+        return response
+
+    # Identical prompts that are generated at the same time share one request.
+    return await single_flight.do(f"generate:{cache_key}", generate)
+
+
+@dataclass
+class ParsedWebpage:
+    fetched: FetchResult
+    # The fields below are None when the page was not modified, or only in
+    # volatile fragments.
+    original_content_hash: str | None = None
+    filtered_content: str | None = None
+    filtered_content_hash: str | None = None
+    markdown_content: str | None = None
+
+    @property
+    def changed(self) -> bool:
+        return self.original_content_hash is not None
+
+
+async def clean_and_parse_into_md(
+    url: str,
+    prompt_name: str,
+    webpage: models.Webpage | None = None,
+    boilerplate: frozenset[str] = frozenset(),
+) -> ParsedWebpage:
+    """
+    Fetch the page, clean it and rewrite it into Markdown. When the stored
+    webpage is given, the page is fetched conditionally, and the cleaning
+    and rewrite are skipped when their input did not change. Blocks in the
+    boilerplate of the provider are dropped while cleaning.
+    """
+    previous = (
+        (webpage.etag, webpage.last_modified, webpage.original_content_hash, webpage.filtered_content_hash)
+        if webpage is not None
+        else None
+    )
+    # Concurrent requests for the same page, e.g. two users adding the same
+    # website, share one fetch and rewrite.
+    return await single_flight.do(
+        f"clean_and_parse_into_md:{prompt_name}:{url}:{previous}:{boilerplate_version(boilerplate)}",
+        lambda: _clean_and_parse_into_md(url, prompt_name, webpage, boilerplate),
+    )
+
+
+async def _clean_and_parse_into_md(
+    url: str, prompt_name: str, webpage: models.Webpage | None, boilerplate: frozenset[str]
+) -> ParsedWebpage:
     # Get the raw HTML data from the web page.
     try:
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            html_content = response.text
-            logger.info(f"Successfully fetched html content for {url}")
+        fetched = await fetcher.fetch(
+            url,
+            etag=webpage.etag if webpage is not None else None,
+            last_modified=webpage.last_modified if webpage is not None else None,
+        )
+        if fetched.not_modified:
+            logger.info(f"Not modified since last fetch: {url}")
+            return ParsedWebpage(fetched)
+        html_content = fetched.content
+        assert html_content is not None
+        logger.info(f"Successfully fetched html content for {url}")
         if not html_content.strip():
             logger.warning(f"No HTML content found in response from {url}")
             raise ValueError("Empty HTML")
@@ -37,19 +161,69 @@ async def clean_and_parse_into_md(url: str, prompt_name: str):
         logger.error(f"Listing API request failed : {str(e)}")
         logger.error(f"Error type: {type(e).__name__}")
         raise e
-    logger.info(f"Successfully cleaned HTML from {url}")
+
+    original_content_hash = html_content_hash(html_content)
+    if boilerplate:
+        # Clean the page again when the boilerplate it was cleaned with changed.
+        original_content_hash = stage_input_hash(original_content_hash, boilerplate_version(boilerplate))
+    if webpage is not None and webpage.original_content_hash == original_content_hash:
+        logger.info(f"Content unchanged apart from volatile fragments: {url}")
+        return ParsedWebpage(fetched)
 
     # Throw away as much junk as possible.
     # cleaned_html = simplify_html(html_content)
-    cleaned_html = clean_html(html_content)
+    cleaned_html = await cpu_pool.run(
+        clean_html, html_content, False, boilerplate, input_size=len(html_content)
+    )
+    logger.info(f"Successfully cleaned HTML from {url}")
 
-    # Ask AI to rewrite into Markdown
-    template = prompts.get_template(prompt_name)
-    prompt_content = template.render(html_content=cleaned_html)
-    ai_client = get_client("gemini")
-    converted_to_markdown = await ai_client.generate_content(prompt_content)
+    filtered_content_hash = markdown_input_hash(prompt_name, cleaned_html)
+    if (
+        webpage is not None
+        and webpage.filtered_content_hash == filtered_content_hash
+        and webpage.markdown_content is not None
+    ):
+        # Only content that the cleaning throws away changed, and the
+        # conversion prompt and settings are the same.
+        logger.info(f"Cleaned content unchanged, skipping rewrite: {url}")
+        converted_to_markdown = webpage.markdown_content
+    else:
+        converted_to_markdown = await convert_into_md(url, prompt_name, cleaned_html)
+
+    return ParsedWebpage(
+        fetched,
+        original_content_hash=original_content_hash,
+        filtered_content=cleaned_html,
+        filtered_content_hash=filtered_content_hash,
+        markdown_content=converted_to_markdown,
+    )
 
-    return html_content, cleaned_html, converted_to_markdown
+
+async def convert_into_md(url: str, prompt_name: str, cleaned_html: str) -> str:
+    config = settings.markdown_conversion
+    if config.fast_path:
+        markdown, quality = await cpu_pool.run(
+            convert_html_to_markdown, cleaned_html, config, input_size=len(cleaned_html)
+        )
+        if quality.passed:
+            logger.info(f"Converted {url} to markdown without AI ({quality.chars} characters)")
+            return markdown
+        logger.info(f"Markdown conversion of {url} not good enough ({'; '.join(quality.problems)}), asking AI")
+
+    html_content = cleaned_html
+    if config.compact_html:
+        html_content = await cpu_pool.run(
+            compact_html, cleaned_html, config.compact_tables, input_size=len(cleaned_html)
+        )
+        logger.info(
+            f"Compacted HTML of {url} from {estimate_tokens(cleaned_html)} to "
+            f"{estimate_tokens(html_content)} estimated tokens"
+        )
+
+    # Ask AI to rewrite into Markdown
+    return await generate_from_template(
+        AITask.REWRITE_MARKDOWN, prompt_name, html_content=html_content
+    )
 
 
 T = TypeVar("T", bound=StructuredOutputSchema)
@@ -58,96 +232,335 @@ T = TypeVar("T", bound=StructuredOutputSchema)
 async def extract_field_data(
     md_content: str, prompt_name: str, output_schema: type[T]
 ) -> T:
-    ai_client = get_client("gemini")
-    template = prompts.get_template(prompt_name)
-    prompt_content = template.render(md_content=md_content, schema=output_schema)
-    json_with_field_data = await ai_client.generate_content(
-        prompt_content, output_schema=output_schema
+    json_with_field_data = await generate_from_template(
+        AITask.FIELD_EXTRACTION, prompt_name, output_schema, md_content=md_content, schema=output_schema
     )
     # Gemini does not support sets in its schema enforcement (unique values),
     # however, by instantiating the schema, we filter out duplicates for set
     # fields in Pydantic.
-    field_data = output_schema.model_validate_json(json_with_field_data)
+    field_data = await cpu_pool.run(
+        parse_structured_output,
+        output_schema,
+        json_with_field_data,
+        input_size=len(json_with_field_data),
+    )
     return field_data
 
 
 # WEBPAGE
-async def chunk_webpage(webpage: models.Webpage, session: AsyncSession):
-    ai_client = get_client("gemini")
+async def get_webpage(
+    owner_type: models.WebpageOwnerType, owner_id: int, url: str, session: AsyncSession
+) -> models.Webpage | None:
+    result = await session.execute(
+        select(models.Webpage)
+        .where(
+            models.Webpage.owner_type == owner_type,
+            models.Webpage.owner_id == owner_id,
+            models.Webpage.url == url,
+        )
+        .order_by(models.Webpage.id.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def parse_webpage(
+    owner_type: models.WebpageOwnerType,
+    owner_id: int,
+    url: str,
+    prompt_name: str,
+    session: AsyncSession,
+    boilerplate: frozenset[str] = frozenset(),
+) -> models.Webpage:
+    """
+    Fetch, clean and rewrite the webpage of an owner, and store it. A page
+    that was parsed before is updated in place, and left untouched when it
+    was not modified.
+    """
+    webpage = await get_webpage(owner_type, owner_id, url, session)
+    parsed = await clean_and_parse_into_md(url, prompt_name, webpage, boilerplate)
+    return await store_parsed_webpage(owner_type, owner_id, url, webpage, parsed, session)
+
+
+async def store_parsed_webpage(
+    owner_type: models.WebpageOwnerType,
+    owner_id: int,
+    url: str,
+    webpage: models.Webpage | None,
+    parsed: ParsedWebpage,
+    session: AsyncSession,
+) -> models.Webpage:
+    if webpage is None:
+        assert parsed.changed
+        webpage = models.Webpage(owner_type=owner_type, owner_id=owner_id, url=url)
+        session.add(webpage)
+
+    webpage.etag = parsed.fetched.etag
+    webpage.last_modified = parsed.fetched.last_modified
+    if parsed.changed:
+        assert parsed.fetched.content is not None and parsed.filtered_content is not None
+        # The HTML goes to the blob store, where identical pages are stored once.
+        webpage.original_content_digest = await blob_store.aput(parsed.fetched.content)
+        webpage.original_content_hash = parsed.original_content_hash
+        webpage.filtered_content_digest = await blob_store.aput(parsed.filtered_content)
+        webpage.filtered_content_hash = parsed.filtered_content_hash
+        webpage.markdown_content = parsed.markdown_content
+    return webpage
 
-    headers_to_split_on = [
-        ("#", "Header 1"),
-        ("##", "Header 2"),
-    ]
 
-    markdown_splitter = MarkdownHeaderTextSplitter(
-        headers_to_split_on, strip_headers=False
-    )
-    md_header_splits = markdown_splitter.split_text(webpage.markdown_content)
-    logger.info(
-        f"Split text into {len(md_header_splits)} chunks from webpage {webpage.url}"
+async def crawl_webpages(
+    owner_type: models.WebpageOwnerType,
+    owner_id: int,
+    url: str,
+    prompt_name: str,
+    session: AsyncSession,
+    boilerplate: frozenset[str] = frozenset(),
+) -> list[models.Webpage]:
+    """
+    Crawl the website of an owner from its entry url, see crawl.Crawler, and
+    parse and store every page like parse_webpage does. Pages are fetched and
+    parsed concurrently; the session is only used before and after the crawl.
+    Stored pages that are gone from the site (404 or 410) or out of the
+    crawl scope are deleted, with their chunk links. Pages the crawl did not
+    visit this time, e.g. because of the page limit, or failed on otherwise
+    are kept.
+    """
+    result = await session.execute(
+        select(models.Webpage)
+        .where(
+            models.Webpage.owner_type == owner_type,
+            models.Webpage.owner_id == owner_id,
+        )
     )
-    chunks = []
-    for i in range(0, len(md_header_splits), 16):
-        cur_set = md_header_splits[i : i + 16]
-        texts = [i.page_content for i in cur_set]
-        embeddings = await ai_client.embed_content(texts)
-        for e, t in zip(embeddings, texts):
-            c = models.Chunk(
-                owner_type=models.ChunkOwnerType.WEBPAGE,
-                owner_id=webpage.id,
-                content=t,
-                emb=e,
-            )
-            session.add(c)
-            chunks.append(c)
+    stored = {webpage.url: webpage for webpage in result.scalars().all()}
+    parsed_pages: dict[str, ParsedWebpage] = {}
+    gone_urls: set[str] = set()
+
+    async def visit(page_url: str) -> str | None:
+        webpage = stored.get(page_url)
+        try:
+            parsed = await clean_and_parse_into_md(page_url, prompt_name, webpage, boilerplate)
+        except (httpx.HTTPError, ValueError) as e:
+            if page_url == url:
+                raise
+            logger.warning(f"Skipping {page_url}: {str(e)}")
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (404, 410):
+                gone_urls.add(page_url)
+            return None
+        parsed_pages[page_url] = parsed
+        if parsed.fetched.content is not None:
+            return parsed.fetched.content
+        # The links of pages that were not modified come from the stored HTML.
+        return await blob_store.aget_optional(webpage.original_content_digest if webpage is not None else None)
+
+    crawler = create_crawler()
+    crawled_urls = await crawler.crawl(url, visit)
+
+    entry = normalize_url(url)
+    assert entry is not None
+    stale = [
+        webpage for page_url, webpage in stored.items()
+        if page_url != url and (page_url in gone_urls or not crawler.in_scope(page_url, entry))
+    ]
+    if stale:
+        await delete_webpages(stale, session)
+        logger.info(f"Deleted {len(stale)} webpages of {url} that are gone or out of scope")
 
+    return [
+        await store_parsed_webpage(
+            owner_type, owner_id, page_url, stored.get(page_url), parsed_pages[page_url], session
+        )
+        for page_url in crawled_urls
+    ]
 
-# LISTING
-async def parse_webpage_from_listing(listing: models.Listing, session: AsyncSession):
-    html_content, cleaned_html, converted_to_markdown = await clean_and_parse_into_md(
-        listing.website, "rewrite_subsidy_in_md.jinja"
-    )
 
-    webpage = models.Webpage(
-        owner_type=models.WebpageOwnerType.LISTING,
-        owner_id=listing.id,
-        url=listing.website,
-        original_content=html_content,
-        filtered_content=cleaned_html,
-        markdown_content=converted_to_markdown,
+async def delete_webpages(webpages: Sequence[models.Webpage], session: AsyncSession) -> None:
+    """Delete the webpages, their chunk links and the chunks only they linked to."""
+    webpage_ids = [webpage.id for webpage in webpages]
+    links = models.webpage_chunk_association
+    result = await session.execute(
+        delete(links).where(links.c.webpage_id.in_(webpage_ids)).returning(links.c.chunk_id)
+    )
+    chunk_ids = list(set(result.scalars().all()))
+    await delete_orphan_chunks(chunk_ids, session)
+    await session.execute(delete(models.Webpage).where(models.Webpage.id.in_(webpage_ids)))
+
+
+def aggregate_markdown(webpages: Sequence[models.Webpage], entry_url: str) -> str:
+    """
+    The markdown of all crawled pages of an owner as one document, the entry
+    page first, for the extraction and scoring prompts.
+    """
+    ordered = sorted(webpages, key=lambda w: (w.url != entry_url, w.url))
+    return "\n\n".join(w.markdown_content for w in ordered if w.markdown_content)
+
+
+async def find_chunk_ids(content_hashes: list[str], session: AsyncSession) -> dict[str, int]:
+    """
+    The ids of the chunks in the chunk store with these content hashes. The
+    rows are locked FOR KEY SHARE until the transaction ends, so another page
+    cannot delete them as orphans before this page links to them.
+    """
+    if not content_hashes:
+        return {}
+    result = await session.execute(
+        select(models.Chunk.content_hash, models.Chunk.id)
+        .where(models.Chunk.content_hash.in_(content_hashes))
+        .order_by(models.Chunk.id)
+        .with_for_update(read=True, key_share=True)
+    )
+    return dict(result.tuples().all())
+
+
+async def delete_orphan_chunks(chunk_ids: list[int], session: AsyncSession) -> None:
+    """
+    Delete the chunks among chunk_ids that no webpage links to anymore. Rows
+    another page has locked in find_chunk_ids are about to be linked again,
+    so they are skipped.
+    """
+    links = models.webpage_chunk_association
+    orphans = (
+        select(models.Chunk.id)
+        .where(
+            models.Chunk.id.in_(chunk_ids),
+            ~select(links.c.chunk_id).where(links.c.chunk_id == models.Chunk.id).exists(),
+        )
+        .order_by(models.Chunk.id)
+        .with_for_update(skip_locked=True)
+    )
+    await session.execute(delete(models.Chunk).where(models.Chunk.id.in_(orphans)))
+
+
+async def chunk_webpage(webpage: models.Webpage, session: AsyncSession, force: bool = False) -> int:
+    """
+    Chunk the markdown of the webpage and link it to its chunks. Chunks are
+    shared by all webpages with the same text, so only texts that are new to
+    the whole chunk store are embedded. On a re-crawl the unchanged chunks
+    stay linked, and chunks no page links to anymore are deleted. With force
+    the page is chunked even if its markdown did not change, e.g. when its
+    chunks were dropped. Returns the number of chunks embedded.
+    """
+    # Other chunking settings give other chunks, so they are part of the hash.
+    chunked_content_hash = stage_input_hash(
+        settings.chunking.model_dump_json(), webpage.markdown_content
+    )
+    if not force and webpage.chunked_content_hash == chunked_content_hash:
+        logger.info(f"Markdown of webpage {webpage.url} unchanged, keeping its chunks")
+        return 0
+
+    chunks = await cpu_pool.run(
+        chunk_markdown,
+        webpage.markdown_content or "",
+        settings.chunking,
+        input_size=len(webpage.markdown_content or ""),
+    )
+    links = models.webpage_chunk_association
+    result = await session.execute(
+        select(links.c.chunk_id, models.Chunk.content_hash, links.c.header_path)
+        .join(models.Chunk, models.Chunk.id == links.c.chunk_id)
+        .where(links.c.webpage_id == webpage.id)
+    )
+    stored = result.all()
+    diff = diff_chunks(chunks, [(row.chunk_id, row.content_hash) for row in stored])
+    chunk_ids = await find_chunk_ids([chunk.content_hash for chunk in diff.added], session)
+    new_chunks = [chunk for chunk in diff.added if chunk.content_hash not in chunk_ids]
+    logger.info(
+        f"Split text into {len(chunks)} chunks from webpage {webpage.url}: "
+        f"{len(diff.kept)} unchanged, {len(diff.added) - len(new_chunks)} shared with other pages, "
+        f"{len(new_chunks)} new, {len(diff.removed)} removed"
     )
-    session.add(webpage)
 
-    return webpage
+    # Embed before writing anything, so a failed call leaves the stored chunks as they were.
+    embeddings, throughput = await embedding_pipeline.embed([chunk.text for chunk in new_chunks])
 
+    stored_header_paths = {row.chunk_id: row.header_path for row in stored}
+    moved = [
+        {"b_chunk_id": chunk_id, "b_header_path": list(chunk.header_path)}
+        for chunk_id, chunk in diff.kept
+        if stored_header_paths[chunk_id] != list(chunk.header_path)
+    ]
+    async with session.begin_nested():
+        if new_chunks:
+            # All new chunks of the page in one INSERT. A concurrent page with
+            # the same text may have stored it in the meantime; then its row is
+            # used. Rows go in in hash order, so two pages inserting the same
+            # texts take their locks in the same order and cannot deadlock.
+            result = await session.execute(
+                insert(models.Chunk)
+                .values(
+                    [
+                        {"content": chunk.text, "content_hash": chunk.content_hash, "emb": embedding}
+                        for chunk, embedding in sorted(
+                            zip(new_chunks, embeddings), key=lambda pair: pair[0].content_hash
+                        )
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=[models.Chunk.content_hash])
+                .returning(models.Chunk.content_hash, models.Chunk.id)
+            )
+            chunk_ids.update(result.tuples().all())
+            chunk_ids.update(await find_chunk_ids(
+                [chunk.content_hash for chunk in new_chunks if chunk.content_hash not in chunk_ids], session
+            ))
+
+        if diff.removed:
+            await session.execute(
+                delete(links).where(links.c.webpage_id == webpage.id, links.c.chunk_id.in_(diff.removed))
+            )
+            await delete_orphan_chunks(diff.removed, session)
+        if moved:
+            # Same text under another header.
+            await session.execute(
+                update(links)
+                .where(links.c.webpage_id == webpage.id, links.c.chunk_id == bindparam("b_chunk_id"))
+                .values(header_path=bindparam("b_header_path")),
+                moved,
+            )
+        if diff.added:
+            await session.execute(
+                insert(links).values(
+                    [
+                        {
+                            "webpage_id": webpage.id,
+                            "chunk_id": chunk_ids[chunk.content_hash],
+                            "header_path": list(chunk.header_path),
+                        }
+                        for chunk in diff.added
+                    ]
+                )
+            )
+        webpage.chunked_content_hash = chunked_content_hash
 
-async def parse_field_data_from_listing(listing: models.Listing, session: AsyncSession):
-    assert len(listing.websites) > 0, "No parsed websites yet"
-    assert len(listing.websites) == 1, (
-        "Support only single website from entry url at this moment"
-    )
-    assert len(listing.target_audience_labels) == 0, "Labels are already added to this listing"
+    if throughput.chunks:
+        logger.info(
+            f"Embedded {throughput.chunks} chunks ({throughput.tokens} tokens) of {webpage.url} "
+            f"in {throughput.batches} batches, {throughput.seconds:.2f}s: "
+            f"{throughput.chunks_per_second:.1f} chunks/s, {throughput.tokens_per_second:.0f} tokens/s"
+        )
+    return throughput.chunks
 
-    webpage = listing.websites[0]
 
-    field_data = await extract_field_data(
-        webpage.markdown_content, "extract_field_data_from_md.jinja", ListingFieldData
+# LISTING
+async def parse_webpage_from_listing(listing: models.Listing, session: AsyncSession):
+    return await crawl_webpages(
+        models.WebpageOwnerType.LISTING,
+        listing.id,
+        listing.website,
+        "rewrite_subsidy_in_md.jinja",
+        session,
+        await get_provider_boilerplate(listing),
     )
 
-    listing.is_open = field_data.is_open
-    listing.opens_at = field_data.opens_at
-    listing.closes_at = field_data.closes_at
-    listing.last_checked = field_data.last_checked
-    listing.name = field_data.name
-    listing.financial_instrument = field_data.financial_instrument
-    listing.target_audience_desc = field_data.target_audience_desc
 
-    # Ensure all extracted target audience names exist. If one of them
-    # already exists, no conflict occurs.
-    extracted_target_audience_names = [t.value for t in field_data.target_audiences]
-    for name in extracted_target_audience_names:
-        stmt = insert(models.TargetAudienceLabel).values(name=name)
+async def get_target_audience_labels(
+    names: list[str], session: AsyncSession
+) -> dict[str, models.TargetAudienceLabel]:
+    """Get the labels with the given names, creating the ones that don't exist yet."""
+    if names:
+        # If one of them already exists, no conflict occurs.
+        stmt = insert(models.TargetAudienceLabel).values(
+            [{"name": name} for name in dict.fromkeys(names)]
+        )
         stmt = stmt.on_conflict_do_nothing(index_elements=['name'])
         await session.execute(stmt)
     
@@ -157,51 +570,89 @@ async def parse_field_data_from_listing(listing: models.Listing, session: AsyncS
     # Now fetch all the labels (both newly created and pre-existing)
     result = await session.execute(
         select(models.TargetAudienceLabel).where(
-            models.TargetAudienceLabel.name.in_(extracted_target_audience_names)
+            models.TargetAudienceLabel.name.in_(names)
         )
     )
-    target_audience_labels = list(result.scalars().all())
-    
+    return {label.name: label for label in result.scalars().all()}
+
+
+async def apply_listing_field_data(
+    listing: models.Listing,
+    field_data: ListingFieldData,
+    session: AsyncSession,
+    labels: dict[str, models.TargetAudienceLabel] | None = None,
+):
+    """
+    Copy extracted field data onto the listing, replacing its target audience
+    labels. Labels can be passed in when applying many results at once.
+    """
+    listing.is_open = field_data.is_open
+    listing.opens_at = field_data.opens_at
+    listing.closes_at = field_data.closes_at
+    listing.last_checked = field_data.last_checked
+    listing.name = field_data.name
+    listing.financial_instrument = field_data.financial_instrument
+    listing.target_audience_desc = field_data.target_audience_desc
+
+    # Ensure all extracted target audience names exist.
+    extracted_target_audience_names = [t.value for t in field_data.target_audiences]
+    if labels is None:
+        labels = await get_target_audience_labels(extracted_target_audience_names, session)
+
     # Associate all labels with the listing
-    for label in target_audience_labels:
-        listing.target_audience_labels.append(label)
+    listing.target_audience_labels = [
+        labels[name] for name in dict.fromkeys(extracted_target_audience_names)
+    ]
+
+
+async def parse_field_data_from_listing(listing: models.Listing, session: AsyncSession):
+    assert len(listing.websites) > 0, "No parsed websites yet"
+
+    md_content = aggregate_markdown(listing.websites, listing.website)
+
+    field_data_hash = field_data_input_hash(md_content)
+    if listing.field_data_hash == field_data_hash:
+        logger.info(f"Markdown of listing {listing.id} unchanged, keeping its field data")
+        return listing
+
+    field_data = await extract_field_data(
+        md_content, "extract_field_data_from_md.jinja", ListingFieldData
+    )
+
+    await apply_listing_field_data(listing, field_data, session)
+    listing.field_data_hash = field_data_hash
 
     return listing
 
 
 # CLIENT
 async def parse_webpage_from_client(client: models.Client, session: AsyncSession):
-    html_content, cleaned_html, converted_to_markdown = await clean_and_parse_into_md(
-        client.website, "rewrite_client_in_md.jinja"
+    return await crawl_webpages(
+        models.WebpageOwnerType.CLIENT,
+        client.id,
+        client.website,
+        "rewrite_client_in_md.jinja",
+        session,
     )
 
-    webpage = models.Webpage(
-        owner_type=models.WebpageOwnerType.CLIENT,
-        owner_id=client.id,
-        url=client.website,
-        original_content=html_content,
-        filtered_content=cleaned_html,
-        markdown_content=converted_to_markdown,
-    )
-    session.add(webpage)
-
-    return webpage
-
 
 async def parse_field_data_from_client(client: models.Client, session: AsyncSession):
     assert len(client.websites) > 0, "No parsed websites yet"
-    assert len(client.websites) == 1, (
-        "Support only single website from entry url at this moment"
-    )
 
-    webpage = client.websites[0]
+    md_content = aggregate_markdown(client.websites, client.website)
+
+    field_data_hash = field_data_input_hash(md_content)
+    if client.field_data_hash == field_data_hash:
+        logger.info(f"Markdown of client {client.id} unchanged, keeping its field data")
+        return client
 
     field_data = await extract_field_data(
-        webpage.markdown_content, "extract_field_data_from_md.jinja", ClientFieldData
+        md_content, "extract_field_data_from_md.jinja", ClientFieldData
     )
 
     client.business_identity = field_data.business_identity
     client.audience_desc = field_data.audience_desc
+    client.field_data_hash = field_data_hash
 
     return client
 
@@ -211,25 +662,51 @@ async def score_client_listing_match(
     listing: models.Listing, 
     session: AsyncSession
 ) -> ClientListingMatchResult:
+    """
+    Score the match and store it. A stored score is reused when neither
+    markdown content nor the prompt template changed since it was made.
+    """
     assert len(client.websites) > 0, "Client must have parsed websites"
     assert len(listing.websites) > 0, "Listing must have parsed websites"
     
-    client_webpage = client.websites[0]
-    listing_webpage = listing.websites[0]
+    client_md_content = aggregate_markdown(client.websites, client.website)
+    listing_md_content = aggregate_markdown(listing.websites, listing.website)
+
+    input_hash = match_input_hash(client_md_content, listing_md_content)
+    result = await session.execute(
+        select(models.ClientListingMatch).where(
+            models.ClientListingMatch.client_id == client.id,
+            models.ClientListingMatch.listing_id == listing.id,
+        )
+    )
+    stored_match = result.scalar_one_or_none()
+    if stored_match is not None and stored_match.input_hash == input_hash:
+        return ClientListingMatchResult.model_validate_json(stored_match.result)
     
-    template = prompts.get_template("score_client_listing_match.jinja")
-    prompt_content = template.render(
+    json_with_score = await generate_from_template(
+        AITask.MATCH_SCORING,
+        "score_client_listing_match.jinja",
+        ClientListingMatchResult,
         schema=ClientListingMatchResult,
-        client_md_content=client_webpage.markdown_content,
-        subsidy_md_content=listing_webpage.markdown_content,
+        client_md_content=client_md_content,
+        subsidy_md_content=listing_md_content,
     )
     
-    ai_client = get_client("gemini")
-    json_with_score = await ai_client.generate_content(
-        prompt_content, output_schema=ClientListingMatchResult
+    match_score = await cpu_pool.run(
+        parse_structured_output,
+        ClientListingMatchResult,
+        json_with_score,
+        input_size=len(json_with_score),
     )
-    
-    match_score = ClientListingMatchResult.model_validate_json(json_with_score)
+
+    if stored_match is None:
+        stored_match = models.ClientListingMatch(client_id=client.id, listing_id=listing.id)
+        session.add(stored_match)
+    stored_match.match_quality = match_score.match_quality
+    stored_match.listing_ambiguous = match_score.listing_ambiguous
+    stored_match.result = match_score.model_dump_json()
+    stored_match.input_hash = input_hash
+
     return match_score
 
 
@@ -241,7 +718,6 @@ async def search_suitable_listings(
     financial_instruments: List[FinancialInstrument]
 ) -> Sequence[ClientListingMatchResult] | None:
     assert len(client.websites) > 0, "Client must have parsed websites"
-    assert len(client.websites) == 1, "Only support one website for now"
     
     query = select(models.Listing).join(
         models.Listing.target_audience_labels
@@ -1,3 +1,3 @@
-from .prompts import prompts
+from .prompts import prompts, get_template_version
 
-__all__ = ["prompts"]
+__all__ = ["prompts", "get_template_version"]
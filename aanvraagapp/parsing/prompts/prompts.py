@@ -1,7 +1,16 @@
+import hashlib
+from functools import cache
 from fastapi.templating import Jinja2Templates
 # from jinja2 import StrictUndefined
 
 prompts = Jinja2Templates(
     directory="aanvraagapp/parsing/prompts",
     # undefined=StrictUndefined
-)
\ No newline at end of file
+)
+
+
+@cache
+def get_template_version(name: str) -> str:
+    """Short hash of the template source, changes whenever the template is edited."""
+    source, _, _ = prompts.env.loader.get_source(prompts.env, name)  # type: ignore[union-attr]
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+import ollama
+from google.genai import errors as genai_errors
+
+from aanvraagapp.config import AIRateLimitSettings, settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status codes that mean "slow down" rather than "this request is wrong".
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, roughly four characters per token."""
+    return len(text) // 4 + 1
+
+
+def retry_after_seconds(exc: Exception) -> float | None:
+    """
+    Return how long to wait before retrying if the error is a throttling
+    error, and None otherwise. Returns 0.0 for a throttling error without a
+    Retry-After hint.
+    """
+    if isinstance(exc, genai_errors.APIError):
+        code, response, details = exc.code, exc.response, exc.details
+    elif isinstance(exc, httpx.HTTPStatusError):
+        code, response, details = exc.response.status_code, exc.response, None
+    else:
+        return None
+    if code not in THROTTLE_STATUS_CODES:
+        return None
+
+    if isinstance(response, httpx.Response):
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+    # Gemini puts the hint in a RetryInfo detail, e.g. "retryDelay": "12s".
+    match = re.search(r"""['"]retryDelay['"]:\s*['"](\d+(?:\.\d+)?)s['"]""", str(details))
+    if match:
+        return float(match.group(1))
+    return 0.0
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """
+    True for errors that say the backend is down or overloaded: throttling,
+    server errors and transport errors. A bad request or an invalid response
+    would fail on the next backend too, so it is not failed over.
+    """
+    if isinstance(exc, (httpx.TransportError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(exc, genai_errors.APIError):
+        status = exc.code
+    elif isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    elif isinstance(exc, ollama.ResponseError):
+        status = exc.status_code
+    else:
+        return False
+    return status == 429 or status >= 500
+
+
+class TokenBucket:
+    """Token bucket that refills continuously at a rate per minute."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.per_minute / 60
+        )
+        self.updated_at = now
+
+    def set_rate(self, per_minute: float) -> None:
+        self._refill()
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.tokens = min(self.tokens, self.capacity)
+
+    async def acquire(self, amount: float) -> float:
+        """Wait until the amount is available, and return the time waited."""
+        # A single request larger than the bucket can never fit, so let it
+        # through once the bucket is full.
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        # The lock makes waiters queue up in order instead of racing for refills.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) * 60 / self.per_minute
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+@dataclass
+class RateLimitStats:
+    requests: int = 0
+    throttled: int = 0
+    retries: int = 0
+    seconds_waited: float = 0.0
+
+
+class ModelRateLimiter:
+    """
+    Request and token buckets for one model, with adaptive rates.
+
+    On a throttling error the rates are halved and new requests are held back
+    for the Retry-After period; every successful request recovers a bit of
+    the configured rate.
+    """
+
+    MIN_FACTOR = 0.1
+    RECOVERY_STEP = 0.05
+
+    def __init__(self, model: str, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.factor = 1.0
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.stats = RateLimitStats()
+
+    def _apply_factor(self) -> None:
+        self.requests.set_rate(self.requests_per_minute * self.factor)
+        self.tokens.set_rate(self.tokens_per_minute * self.factor)
+
+    async def acquire(self, tokens: int) -> None:
+        blocked_for = self.blocked_until - time.monotonic()
+        if blocked_for > 0:
+            await asyncio.sleep(blocked_for)
+            self.stats.seconds_waited += blocked_for
+        self.stats.seconds_waited += await self.requests.acquire(1)
+        self.stats.seconds_waited += await self.tokens.acquire(tokens)
+
+    def on_success(self) -> None:
+        self.stats.requests += 1
+        if self.factor < 1.0:
+            self.factor = min(1.0, self.factor + self.RECOVERY_STEP)
+            self._apply_factor()
+
+    def on_throttled(self, wait_seconds: float) -> None:
+        self.stats.throttled += 1
+        self.factor = max(self.MIN_FACTOR, self.factor / 2)
+        self._apply_factor()
+        self.blocked_until = max(self.blocked_until, time.monotonic() + wait_seconds)
+
+
+class RateLimiter:
+    """
+    Shared limiter for all calls to a provider: per-model request and token
+    buckets, a bound on the number of in-flight calls, and retries with
+    backoff on throttling errors.
+    """
+
+    def __init__(self, config: AIRateLimitSettings):
+        self.config = config
+        self.models: dict[str, ModelRateLimiter] = {}
+        self.in_flight = asyncio.Semaphore(config.max_in_flight)
+
+    async def aclose(self) -> None:
+        for model, limiter in self.models.items():
+            logger.info(f"Rate limit stats for {model}: {asdict(limiter.stats)}")
+        # Locks and semaphores are bound to the event loop they were first
+        # used on, so start fresh for the next loop (e.g. the next CLI command).
+        self.models = {}
+        self.in_flight = asyncio.Semaphore(self.config.max_in_flight)
+
+    def for_model(self, model: str) -> ModelRateLimiter:
+        limiter = self.models.get(model)
+        if limiter is None:
+            quota = self.config.models.get(model, self.config.default_quota)
+            limiter = ModelRateLimiter(
+                model, quota.requests_per_minute, quota.tokens_per_minute
+            )
+            self.models[model] = limiter
+        return limiter
+
+    def is_saturated(self, model: str) -> bool:
+        """
+        True while the model is backing off after throttling. Taken request
+        slots do not count: under normal load a request waits for a slot.
+        """
+        limiter = self.models.get(model)
+        return limiter is not None and limiter.blocked_until > time.monotonic()
+
+    def _backoff(self, attempt: int, retry_after: float) -> float:
+        backoff = self.config.base_backoff_seconds * 2**attempt
+        backoff = min(backoff, self.config.max_backoff_seconds)
+        # Jitter keeps concurrent callers from retrying in lockstep.
+        return max(retry_after, backoff * random.uniform(0.5, 1.0))
+
+    async def call(self, model: str, tokens: int, request: Callable[[], Awaitable[T]]) -> T:
+        limiter = self.for_model(model)
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens)
+            try:
+                async with self.in_flight:
+                    result = await request()
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempt >= self.config.max_retries:
+                    raise
+                wait_seconds = self._backoff(attempt, retry_after)
+                limiter.on_throttled(wait_seconds)
+                limiter.stats.retries += 1
+                attempt += 1
+                logger.warning(
+                    f"Throttled by {model} ({str(e)[:100]}), retry {attempt}/"
+                    f"{self.config.max_retries} in {wait_seconds:.1f}s at "
+                    f"{limiter.factor:.0%} of the configured rate"
+                )
+                continue
+            limiter.on_success()
+            return result
+
+
+rate_limiter = RateLimiter(settings.ai_rate_limit)
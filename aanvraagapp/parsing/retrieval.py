@@ -0,0 +1,47 @@
+import numpy as np
+from sqlalchemy import Select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aanvraagapp.config import settings
+from aanvraagapp.models import Chunk
+from .ai_client import normalize_embeddings
+
+
+def truncate_embedding(embedding: np.ndarray, dim: int) -> np.ndarray:
+    """Return the renormalized Matryoshka prefix of an embedding."""
+    return normalize_embeddings(embedding[..., :dim])
+
+
+async def enable_iterative_index_scan(session: AsyncSession) -> None:
+    """
+    Let the HNSW index scan of the coarse pass continue until enough rows
+    pass the filters, for the rest of the transaction. Without it the scan
+    stops after hnsw.ef_search rows of the whole table, which leaves few or
+    none for one listing or client. Needs pgvector 0.8.
+    """
+    mode = settings.retrieval.iterative_scan
+    await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {mode}"))
+
+
+def rank_chunks_by_similarity(stmt: Select, query_embedding: np.ndarray, limit: int) -> Select:
+    """
+    Order a select over Chunk (with any joins and filters) by similarity to
+    the query and keep the top `limit` rows.
+
+    With two-stage retrieval enabled, the short embeddings first pick
+    limit * rerank_factor candidates through the HNSW index, and only those
+    are ranked on the full embeddings. Filtered searches should run after
+    enable_iterative_index_scan.
+    """
+    query_vector = query_embedding.tolist()
+    if settings.retrieval.two_stage:
+        short_vector = truncate_embedding(query_embedding, Chunk.emb_short.type.dim).tolist()
+        # Without grouping, so the index can produce the order.
+        candidates = (
+            stmt.with_only_columns(Chunk.id)
+            .group_by(None)
+            .order_by(Chunk.emb_short.cosine_distance(short_vector))
+            .limit(limit * settings.retrieval.rerank_factor)
+        )
+        stmt = stmt.where(Chunk.id.in_(candidates))
+    return stmt.order_by(Chunk.emb.cosine_distance(query_vector).asc()).limit(limit)
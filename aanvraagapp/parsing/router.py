@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Type, TypeVar
+
+import numpy as np
+from pydantic import BaseModel
+
+from aanvraagapp.config import AIRouterSettings, ModelRouteSettings, settings
+from aanvraagapp.types import AITask
+from .ai_client import AIClient, get_client
+from .rate_limit import is_backend_failure, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class BackendHealth:
+    """Recent latencies and failures of one provider and model."""
+
+    # (finished_at, seconds) of recent successful requests.
+    latencies: deque[tuple[float, float]] = field(default_factory=lambda: deque(maxlen=100))
+    unhealthy_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def recent_latencies(self, window_seconds: float) -> list[float]:
+        cutoff = time.monotonic() - window_seconds
+        return [seconds for finished_at, seconds in self.latencies if finished_at >= cutoff]
+
+    def percentile(self, q: float, window_seconds: float) -> float | None:
+        latencies = self.recent_latencies(window_seconds)
+        return float(np.percentile(latencies, q)) if latencies else None
+
+
+@dataclass
+class Route:
+    task: AITask
+    config: ModelRouteSettings
+
+    @property
+    def provider(self):
+        return self.config.provider
+
+    @property
+    def model(self) -> str:
+        return self.config.model
+
+    @property
+    def client(self) -> AIClient:
+        return get_client(self.config.provider)
+
+
+class ModelRouter:
+    """
+    Chooses the backend, model, thinking budget and context size for each
+    kind of AI task.
+
+    Every task has a list of candidate backends in the settings. A candidate
+    is skipped while it is unhealthy: Gemini is backing off after throttling,
+    the recent p95 latency is above the latency budget of the task, or a
+    request failed on the backend less than cooldown_seconds ago. When a
+    request fails because of the backend (see is_backend_failure), the next
+    candidate is tried; other errors are raised right away.
+    With hedging enabled, a generate request that is slower than the recent
+    p95 latency of its backend gets a duplicate, and the first answer wins.
+    """
+
+    def __init__(self, config: AIRouterSettings):
+        self.config = config
+        self.health: dict[tuple[str, str], BackendHealth] = {}
+        self.failovers = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+    def _health(self, route: ModelRouteSettings) -> BackendHealth:
+        return self.health.setdefault((route.provider, route.model), BackendHealth())
+
+    def is_healthy(self, task: AITask, route: ModelRouteSettings) -> bool:
+        health = self._health(route)
+        if health.unhealthy_until > time.monotonic():
+            return False
+        if route.provider == "gemini" and rate_limiter.is_saturated(route.model):
+            return False
+        # Old latencies drop out of the window, so a slow backend is tried
+        # again after a while instead of being skipped forever.
+        p95 = health.percentile(95, self.config.latency_window_seconds)
+        return p95 is None or p95 <= self.config.tasks[task].max_latency_seconds
+
+    def routes(self, task: AITask) -> list[Route]:
+        """All candidate routes for the task, the preferred healthy ones first."""
+        task_config = self.config.tasks[task]
+        candidates = list(task_config.candidates)
+        if task_config.prefer == "cost":
+            candidates.sort(key=lambda c: c.cost_per_million_tokens)
+        elif task_config.prefer == "latency":
+            window = self.config.latency_window_seconds
+            # Backends without recent measurements go first, so they get measured.
+            candidates.sort(key=lambda c: self._health(c).percentile(50, window) or 0.0)
+        # Stable sort, so the preference order holds within healthy and unhealthy.
+        candidates.sort(key=lambda c: not self.is_healthy(task, c))
+        return [Route(task, c) for c in candidates]
+
+    def route(self, task: AITask) -> Route:
+        return self.routes(task)[0]
+
+    def _record_success(self, route: Route, seconds: float) -> None:
+        health = self._health(route.config)
+        health.requests += 1
+        health.latencies.append((time.monotonic(), seconds))
+
+    def _record_failure(self, route: Route) -> None:
+        health = self._health(route.config)
+        health.requests += 1
+        health.failures += 1
+        health.unhealthy_until = time.monotonic() + self.config.cooldown_seconds
+
+    def hedge_delay(self, route: Route) -> float | None:
+        """How long to wait before hedging a request on the route, None to not hedge."""
+        if not self.config.hedging:
+            return None
+        window = self.config.latency_window_seconds
+        health = self._health(route.config)
+        if len(health.recent_latencies(window)) < self.config.hedge_min_samples:
+            return None
+        delay = health.percentile(self.config.hedge_percentile, window)
+        assert delay is not None
+        return max(delay, self.config.hedge_min_delay_seconds)
+
+    async def _hedged(self, request: Callable[[], Awaitable[T]], delay: float | None) -> T:
+        """Run the request, and a duplicate of it if it is not done after the delay."""
+        if delay is None:
+            return await request()
+
+        first = asyncio.create_task(request())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        second = asyncio.create_task(request())
+        pending = {first, second}
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if first not in succeeded:
+                        self.hedges_won += 1
+                    return succeeded[0].result()
+                # Both requests failed, raise the error of the last one.
+                if not pending:
+                    return done.pop().result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate(
+        self,
+        task: AITask,
+        prompt: str,
+        output_schema: Type[BaseModel] | None = None,
+    ) -> tuple[str, Route]:
+        """Generate a response, and return it with the route that produced it."""
+        routes = self.routes(task)
+        for i, route in enumerate(routes):
+            started = time.monotonic()
+            try:
+                response = await self._hedged(
+                    lambda: route.client.generate_content(
+                        prompt,
+                        model=route.model,
+                        output_schema=output_schema,
+                        thinking_budget=route.config.thinking_budget,
+                        context_size=route.config.context_size,
+                    ),
+                    self.hedge_delay(route),
+                )
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                self._record_failure(route)
+                if i == len(routes) - 1:
+                    raise
+                self.failovers += 1
+                logger.warning(
+                    f"{task} failed on {route.provider}/{route.model} ({str(e)[:100]}), "
+                    f"failing over to {routes[i + 1].provider}/{routes[i + 1].model}"
+                )
+                continue
+            self._record_success(route, time.monotonic() - started)
+            return response, route
+        raise RuntimeError(f"No routes configured for {task}")
+
+    async def embed_content(self, texts: list[str]) -> np.ndarray:
+        # Only the first route is used, see AIRouterSettings.tasks.
+        route = self.route(AITask.EMBEDDING)
+        started = time.monotonic()
+        try:
+            embeddings = await route.client.embed_content(texts, route.model)
+        except Exception as e:
+            if is_backend_failure(e):
+                self._record_failure(route)
+            raise
+        self._record_success(route, time.monotonic() - started)
+        return embeddings
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        route = self.route(AITask.EMBEDDING)
+        return await route.client.embed_query(query, route.model)
+
+    async def aclose(self) -> None:
+        window = self.config.latency_window_seconds
+        for (provider, model), health in self.health.items():
+            if not health.requests:
+                continue
+            p50, p95 = health.percentile(50, window), health.percentile(95, window)
+            logger.info(
+                f"Router stats for {provider}/{model}: {health.requests} requests, "
+                f"{health.failures} failures, p50 {p50 or 0:.2f}s, p95 {p95 or 0:.2f}s"
+            )
+        if self.failovers:
+            logger.info(f"Router failed over {self.failovers} times")
+        if self.hedged:
+            logger.info(
+                f"Router hedged {self.hedged} requests, the hedge answered first "
+                f"{self.hedges_won} times"
+            )
+        self.health = {}
+        self.failovers = 0
+        self.hedged = 0
+        self.hedges_won = 0
+
+
+ai_router = ModelRouter(settings.ai_router)
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while a call for a key is running,
+    later calls for the same key wait for its result instead of starting
+    their own. Once the call finishes, the next call for the key runs again.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task[Any]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shield the shared task, so one caller being cancelled does not
+        # cancel the call for the others.
+        return await asyncio.shield(task)
+
+    async def aclose(self) -> None:
+        if self.coalesced:
+            logger.info(f"Coalesced {self.coalesced} of {self.calls + self.coalesced} AI calls")
+        self.calls = 0
+        self.coalesced = 0
+
+
+single_flight = SingleFlight()
@@ -1,4 +1,5 @@
 from datetime import date
+from typing import TypeVar
 from pydantic import BaseModel, Field
 from aanvraagapp.types import (
     TargetAudience,
@@ -131,3 +132,10 @@ class ClientListingMatchResult(BaseModel):
 
 
 StructuredOutputSchema = ListingFieldData | ClientFieldData
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def parse_structured_output(output_schema: type[M], json_data: str) -> M:
+    """Validate a JSON response against its schema. A module level function, so it can run in the CPU pool."""
+    return output_schema.model_validate_json(json_data)
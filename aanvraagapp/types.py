@@ -92,4 +92,12 @@ class MatchEval(StrEnum):
         """
 
 
-AIProvider = Literal["gemini", "ollama"]
\ No newline at end of file
+AIProvider = Literal["gemini", "ollama", "fake"]
+
+class AITask(StrEnum):
+    """The kinds of AI work that the model router picks a backend for."""
+
+    REWRITE_MARKDOWN = auto()
+    FIELD_EXTRACTION = auto()
+    MATCH_SCORING = auto()
+    EMBEDDING = auto()
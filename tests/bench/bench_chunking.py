@@ -0,0 +1,49 @@
+"""
+Benchmark the markdown chunker against its header sections alone on the test
+fixtures, repeated to the size of a corpus, and report the chunk sizes.
+
+Run with: python -m tests.bench.bench_chunking
+"""
+import statistics
+import time
+from pathlib import Path
+
+from aanvraagapp.config import settings
+from aanvraagapp.parsing.chunking import chunk_markdown, split_sections
+from aanvraagapp.parsing.clean import clean_html
+from aanvraagapp.parsing.markdown import convert_html_to_markdown
+from aanvraagapp.parsing.rate_limit import estimate_tokens
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+PAGES = 1000
+
+
+def load_pages() -> list[str]:
+    pages = [(DATA_DIR / "converted_to_markdown.txt").read_text()]
+    for name in ["html_content.txt", "cleaned_html.txt"]:
+        markdown, _ = convert_html_to_markdown(clean_html((DATA_DIR / name).read_text()), settings.markdown_conversion)
+        pages.append(markdown)
+    return pages
+
+
+def report(name: str, pages: list[str], chunker) -> None:
+    started = time.perf_counter()
+    sizes = [estimate_tokens(text) for page in pages for text in chunker(page)]
+    seconds = time.perf_counter() - started
+    deciles = statistics.quantiles(sizes, n=10)
+    print(
+        f"{name}: {len(pages)} pages in {seconds:.2f}s, {len(sizes)} chunks, tokens "
+        f"min {min(sizes)}, p10 {deciles[0]:.0f}, p50 {deciles[4]:.0f}, p90 {deciles[8]:.0f}, max {max(sizes)}"
+    )
+
+
+def main():
+    fixtures = load_pages()
+    pages = [fixtures[i % len(fixtures)] for i in range(PAGES)]
+    config = settings.chunking
+    report("header sections", pages, lambda page: [s.text for s in split_sections(page, config.header_levels)])
+    report("token aware", pages, lambda page: [chunk.text for chunk in chunk_markdown(page, config)])
+
+
+if __name__ == "__main__":
+    main()
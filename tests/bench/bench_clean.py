@@ -0,0 +1,31 @@
+"""
+Benchmark clean_html against the previous BeautifulSoup implementation on
+the test fixtures.
+
+Run with: python -m tests.bench.bench_clean
+"""
+import timeit
+from pathlib import Path
+
+from aanvraagapp.parsing.clean import clean_html, clean_html_bs4
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FIXTURES = ["html_content.txt", "cleaned_html.txt"]
+RUNS = 20
+
+
+def main():
+    for name in FIXTURES:
+        html = (DATA_DIR / name).read_text()
+        print(f"{name} ({len(html) / 1000:.0f} KB)")
+        for cleaner in (clean_html_bs4, clean_html):
+            seconds = min(timeit.repeat(lambda: cleaner(html), number=RUNS, repeat=3)) / RUNS
+            output = cleaner(html)
+            print(
+                f"  {cleaner.__name__:<15} {seconds * 1000:7.2f} ms  "
+                f"output {len(output) / 1000:.0f} KB"
+            )
+
+
+if __name__ == "__main__":
+    main()
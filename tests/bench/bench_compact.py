@@ -0,0 +1,34 @@
+"""
+Report the estimated prompt tokens of the HTML that goes into the markdown
+rewrite prompt, before and after compact_html, on the test fixtures.
+
+Run with: python -m tests.bench.bench_compact
+"""
+from pathlib import Path
+
+from aanvraagapp.parsing.clean import clean_html, clean_html_bs4, compact_html
+from aanvraagapp.parsing.rate_limit import estimate_tokens
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FIXTURES = ["html_content.txt", "cleaned_html.txt"]
+
+
+def main():
+    for name in FIXTURES:
+        html = (DATA_DIR / name).read_text()
+        cleaned = clean_html(html)
+        stages = {
+            "clean_html_bs4 (prettified)": clean_html_bs4(html),
+            "clean_html": cleaned,
+            "compact_html": compact_html(cleaned),
+            "compact_html, compact tables": compact_html(cleaned, compact_tables=True),
+        }
+        baseline = estimate_tokens(stages["clean_html_bs4 (prettified)"])
+        print(name)
+        for stage, output in stages.items():
+            tokens = estimate_tokens(output)
+            print(f"  {stage:<30} {tokens:6d} tokens  {baseline / tokens:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Benchmark the rule based markdown conversion on the test fixtures.
+
+Run with: python -m tests.bench.bench_markdown
+"""
+import timeit
+from pathlib import Path
+
+from aanvraagapp.config import settings
+from aanvraagapp.parsing.clean import clean_html
+from aanvraagapp.parsing.markdown import convert_html_to_markdown
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FIXTURES = ["html_content.txt", "cleaned_html.txt"]
+RUNS = 20
+
+
+def main():
+    config = settings.markdown_conversion
+    for name in FIXTURES:
+        cleaned_html = clean_html((DATA_DIR / name).read_text())
+        seconds = min(
+            timeit.repeat(lambda: convert_html_to_markdown(cleaned_html, config), number=RUNS, repeat=3)
+        ) / RUNS
+        markdown, quality = convert_html_to_markdown(cleaned_html, config)
+        verdict = "passed" if quality.passed else f"fallback ({'; '.join(quality.problems)})"
+        print(
+            f"{name}: {seconds * 1000:.2f} ms, {len(cleaned_html) / 1000:.0f} KB html -> "
+            f"{len(markdown) / 1000:.1f} KB markdown, {verdict}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from aanvraagapp import models
+from aanvraagapp.blob_store import blob_store
 from .utils import (
     create_views_and_tables,
     create_dummy_clients,
@@ -32,8 +33,8 @@ async def create_dummy_webpage(session, listing: models.Listing):
         owner_type=models.WebpageOwnerType.LISTING,
         owner_id=listing.id,
         url="https://www.rvo.nl/subsidies-financiering/eurostars",
-        original_content=html_content,
-        filtered_content=cleaned_content,
+        original_content_digest=blob_store.put(html_content),
+        filtered_content_digest=blob_store.put(cleaned_content),
         markdown_content=markdown_content,
     )
 
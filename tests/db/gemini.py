@@ -1,4 +1,6 @@
 import asyncio
+import tempfile
+from pathlib import Path
 from aanvraagapp import models
 from .utils import (
     create_views_and_tables,
@@ -7,6 +9,7 @@ from .utils import (
     create_dummy_users,
 )
 from aanvraagapp.database import async_session_maker
+from aanvraagapp.lifecycle import resources
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from aanvraagapp.parsing.parsing import (
@@ -14,14 +17,19 @@ from aanvraagapp.parsing.parsing import (
     parse_webpage_from_listing,
     parse_field_data_from_client,
     parse_field_data_from_listing,
-    chunk_webpage,
 )
+from aanvraagapp.parsing.backfill import backfill_chunks
 from aanvraagapp.provider_workflows import run_rvo_workflow
 from sqlalchemy import func
 
 
 async def init_db_with_gemini():
     """Initialize db with dummy data AND Gemini usage."""
+    async with resources():
+        await _init_db_with_gemini()
+
+
+async def _init_db_with_gemini():
     await create_views_and_tables()
     async with async_session_maker() as session:
         rvo, snn = await create_dummy_providers(session)
@@ -104,17 +112,6 @@ async def init_db_with_gemini():
     ]
     await asyncio.gather(*client_field_data_tasks)
 
-    # Query all webpages and apply chunk_webpage
-    async with async_session_maker() as session:
-        result = await session.execute(select(models.Webpage))
-        all_webpages = result.scalars().all()
-
-    async def process_webpage_chunks(webpage):
-        async with async_session_maker() as task_session:
-            # Need to merge the webpage into the new session
-            task_session.add(webpage)
-            await chunk_webpage(webpage, task_session)
-            await task_session.commit()
-
-    chunk_tasks = [process_webpage_chunks(webpage) for webpage in all_webpages]
-    await asyncio.gather(*chunk_tasks)
+    # Chunk and embed all webpages, with a fresh checkpoint for the fresh database.
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        await backfill_chunks(async_session_maker, Path(checkpoint_dir) / "backfill_chunks.json")
@@ -0,0 +1,153 @@
+from aanvraagapp.parsing import ai_cache
+from aanvraagapp.parsing.ai_cache import RedisCacheBackend, ResponseCache
+from aanvraagapp.parsing.prompts import get_template_version
+from aanvraagapp.parsing.structured_outputs import ClientFieldData, ListingFieldData
+
+
+def test_response_cache_key_is_content_addressed():
+    version = get_template_version("extract_field_data_from_md.jinja")
+    key = ResponseCache.key("gemini-2.5-flash", "prompt", ListingFieldData, version)
+
+    assert key == ResponseCache.key("gemini-2.5-flash", "prompt", ListingFieldData, version)
+    assert key != ResponseCache.key("gemini-2.5-pro", "prompt", ListingFieldData, version)
+    assert key != ResponseCache.key("gemini-2.5-flash", "prompt!", ListingFieldData, version)
+    assert key != ResponseCache.key("gemini-2.5-flash", "prompt", ClientFieldData, version)
+    assert key != ResponseCache.key("gemini-2.5-flash", "prompt", None, version)
+    assert key != ResponseCache.key("gemini-2.5-flash", "prompt", ListingFieldData, "other")
+
+
+class StubRedis:
+    """In-memory stand-in for the part of the Redis client the cache uses, on the patched clock."""
+
+    def __init__(self):
+        self.values: dict[str, tuple[bytes, float]] = {}
+        self.sorted_sets: dict[str, dict[str, float]] = {}
+
+    def _live(self, key: str) -> bytes | None:
+        value, expires_at = self.values.get(key, (None, 0.0))
+        return value if expires_at > ai_cache.time.time() else None
+
+    async def get(self, key):
+        return self._live(key)
+
+    async def mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    async def set(self, key, value, ex):
+        self.values[key] = (value, ai_cache.time.time() + ex)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update(mapping)
+
+    async def zcard(self, name):
+        return len(self.sorted_sets.get(name, {}))
+
+    async def zrem(self, name, *members):
+        for member in members:
+            self.sorted_sets.get(name, {}).pop(member, None)
+
+    async def zrangebyscore(self, name, low, high):
+        return [m for m, score in self.sorted_sets.get(name, {}).items() if score <= high]
+
+    async def zpopmin(self, name, count):
+        members = sorted(self.sorted_sets.get(name, {}).items(), key=lambda item: item[1])[:count]
+        for member, _ in members:
+            del self.sorted_sets[name][member]
+        return [(member.encode(), score) for member, score in members]
+
+    def pipeline(self, transaction=True):
+        return StubPipeline(self)
+
+    async def aclose(self):
+        pass
+
+
+class StubPipeline:
+    def __init__(self, client: StubRedis):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append(getattr(self.client, name)(*args, **kwargs))
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def redis_backend(monkeypatch, ttl_seconds: int = 100, max_entries: int = 10) -> tuple[RedisCacheBackend, Clock]:
+    clock = Clock()
+    monkeypatch.setattr(ai_cache, "time", clock)
+    backend = RedisCacheBackend(ttl_seconds, max_entries)
+    backend.client = StubRedis()
+    return backend, clock
+
+
+async def test_redis_backend_round_trip(monkeypatch):
+    backend, _ = redis_backend(monkeypatch)
+
+    assert await backend.set("generate", "a", b"1") == 0
+    assert await backend.set_many("generate", {"b": b"2", "c": b"3"}) == 0
+
+    assert await backend.get("generate", "a") == b"1"
+    assert await backend.get("generate", "missing") is None
+    assert await backend.get_many("generate", ["b", "c", "missing"]) == {"b": b"2", "c": b"3"}
+    assert await backend.get("embed", "a") is None
+
+
+async def test_redis_backend_expires_entries_and_prunes_the_index(monkeypatch):
+    backend, clock = redis_backend(monkeypatch, ttl_seconds=100, max_entries=2)
+    await backend.set_many("generate", {"a": b"1", "b": b"2"})
+
+    clock.now += 101
+    assert await backend.get("generate", "a") is None
+    # The expired keys are dropped from the index instead of counting
+    # towards max_entries, so nothing live is evicted.
+    assert await backend.set_many("generate", {"c": b"3", "d": b"4"}) == 2
+    assert await backend.get_many("generate", ["c", "d"]) == {"c": b"3", "d": b"4"}
+    assert set(backend.client.sorted_sets[backend._index("generate")]) == {"c", "d"}
+
+
+async def test_redis_backend_evicts_least_recently_used(monkeypatch):
+    backend, clock = redis_backend(monkeypatch, max_entries=2)
+    await backend.set("generate", "a", b"1")
+    clock.now += 1
+    await backend.set("generate", "b", b"2")
+    clock.now += 1
+    await backend.get("generate", "a")
+    clock.now += 1
+
+    assert await backend.set("generate", "c", b"3") == 1
+    assert await backend.get("generate", "b") is None
+    assert await backend.get_many("generate", ["a", "c"]) == {"a": b"1", "c": b"3"}
+
+
+async def test_response_cache_counts_hits_and_misses(monkeypatch):
+    backend, _ = redis_backend(monkeypatch, max_entries=1)
+    cache = ResponseCache()
+    cache._backend, cache._backend_created = backend, True
+
+    assert await cache.get("a") is None
+    await cache.set("a", "first")
+    await cache.set("b", "second")
+    assert await cache.get("b") == "second"
+
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.writes, cache.stats.evictions) == (1, 1, 2, 1)
+    assert cache.stats.hit_rate == 0.5
@@ -0,0 +1,35 @@
+import httpx
+import pytest
+
+from aanvraagapp.parsing.ai_client import AIClientRegistry, GeminiAIClient, OllamaAIClient
+
+
+async def test_registry_reuses_pooled_client():
+    registry = AIClientRegistry()
+
+    client = registry.get("gemini")
+    assert isinstance(client.unwrap(), GeminiAIClient)
+    assert registry.get("gemini") is client
+    assert registry.stats()["created"] == 1
+    assert registry.stats()["acquired"] == 2
+
+    await registry.shutdown()
+
+    # After shutdown a fresh client is created on the next request.
+    assert registry.get("gemini") is not client
+    await registry.shutdown()
+
+
+@pytest.mark.parametrize("client_class", [GeminiAIClient, OllamaAIClient])
+async def test_aclose_closes_the_owned_connection_pool(client_class, monkeypatch):
+    closed = []
+
+    async def aclose(transport):
+        closed.append(transport)
+
+    monkeypatch.setattr(httpx.AsyncHTTPTransport, "aclose", aclose)
+    client = client_class()
+
+    await client.aclose()
+
+    assert closed == [client.transport]
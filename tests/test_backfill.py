@@ -0,0 +1,44 @@
+from aanvraagapp.parsing.backfill import BackfillCheckpoint, BackfillProgress
+
+
+def test_checkpoint_stays_below_webpages_in_flight():
+    progress = BackfillProgress(BackfillCheckpoint(last_id=10), total=3)
+    for webpage_id in (11, 14, 20):
+        progress.start(webpage_id)
+
+    progress.finish(14, chunks=3)
+    assert progress.checkpoint.last_id == 10
+
+    progress.finish(11, chunks=None)
+    assert progress.checkpoint.last_id == 19
+
+    progress.finish(20, chunks=2)
+    assert progress.checkpoint.last_id == 20
+    assert progress.checkpoint.done == 2
+    assert progress.checkpoint.failed == [11]
+    assert progress.chunks == 5 and progress.errors == 1
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = tmp_path / "backfill" / "checkpoint.json"
+    assert BackfillCheckpoint.load(path) == BackfillCheckpoint()
+
+    BackfillCheckpoint(last_id=42, done=40, failed=[7, 9]).save(path)
+
+    assert BackfillCheckpoint.load(path) == BackfillCheckpoint(last_id=42, done=40, failed=[7, 9])
+    assert [p.name for p in path.parent.iterdir()] == ["checkpoint.json"]
+
+
+def test_summary_reports_rate_eta_and_errors():
+    progress = BackfillProgress(BackfillCheckpoint(), total=4)
+    progress.started_at -= 2
+    progress.start(1)
+    progress.finish(1, chunks=10)
+    progress.start(2)
+    progress.finish(2, chunks=None)
+
+    summary = progress.summary()
+
+    assert summary.startswith("2/4 webpages, 1.00 webpages/s, 5.0 chunks/s embedded")
+    assert "ETA 0:00:02" in summary
+    assert summary.endswith("1 errors")
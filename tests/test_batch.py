@@ -0,0 +1,113 @@
+import json
+from typing import Optional, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+from aanvraagapp.config import settings
+from aanvraagapp.parsing import batch
+from aanvraagapp.parsing.ai_cache import ResponseCache
+from aanvraagapp.parsing.ai_client import AIClient
+from aanvraagapp.parsing.batch import BatchRequest, LocalBatchBackend, parse_result_line, run_batch
+from aanvraagapp.parsing.structured_outputs import ClientFieldData
+from aanvraagapp.types import AITask, BusinessIdentity
+
+
+class EchoAIClient(AIClient):
+    def __init__(self):
+        self.models: list[str | None] = []
+        self.thinking_budgets: list[int | None] = []
+
+    async def generate_content(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        output_schema: Type[BaseModel] | None = None,
+        thinking_budget: int | None = None,
+        context_size: int | None = None,
+    ) -> str:
+        self.models.append(model)
+        self.thinking_budgets.append(thinking_budget)
+        if prompt == "fail":
+            raise RuntimeError("Request failed")
+        assert output_schema is ClientFieldData
+        return ClientFieldData(
+            business_identity=BusinessIdentity.SME, audience_desc=prompt
+        ).model_dump_json()
+
+    async def embed_content(self, texts: list[str], model: Optional[str] = None) -> np.ndarray:
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    async def embed_query(self, query: str, model: Optional[str] = None) -> np.ndarray:
+        return np.zeros(2, dtype=np.float32)
+
+
+def test_parse_result_line():
+    assert parse_result_line(
+        '{"key": "a", "response": {"candidates": [{"content": {"parts": '
+        '[{"text": "think", "thought": true}, {"text": "{}"}]}}]}}'
+    ) == ("a", "{}", None)
+    key, text, error = parse_result_line('{"key": "b", "error": {"code": 400}}')
+    assert (key, text) == ("b", None) and error is not None
+
+
+async def test_run_batch_with_local_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.ai_cache, "backend", "none")
+    monkeypatch.setattr(batch, "response_cache", ResponseCache())
+
+    requests = [
+        BatchRequest(
+            key=f"client-{i}",
+            prompt_name="extract_field_data_from_md.jinja",
+            prompt=prompt,
+            output_schema=ClientFieldData,
+        )
+        for i, prompt in enumerate(["first", "fail", "third"])
+    ]
+    responses = await run_batch(
+        requests, LocalBatchBackend(EchoAIClient()), tmp_path, AITask.FIELD_EXTRACTION, poll_interval=0.01
+    )
+
+    assert set(responses) == {"client-0", "client-2"}
+    assert ClientFieldData.model_validate_json(responses["client-2"]).audience_desc == "third"
+
+
+async def test_local_backend_uses_the_provider_route(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.ai_cache, "backend", "none")
+    monkeypatch.setattr(batch, "response_cache", ResponseCache())
+    ai_client = EchoAIClient()
+    request = BatchRequest(
+        key="client-0",
+        prompt_name="extract_field_data_from_md.jinja",
+        prompt="first",
+        output_schema=ClientFieldData,
+    )
+    await run_batch(
+        [request], LocalBatchBackend(ai_client, "ollama"), tmp_path, AITask.FIELD_EXTRACTION, poll_interval=0.01
+    )
+
+    assert ai_client.models == [batch.batch_route(AITask.FIELD_EXTRACTION, "ollama").model]
+    assert ai_client.models != [batch.batch_route(AITask.FIELD_EXTRACTION, "gemini").model]
+
+
+async def test_requests_carry_the_route_thinking_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.ai_cache, "backend", "none")
+    monkeypatch.setattr(batch, "response_cache", ResponseCache())
+    monkeypatch.setattr(batch.batch_route(AITask.FIELD_EXTRACTION, "gemini"), "thinking_budget", 0)
+    ai_client = EchoAIClient()
+    request = BatchRequest(
+        key="client-0",
+        prompt_name="extract_field_data_from_md.jinja",
+        prompt="first",
+        output_schema=ClientFieldData,
+    )
+    await run_batch(
+        [request], LocalBatchBackend(ai_client), tmp_path, AITask.FIELD_EXTRACTION, poll_interval=0.01
+    )
+
+    (requests_path,) = [p for p in tmp_path.glob("batch-*.jsonl") if ".results" not in p.name]
+    generation_config = json.loads(requests_path.read_text())["request"]["generation_config"]
+    # The same settings as the interactive call and the local backend.
+    assert generation_config["thinking_config"] == {"include_thoughts": False, "thinking_budget": 0}
+    assert ai_client.thinking_budgets == [0]
+    assert "thinking_config" not in json.loads(request.to_json_line())["request"]["generation_config"]
@@ -0,0 +1,67 @@
+import os
+from pathlib import Path
+
+import zstandard
+
+from aanvraagapp.blob_store import BlobStore, decode_legacy_content
+from aanvraagapp.config import StorageSettings
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def test_put_and_get(tmp_path):
+    store = BlobStore(StorageSettings(blob_dir=str(tmp_path)))
+    html = (DATA_DIR / "html_content.txt").read_text()
+
+    digest = store.put(html)
+
+    path = store.path(digest)
+    assert path.relative_to(tmp_path).parts == (digest[:2], digest[2:4], digest)
+    assert path.stat().st_size < len(html.encode()) / 3
+    assert store.get(digest) == html
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(StorageSettings(blob_dir=str(tmp_path)))
+
+    first = store.put("<p>pagina</p>")
+    second = store.put("<p>pagina</p>")
+    other = store.put("<p>andere pagina</p>")
+
+    assert first == second != other
+    assert store.stats.writes == 2
+    assert store.stats.deduplicated == 1
+    assert {digest for digest, _ in store.blobs()} == {first, other}
+
+
+def test_reused_blob_is_touched(tmp_path):
+    store = BlobStore(StorageSettings(blob_dir=str(tmp_path)))
+    digest = store.put("<p>pagina</p>")
+    os.utime(store.path(digest), (0, 0))
+
+    store.put("<p>pagina</p>")
+
+    assert store.path(digest).stat().st_mtime > 0
+
+
+def test_blob_removed_before_reuse_is_written_again(tmp_path, monkeypatch):
+    store = BlobStore(StorageSettings(blob_dir=str(tmp_path)))
+    digest = store.put("<p>pagina</p>")
+    utime = os.utime
+
+    def collect_then_utime(path, *args, **kwargs):
+        # The garbage collection removes the blob right before it is reused.
+        store.delete(digest)
+        utime(path, *args, **kwargs)
+
+    monkeypatch.setattr(os, "utime", collect_then_utime)
+    assert store.put("<p>pagina</p>") == digest
+
+    assert store.get(digest) == "<p>pagina</p>"
+    assert store.stats.writes == 2
+
+
+def test_decode_legacy_content():
+    assert decode_legacy_content("<p>tekst</p>") == "<p>tekst</p>"
+    assert decode_legacy_content(b"<p>tekst</p>") == "<p>tekst</p>"
+    assert decode_legacy_content(zstandard.compress(b"<p>tekst</p>")) == "<p>tekst</p>"
@@ -0,0 +1,35 @@
+from aanvraagapp.config import BoilerplateSettings
+from aanvraagapp.parsing.boilerplate import learn_boilerplate
+from aanvraagapp.parsing.clean import clean_html
+
+COOKIE_BANNER = "<div class='cookies'><p>Wij gebruiken cookies om deze website goed te laten werken.</p></div>"
+RELATED = "<ul><li><a href='/a'>Innovatiekrediet voor innovatieve ondernemers</a></li><li><a href='/b'>WBSO</a></li></ul>"
+
+
+def page(i: int) -> str:
+    return (
+        f"<html><body>{COOKIE_BANNER}<main><h1>Regeling {i}</h1>"
+        f"<div>Laatst gecontroleerd op:</div><div>{i} september 2025</div>"
+        f"<p>Deze regeling nummer {i} ondersteunt ondernemers met een subsidie voor hun project.</p>"
+        f"</main>{RELATED}</body></html>"
+    )
+
+
+def test_repeated_blocks_are_dropped():
+    pages = [page(i) for i in range(4)]
+
+    boilerplate = frozenset(learn_boilerplate(pages, BoilerplateSettings()))
+    cleaned = clean_html(page(7), boilerplate=boilerplate)
+
+    assert "cookies" not in cleaned
+    assert "Innovatiekrediet" not in cleaned
+    # Page specific content and short labels stay.
+    assert "Regeling 7" in cleaned
+    assert "Laatst gecontroleerd op:" in cleaned
+    assert "regeling nummer 7" in cleaned
+
+
+def test_too_few_pages_learn_nothing():
+    pages = [page(i) for i in range(2)]
+
+    assert learn_boilerplate(pages, BoilerplateSettings()) == []
@@ -0,0 +1,73 @@
+from aanvraagapp.config import ChunkingSettings
+from aanvraagapp.parsing.chunking import MarkdownChunk, chunk_content_hash, chunk_markdown, diff_chunks, split_sections, split_text
+from aanvraagapp.parsing.rate_limit import estimate_tokens
+
+CONFIG = ChunkingSettings(target_tokens=50, max_tokens=80, overlap_tokens=15, min_tokens=10)
+
+
+def sentence(i: int) -> str:
+    return f"Dit is zin nummer {i} over de subsidieregeling."
+
+
+def test_sections_keep_headers_and_header_path():
+    markdown = "intro\n# Regeling\ntekst\n## Voorwaarden\nmeer\n### Detail\nnog\n```\n# geen kop\n```\n## Aanvragen\neind"
+
+    sections = split_sections(markdown, header_levels=2)
+
+    assert [s.header_path for s in sections] == [
+        (),
+        ("Regeling",),
+        ("Regeling", "Voorwaarden"),
+        ("Regeling", "Aanvragen"),
+    ]
+    assert sections[2].text == "## Voorwaarden\nmeer\n### Detail\nnog\n```\n# geen kop\n```"
+
+
+def test_long_sections_are_split_within_max_tokens_with_overlap():
+    paragraph = " ".join(sentence(i) for i in range(40))
+    markdown = f"# Regeling\n\n{paragraph}"
+
+    chunks = chunk_markdown(markdown, CONFIG)
+
+    assert len(chunks) > 1
+    assert all(c.tokens <= CONFIG.max_tokens for c in chunks)
+    assert all(c.header_path == ("Regeling",) for c in chunks)
+    # The header is not a chunk of its own.
+    assert chunks[0].text.startswith("# Regeling\n\nDit is zin nummer 0")
+    # The last sentence of a chunk starts the next one.
+    last_sentence = chunks[1].text.split(". ")[-1]
+    assert chunks[2].text.startswith(last_sentence)
+
+
+def test_small_sections_are_merged():
+    markdown = "# Regeling\n## Doel\nKort.\n## Budget\nOok kort."
+
+    chunks = chunk_markdown(markdown, CONFIG)
+
+    assert len(chunks) == 1
+    assert chunks[0].header_path == ("Regeling",)
+    assert "Ook kort." in chunks[0].text
+
+
+def test_words_longer_than_max_tokens_are_cut():
+    pieces = split_text("x" * 1000, CONFIG)
+
+    assert all(estimate_tokens(p) <= CONFIG.max_tokens for p in pieces)
+    assert "".join(pieces) == "x" * 1000
+
+
+def test_diff_keeps_unchanged_chunks_and_embeds_only_changes():
+    stored = [(i, MarkdownChunk(text, ()).content_hash) for i, text in enumerate(["a", "b", "c"])]
+    new = [MarkdownChunk(text, ("Kop",)) for text in ["b", "a", "d", "b ", "d"]]
+
+    diff = diff_chunks(new, stored)
+
+    assert [(chunk_id, chunk.text) for chunk_id, chunk in diff.kept] == [(1, "b"), (0, "a")]
+    assert [chunk.text for chunk in diff.added] == ["d"]
+    assert diff.removed == [2]
+
+
+def test_content_hash_ignores_whitespace_and_unicode_form():
+    assert chunk_content_hash("Subsidie  voor\n\ninnovatie ") == chunk_content_hash("Subsidie voor innovatie")
+    assert chunk_content_hash("caf\u00e9") == chunk_content_hash("cafe\u0301")
+    assert chunk_content_hash("Subsidie") != chunk_content_hash("subsidie")
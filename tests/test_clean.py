@@ -0,0 +1,74 @@
+import re
+from pathlib import Path
+
+import pytest
+from lxml import etree
+from lxml import html as lxml_html
+
+from aanvraagapp.parsing.clean import clean_html, clean_html_bs4, compact_html
+from aanvraagapp.parsing.rate_limit import estimate_tokens
+
+DATA_DIR = Path(__file__).parent / "data"
+
+
+def dom_signature(html: str):
+    """The elements with their attributes, and the text, ignoring formatting whitespace."""
+    root = etree.fromstring(html.encode(), lxml_html.HTMLParser(encoding="utf-8"))
+    elements = [
+        (e.tag, sorted(e.attrib.items())) for e in root.iter() if isinstance(e.tag, str)
+    ]
+    text = re.sub(r"\s+", " ", " ".join(root.itertext())).strip()
+    return elements, text
+
+
+@pytest.mark.parametrize("name", ["html_content.txt", "cleaned_html.txt"])
+@pytest.mark.parametrize("extract_main", [False, True])
+def test_equivalent_to_bs4_cleaner(name, extract_main):
+    html = (DATA_DIR / name).read_text()
+
+    assert dom_signature(clean_html(html, extract_main)) == dom_signature(
+        clean_html_bs4(html, extract_main)
+    )
+
+
+def test_removes_non_content():
+    html = """<html><head><script>x()</script></head><body>
+    <nav>menu</nav><!-- comment -->
+    <p class="a" data-id="1" title="keep">Text <b>bold</b></p>
+    <img src="a.png" alt="A" width="10">
+    </body></html>"""
+
+    cleaned = clean_html(html)
+
+    assert "x()" not in cleaned
+    assert "menu" not in cleaned
+    assert "comment" not in cleaned
+    assert '<p title="keep">Text <b>bold</b></p>' in cleaned
+    assert '<img src="a.png" alt="A">' in cleaned
+
+
+def test_compact_html_keeps_text_and_halves_tokens():
+    html = (DATA_DIR / "cleaned_html.txt").read_text()
+    cleaned = clean_html(html)
+
+    compacted = compact_html(cleaned)
+
+    _, cleaned_text = dom_signature(cleaned)
+    _, compacted_text = dom_signature(compacted)
+    assert compacted_text == cleaned_text
+    # Against what went into the rewrite prompt before, prettified HTML.
+    assert estimate_tokens(clean_html_bs4(html)) >= 2 * estimate_tokens(compacted)
+
+
+def test_compact_html():
+    html = (
+        '<html><body><div><div><span>Intro</span></div><p aria-level="3"> a  <b></b>b </p>'
+        '<img src="x.svg" alt=""><table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>'
+        '</div></body></html>'
+    )
+
+    assert compact_html(html) == (
+        '<html><body><div>Intro</div><p> a b </p>'
+        '<table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table></body></html>'
+    )
+    assert '<table>\nA | B\n1 | 2\n</table>' in compact_html(html, compact_tables=True)
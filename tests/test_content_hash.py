@@ -0,0 +1,41 @@
+from aanvraagapp.config import settings
+from aanvraagapp.parsing import parsing
+from aanvraagapp.parsing.content_hash import html_content_hash, stage_input_hash
+
+
+def test_volatile_fragments_do_not_change_the_hash():
+    first = """
+    <html><head><script nonce="abc">var t = 1;</script>
+    <link href="/style.css?v=123"></head>
+    <body><!-- rendered 2025-10-01T10:00:00Z --><p>Deadline 1 oktober 2025</p>
+    <input type="hidden" name="csrf_token" value="x1"></body></html>
+    """
+    second = """
+    <html><head><script nonce="def">var t = 2;</script>
+    <link href="/style.css?v=456"></head>
+    <body><!-- rendered 2025-10-02T11:00:00Z -->  <p>Deadline 1 oktober 2025</p>
+    <input type="hidden" name="csrf_token" value="y2"></body></html>
+    """
+
+    assert html_content_hash(first) == html_content_hash(second)
+    assert html_content_hash(first) != html_content_hash(
+        first.replace("1 oktober 2025", "2 oktober 2025")
+    )
+
+
+def test_stage_input_hash_separates_parts():
+    assert stage_input_hash("ab", "c") != stage_input_hash("a", "bc")
+    assert stage_input_hash("v1", None) == stage_input_hash("v1", "")
+
+
+def test_markdown_input_hash_includes_prompt_and_settings(monkeypatch):
+    html = "<main><p>Deadline 1 oktober 2025</p></main>"
+    before = parsing.markdown_input_hash("rewrite_subsidy_in_md.jinja", html)
+    assert parsing.markdown_input_hash("rewrite_client_in_md.jinja", html) != before
+
+    monkeypatch.setattr(parsing, "get_template_version", lambda name: "changed")
+    assert parsing.markdown_input_hash("rewrite_subsidy_in_md.jinja", html) != before
+    monkeypatch.undo()
+
+    monkeypatch.setattr(settings.markdown_conversion, "fast_path", False)
+    assert parsing.markdown_input_hash("rewrite_subsidy_in_md.jinja", html) != before
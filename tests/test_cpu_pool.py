@@ -0,0 +1,32 @@
+import asyncio
+
+from aanvraagapp.config import ChunkingSettings, CPUPoolSettings
+from aanvraagapp.parsing.chunking import MarkdownChunk, chunk_markdown
+from aanvraagapp.parsing.cpu_pool import CPUPool
+
+
+async def test_small_inputs_run_inline():
+    pool = CPUPool(CPUPoolSettings(min_input_size=1000))
+
+    result = await pool.run(chunk_markdown, "# A\ntext", ChunkingSettings(), input_size=8)
+
+    assert result == [MarkdownChunk("# A\ntext", ("A",))]
+    assert pool.stats.inline == 1
+    assert pool.stats.submitted == 0
+    await pool.aclose()
+
+
+async def test_runs_in_worker_processes_and_tracks_queue_depth():
+    pool = CPUPool(CPUPoolSettings(max_workers=2, start_method="fork", min_input_size=0))
+    markdown = "# A\none\n## B\ntwo"
+    config = ChunkingSettings(min_tokens=1)
+
+    results = await asyncio.gather(
+        *[pool.run(chunk_markdown, markdown, config, input_size=len(markdown)) for _ in range(4)]
+    )
+
+    assert results == [[MarkdownChunk("# A\none", ("A",)), MarkdownChunk("## B\ntwo", ("A", "B"))]] * 4
+    assert pool.stats.completed == 4
+    assert pool.stats.max_queue_depth == 4
+    assert pool.stats.queue_depth == 0
+    await pool.aclose()
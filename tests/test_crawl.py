@@ -0,0 +1,141 @@
+import httpx
+
+from aanvraagapp import models
+from aanvraagapp.config import CrawlSettings, FetchSettings
+from aanvraagapp.parsing import parsing
+from aanvraagapp.parsing.crawl import Crawler, extract_links, normalize_url
+from aanvraagapp.parsing.fetch import WebpageFetcher
+
+SITE = {
+    "/robots.txt": "User-agent: *\nDisallow: /regeling/privé\nSitemap: https://example.nl/sitemap.xml",
+    "/sitemap.xml": (
+        '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>https://example.nl/regeling/uit-sitemap</loc></url>"
+        "<url><loc>https://example.nl/nieuws</loc></url></urlset>"
+    ),
+    "/regeling": (
+        '<a href="/regeling/voorwaarden/">Voorwaarden</a><a href="voorwaarden#budget">Budget</a>'
+        '<a href="/regeling/privé">Privé</a><a href="/contact">Contact</a>'
+        '<a href="https://other.nl/regeling/x">Elders</a><a href="/regeling/folder.pdf">Folder</a>'
+    ),
+    "/regeling/voorwaarden": '<a href="/regeling/voorwaarden/details?utm_source=x">Details</a>',
+    "/regeling/voorwaarden/details": '<a href="/regeling/voorwaarden/details/meer">Meer</a>',
+    "/regeling/uit-sitemap": "<p>Uit de sitemap</p>",
+}
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    content = SITE.get(request.url.path.rstrip("/"))
+    if content is None:
+        return httpx.Response(404)
+    return httpx.Response(200, text=content)
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.nl:443/a/?b=2&utm_source=x&a=1#top") == "https://example.nl/a?a=1&b=2"
+    assert normalize_url("../b", "https://example.nl/a/c") == "https://example.nl/b"
+    assert normalize_url("mailto:info@example.nl") is None
+
+
+def test_extract_links_deduplicates():
+    links = extract_links(SITE["/regeling"], "https://example.nl/regeling")
+
+    assert links[0] == "https://example.nl/regeling/voorwaarden"
+    assert links.count("https://example.nl/regeling/voorwaarden") == 1
+    assert "https://example.nl/regeling/folder.pdf" not in links
+
+
+async def test_crawl_stays_in_scope_and_depth():
+    fetcher = WebpageFetcher(FetchSettings())
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    crawler = Crawler(CrawlSettings(max_depth=2, delay_seconds=0), fetcher)
+
+    async def visit(url: str) -> str | None:
+        return (await fetcher.fetch(url)).content
+
+    visited = await crawler.crawl("https://example.nl/regeling/", visit)
+
+    assert visited == [
+        "https://example.nl/regeling/",
+        "https://example.nl/regeling/voorwaarden",
+        "https://example.nl/regeling/uit-sitemap",
+        "https://example.nl/regeling/voorwaarden/details",
+    ]
+    assert crawler.stats.skipped_by_robots == 1
+    await fetcher.aclose()
+
+
+async def test_crawl_max_pages():
+    fetcher = WebpageFetcher(FetchSettings())
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    crawler = Crawler(CrawlSettings(max_pages=2, delay_seconds=0, use_sitemaps=False), fetcher)
+
+    async def visit(url: str) -> str | None:
+        return (await fetcher.fetch(url)).content
+
+    visited = await crawler.crawl("https://example.nl/regeling", visit)
+
+    assert visited == ["https://example.nl/regeling", "https://example.nl/regeling/voorwaarden"]
+    await fetcher.aclose()
+
+
+class StoredWebpages:
+    """Session stand-in that only answers the select of the stored webpages."""
+
+    def __init__(self, webpages: list[models.Webpage]):
+        self.webpages = webpages
+
+    async def execute(self, stmt):
+        return self
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.webpages
+
+
+async def test_crawl_webpages_deletes_only_gone_or_out_of_scope_pages(monkeypatch):
+    site = {
+        "/regeling": '<a href="/regeling/weg">Weg</a><a href="/regeling/a">A</a><a href="/regeling/b">B</a>',
+        "/regeling/a": "<p>A</p>",
+        "/regeling/b": "<p>B</p>",
+    }
+
+    def site_handler(request: httpx.Request) -> httpx.Response:
+        content = site.get(request.url.path)
+        return httpx.Response(404) if content is None else httpx.Response(200, text=content)
+
+    fetcher = WebpageFetcher(FetchSettings())
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(site_handler))
+    settings = CrawlSettings(max_pages=3, delay_seconds=0, use_sitemaps=False)
+    monkeypatch.setattr(parsing, "create_crawler", lambda: Crawler(settings, fetcher))
+
+    async def parse(page_url, prompt_name, webpage, boilerplate):
+        return parsing.ParsedWebpage(await fetcher.fetch(page_url))
+
+    async def store(owner_type, owner_id, page_url, webpage, parsed, session):
+        return page_url
+
+    deleted: list[str] = []
+
+    async def delete_webpages(webpages, session):
+        deleted.extend(webpage.url for webpage in webpages)
+
+    monkeypatch.setattr(parsing, "clean_and_parse_into_md", parse)
+    monkeypatch.setattr(parsing, "store_parsed_webpage", store)
+    monkeypatch.setattr(parsing, "delete_webpages", delete_webpages)
+
+    stored = [
+        models.Webpage(url=f"https://example.nl{path}")
+        for path in ("/regeling", "/regeling/weg", "/regeling/b", "/contact")
+    ]
+    crawled = await parsing.crawl_webpages(
+        models.WebpageOwnerType.LISTING, 1, "https://example.nl/regeling", "rewrite_subsidy_in_md.jinja",
+        StoredWebpages(stored),
+    )
+
+    # The page limit cuts off /regeling/b, which is kept for the next crawl.
+    assert crawled == ["https://example.nl/regeling", "https://example.nl/regeling/a"]
+    assert deleted == ["https://example.nl/regeling/weg", "https://example.nl/contact"]
+    await fetcher.aclose()
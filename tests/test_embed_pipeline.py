@@ -0,0 +1,54 @@
+import asyncio
+
+import numpy as np
+
+from aanvraagapp.config import ChunkEmbeddingSettings
+from aanvraagapp.parsing import embed_pipeline
+from aanvraagapp.parsing.embed_pipeline import EmbeddingPipeline
+
+
+class StubEmbedder:
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def embed_content(self, texts):
+        self.batches.append(texts)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return np.array([[int(t)] for t in texts], dtype=np.float32)
+
+
+async def test_batches_run_concurrently_and_keep_order(monkeypatch):
+    stub = StubEmbedder()
+    monkeypatch.setattr(embed_pipeline, "ai_router", stub)
+    pipeline = EmbeddingPipeline(ChunkEmbeddingSettings(batch_size=3, max_concurrent_batches=2))
+
+    texts = [str(i) for i in range(10)]
+    embeddings, throughput = await pipeline.embed(texts)
+
+    assert [int(e[0]) for e in embeddings] == list(range(10))
+    assert [len(b) for b in stub.batches] == [3, 3, 3, 1]
+    assert stub.max_in_flight == 2
+    assert throughput.chunks == 10 and throughput.batches == 4
+    await pipeline.aclose()
+
+
+async def test_concurrency_is_shared_between_callers(monkeypatch):
+    stub = StubEmbedder()
+    monkeypatch.setattr(embed_pipeline, "ai_router", stub)
+    pipeline = EmbeddingPipeline(ChunkEmbeddingSettings(batch_size=1, max_concurrent_batches=3))
+
+    await asyncio.gather(*(pipeline.embed([str(i), str(i)]) for i in range(4)))
+
+    assert stub.max_in_flight == 3
+    assert pipeline.stats.chunks == 8
+    await pipeline.aclose()
+
+
+def test_batch_size_is_capped_at_provider_maximum():
+    pipeline = EmbeddingPipeline(ChunkEmbeddingSettings(batch_size=1000))
+    assert pipeline.batch_size == 100
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import numpy as np
+
+from aanvraagapp.parsing.ai_client import AIClient, MicroBatchingAIClient
+
+
+class CountingAIClient(AIClient):
+    default_generate_model = "test-generate"
+    default_embed_model = "test-embed"
+
+    def __init__(self):
+        super().__init__()
+        self.calls: list[list[str]] = []
+
+    async def generate_content(self, prompt, model=None, output_schema=None):
+        return prompt
+
+    async def embed_content(self, texts, model=None):
+        self.calls.append(texts)
+        if "fail" in texts:
+            raise ValueError("invalid input")
+        if "down" in texts:
+            raise httpx.ConnectError("backend down")
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+    async def embed_query(self, query, model=None):
+        return (await self.embed_queries([query], model))[0]
+
+    async def embed_queries(self, queries, model=None):
+        self.calls.append(queries)
+        return np.array([[len(q), i] for i, q in enumerate(queries)], dtype=np.float32)
+
+
+async def test_concurrent_queries_are_merged_into_one_call():
+    inner = CountingAIClient()
+    client = MicroBatchingAIClient(inner, window_ms=10, max_batch_size=100)
+
+    results = await asyncio.gather(*[client.embed_query("q" * n) for n in range(1, 6)])
+
+    assert inner.calls == [["q", "qq", "qqq", "qqqq", "qqqqq"]]
+    assert [r[0] for r in results] == [1, 2, 3, 4, 5]
+    await client.aclose()
+
+
+async def test_batches_are_split_at_max_batch_size():
+    inner = CountingAIClient()
+    client = MicroBatchingAIClient(inner, window_ms=1000, max_batch_size=3)
+
+    results = await asyncio.gather(
+        client.embed_content(["a", "bb"]),
+        client.embed_content(["ccc"]),
+        client.embed_content(["dddd"]),
+    )
+
+    # The full batch is sent right away, without waiting for the window.
+    assert inner.calls[0] == ["a", "bb", "ccc"]
+    assert [r[:, 0].tolist() for r in results] == [[1, 2], [3], [4]]
+    await client.aclose()
+
+
+async def test_errors_are_returned_to_the_failing_caller_only():
+    inner = CountingAIClient()
+    client = MicroBatchingAIClient(inner, window_ms=10, max_batch_size=100)
+
+    ok, failed = await asyncio.gather(
+        client.embed_content(["ok"]),
+        client.embed_content(["fail"]),
+        return_exceptions=True,
+    )
+
+    # The merged batch fails, and each request is retried on its own.
+    assert inner.calls == [["ok", "fail"], ["ok"], ["fail"]]
+    assert ok[:, 0].tolist() == [2]
+    assert isinstance(failed, ValueError)
+    await client.aclose()
+
+
+async def test_backend_failures_are_not_retried_per_request():
+    inner = CountingAIClient()
+    client = MicroBatchingAIClient(inner, window_ms=10, max_batch_size=100)
+
+    results = await asyncio.gather(
+        client.embed_content(["ok"]),
+        client.embed_content(["down"]),
+        return_exceptions=True,
+    )
+
+    assert inner.calls == [["ok", "down"]]
+    assert all(isinstance(r, httpx.ConnectError) for r in results)
+    await client.aclose()
@@ -0,0 +1,29 @@
+import numpy as np
+
+from aanvraagapp.config import settings
+from aanvraagapp.parsing.embedding_cache import EmbeddingCache
+
+
+async def test_embedding_cache_dedups_and_reuses_embeddings(monkeypatch):
+    monkeypatch.setattr(settings.ai_cache, "backend", "none")
+    cache = EmbeddingCache(max_memory_entries=10)
+    calls: list[list[str]] = []
+
+    async def embed_missing(texts: list[str]) -> np.ndarray:
+        calls.append(texts)
+        return np.array([[len(t), 1.0, 0.5] for t in texts], dtype=np.float32)
+
+    first = await cache.embed(["a", "bb", "a"], "model", "RETRIEVAL_DOCUMENT", 3, embed_missing)
+    assert calls == [["a", "bb"]]
+    assert first.shape == (3, 3)
+    np.testing.assert_array_equal(first[0], first[2])
+
+    second = await cache.embed(["bb", "ccc"], "model", "RETRIEVAL_DOCUMENT", 3, embed_missing)
+    assert calls[-1] == ["ccc"]
+    np.testing.assert_array_equal(second[0], first[1])
+
+    # Task type is part of the key.
+    await cache.embed(["bb"], "model", "RETRIEVAL_QUERY", 3, embed_missing)
+    assert calls[-1] == ["bb"]
+    assert cache.stats.hits == 1
+    assert cache.deduplicated == 1
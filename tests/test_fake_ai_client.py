@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from aanvraagapp.config import FakeAISettings, FakeLatencySettings
+from aanvraagapp.parsing.ai_client import FakeAIClient, FakeAIError
+from aanvraagapp.parsing.structured_outputs import (
+    ClientFieldData,
+    ClientListingMatchResult,
+    ListingFieldData,
+)
+
+
+async def test_embeddings_are_deterministic_unit_vectors():
+    client = FakeAIClient(FakeAISettings())
+
+    embeddings = await client.embed_content(["a", "b", "a"])
+
+    assert embeddings.shape == (3, 768)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    assert np.array_equal(embeddings[0], embeddings[2])
+    assert not np.array_equal(embeddings[0], embeddings[1])
+    assert np.array_equal(await FakeAIClient(FakeAISettings()).embed_query("a"), embeddings[0])
+
+
+@pytest.mark.parametrize("schema", [ListingFieldData, ClientFieldData, ClientListingMatchResult])
+async def test_structured_outputs_are_schema_valid(schema):
+    client = FakeAIClient(FakeAISettings())
+
+    response = await client.generate_content("prompt", output_schema=schema)
+
+    schema.model_validate_json(response)
+    assert response == await client.generate_content("prompt", output_schema=schema)
+
+
+async def test_injected_errors_and_latency():
+    client = FakeAIClient(
+        FakeAISettings(
+            error_rate=1.0,
+            generate_latency=FakeLatencySettings(distribution="fixed", median_ms=1),
+        )
+    )
+
+    with pytest.raises(FakeAIError):
+        await client.generate_content("prompt")
+    assert client.stats.errors == 1
@@ -0,0 +1,34 @@
+import httpx
+
+from aanvraagapp.config import FetchSettings
+from aanvraagapp.parsing.fetch import WebpageFetcher
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.headers.get("if-none-match") == '"v1"':
+        return httpx.Response(304)
+    return httpx.Response(
+        200,
+        text="<html>page</html>",
+        headers={"ETag": '"v1"', "Last-Modified": "Wed, 01 Oct 2025 10:00:00 GMT"},
+    )
+
+
+async def test_conditional_fetch_returns_not_modified():
+    fetcher = WebpageFetcher(FetchSettings())
+    fetcher._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    first = await fetcher.fetch("https://www.rvo.nl/page")
+    assert first.content == "<html>page</html>"
+    assert first.etag == '"v1"'
+
+    second = await fetcher.fetch(
+        "https://www.rvo.nl/page", etag=first.etag, last_modified=first.last_modified
+    )
+    assert second.not_modified
+    assert second.content is None
+    # Validators that are missing from the 304 are kept.
+    assert second.last_modified == first.last_modified
+    assert fetcher.stats.not_modified == 1
+
+    await fetcher.aclose()
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from aanvraagapp.config import MarkdownConversionSettings
+from aanvraagapp.parsing.clean import clean_html
+from aanvraagapp.parsing.markdown import convert_html_to_markdown
+
+DATA_DIR = Path(__file__).parent / "data"
+CONFIG = MarkdownConversionSettings()
+
+
+def test_rvo_page_passes_fast_path():
+    cleaned_html = clean_html((DATA_DIR / "html_content.txt").read_text())
+
+    markdown, quality = convert_html_to_markdown(cleaned_html, CONFIG)
+
+    assert quality.passed, quality.problems
+    assert "# Eurostars: subsidie internationale marktgerichte R&D" in markdown
+    assert "\n## Budget\n" in markdown
+    assert "*   mkb: 50%" in markdown
+    # Links are kept verbatim.
+    assert "[eHerkenning](https://www.eherkenning.nl/nl/eherkenning-gebruiken)" in markdown
+
+
+def test_inline_markup_lists_and_tables():
+    html = """<html><body><main>
+    <h1>Title</h1>
+    <p>Some <strong>bold</strong> and <em>italic</em> text.<br>Next line.</p>
+    <ol><li>First</li><li>Second<ul><li>Nested</li></ul></li></ol>
+    <table><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></table>
+    <button>Menu</button>
+    </main></body></html>"""
+
+    markdown, _ = convert_html_to_markdown(html, CONFIG)
+
+    assert markdown == (
+        "# Title\n\n"
+        "Some **bold** and *italic* text.\nNext line.\n\n"
+        "1. First\n2. Second\n   *   Nested\n\n"
+        "| A | B |\n|---|---|\n| 1 | 2 |"
+    )
+
+
+def test_poor_structure_falls_back():
+    html = "<html><body><div><a href='/a'>Home</a> <a href='/b'>Contact</a></div></body></html>"
+
+    _, quality = convert_html_to_markdown(html, CONFIG)
+
+    assert not quality.passed
+    assert len(quality.problems) >= 3
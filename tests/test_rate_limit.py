@@ -0,0 +1,64 @@
+import pytest
+from google.genai import errors as genai_errors
+
+from aanvraagapp.config import AIRateLimitSettings
+from aanvraagapp.parsing.rate_limit import RateLimiter, retry_after_seconds
+
+
+def _throttled(retry_delay: str = "0s"):
+    return genai_errors.ClientError(
+        429,
+        {
+            "error": {
+                "code": 429,
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"retryDelay": retry_delay}],
+            }
+        },
+    )
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(_throttled("12s")) == 12.0
+    assert retry_after_seconds(genai_errors.ClientError(400, {"error": {}})) is None
+    assert retry_after_seconds(ValueError("nope")) is None
+
+
+async def test_rate_limiter_retries_and_backs_off_on_throttling():
+    limiter = RateLimiter(
+        AIRateLimitSettings(max_retries=3, base_backoff_seconds=0.001, max_backoff_seconds=0.01)
+    )
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise _throttled()
+        return "ok"
+
+    assert await limiter.call("gemini-2.5-flash", 10, request) == "ok"
+    model_limiter = limiter.for_model("gemini-2.5-flash")
+    assert model_limiter.stats.retries == 2
+    assert model_limiter.factor < 1.0
+
+
+async def test_rate_limiter_gives_up_after_max_retries():
+    limiter = RateLimiter(AIRateLimitSettings(max_retries=1, base_backoff_seconds=0.001))
+
+    async def request():
+        raise _throttled()
+
+    with pytest.raises(genai_errors.ClientError):
+        await limiter.call("gemini-2.5-flash", 10, request)
+
+
+async def test_saturated_only_while_backing_off():
+    limiter = RateLimiter(AIRateLimitSettings(max_in_flight=1))
+    limiter.for_model("flash")
+
+    async with limiter.in_flight:
+        assert not limiter.is_saturated("flash")
+
+    limiter.for_model("flash").on_throttled(60)
+    assert limiter.is_saturated("flash")
@@ -0,0 +1,103 @@
+import numpy as np
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from aanvraagapp import models
+from aanvraagapp.models import Chunk
+from aanvraagapp.parsing.ai_client import normalize_embeddings
+from aanvraagapp.parsing.retrieval import enable_iterative_index_scan, rank_chunks_by_similarity, truncate_embedding
+
+
+def test_normalize_embeddings_per_row():
+    embeddings = np.array([[3.0, 4.0], [1.0, 0.0], [0.0, 0.0]], dtype=np.float32)
+
+    normalized = normalize_embeddings(embeddings)
+
+    assert np.allclose(normalized[0], [0.6, 0.8])
+    assert np.allclose(normalized[1], [1.0, 0.0])
+    assert np.allclose(normalized[2], [0.0, 0.0])
+
+
+def test_truncate_embedding_is_unit_length():
+    embedding = normalize_embeddings(np.arange(1, 769, dtype=np.float32))
+
+    short = truncate_embedding(embedding, 256)
+
+    assert short.shape == (256,)
+    assert np.isclose(np.linalg.norm(short), 1.0)
+
+
+def test_two_stage_search_reranks_coarse_candidates():
+    query = normalize_embeddings(np.ones(768, dtype=np.float32))
+    stmt = rank_chunks_by_similarity(select(Chunk.content).select_from(Chunk), query, 5)
+
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert "chunk.emb <=>" in sql
+    # The coarse pass is an ORDER BY ... LIMIT on the short embeddings, which the HNSW index can answer.
+    assert "ORDER BY chunk.emb_short <=>" in sql
+    assert "GROUP BY" not in sql
+
+
+async def _add_pages_with_chunks(session: AsyncSession, sizes: list[int]) -> tuple[list[models.Webpage], np.ndarray]:
+    rng = np.random.default_rng(0)
+    pages = [
+        models.Webpage(owner_type=models.WebpageOwnerType.LISTING, owner_id=0, url=f"https://example.com/{i}")
+        for i in range(len(sizes))
+    ]
+    session.add_all(pages)
+    await session.flush()
+    embeddings = normalize_embeddings(rng.normal(size=(sum(sizes), 768)).astype(np.float32))
+    result = await session.execute(
+        insert(Chunk).returning(Chunk.id),
+        [{"content": f"chunk {i}", "content_hash": f"test-{i}", "emb": e} for i, e in enumerate(embeddings)],
+    )
+    chunk_ids = result.scalars().all()
+    owners = [page for page, size in zip(pages, sizes) for _ in range(size)]
+    await session.execute(
+        insert(models.webpage_chunk_association),
+        [
+            {"webpage_id": page.id, "chunk_id": chunk_id, "header_path": []}
+            for page, chunk_id in zip(owners, chunk_ids)
+        ],
+    )
+    return pages, embeddings
+
+
+def _page_chunks(page: models.Webpage):
+    return (
+        select(Chunk.content)
+        .join(models.webpage_chunk_association, models.webpage_chunk_association.c.chunk_id == Chunk.id)
+        .where(models.webpage_chunk_association.c.webpage_id == page.id)
+    )
+
+
+async def test_filtered_search_returns_limit_rows_in_order(basic_session: AsyncSession):
+    # One small page among many chunks of another page: an index scan that
+    # stops after ef_search rows of the whole table would find few or none
+    # of the small page's chunks.
+    sizes = [2000, 20]
+    pages, embeddings = await _add_pages_with_chunks(basic_session, sizes)
+    query = embeddings[0]
+
+    await enable_iterative_index_scan(basic_session)
+    result = await basic_session.execute(rank_chunks_by_similarity(_page_chunks(pages[1]), query, 10))
+
+    small_page = embeddings[sizes[0] :]
+    expected = np.argsort(-(small_page @ query))[:10]
+    assert result.scalars().all() == [f"chunk {sizes[0] + i}" for i in expected]
+    await basic_session.rollback()
+
+
+async def test_filtered_coarse_pass_uses_the_hnsw_index(basic_session: AsyncSession):
+    pages, embeddings = await _add_pages_with_chunks(basic_session, [2000, 20])
+    # The test table is too small for the planner to prefer the index on its own.
+    await basic_session.execute(text("SET LOCAL enable_seqscan = off"))
+
+    stmt = rank_chunks_by_similarity(_page_chunks(pages[1]), embeddings[0], 10)
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    plan = (await basic_session.execute(text(f"EXPLAIN {compiled}"))).scalars().all()
+
+    assert any("chunk_emb_short_hnsw" in line for line in plan)
+    await basic_session.rollback()
@@ -0,0 +1,151 @@
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from aanvraagapp.config import AIRouterSettings, ModelRouteSettings, TaskRouteSettings
+from aanvraagapp.parsing import router
+from aanvraagapp.parsing.ai_client import AIClient
+from aanvraagapp.parsing.router import ModelRouter
+from aanvraagapp.types import AITask
+
+
+class StubAIClient(AIClient):
+    default_generate_model = "stub"
+    default_embed_model = "stub"
+
+    def __init__(self, name: str, fail: bool = False, error: type[Exception] = httpx.ConnectError):
+        super().__init__()
+        self.name = name
+        self.fail = fail
+        self.error = error
+        self.calls: list[dict] = []
+
+    async def generate_content(self, prompt, model=None, output_schema=None, **options):
+        self.calls.append({"model": model, **options})
+        if self.fail:
+            raise self.error(f"{self.name} is down")
+        return f"{self.name}: {prompt}"
+
+    async def embed_content(self, texts, model=None):
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    async def embed_query(self, query, model=None):
+        return np.zeros(2, dtype=np.float32)
+
+
+def make_router(monkeypatch, gemini: StubAIClient, ollama: StubAIClient, **task_options):
+    clients = {"gemini": gemini, "ollama": ollama}
+    monkeypatch.setattr(router, "get_client", lambda provider: clients[provider])
+    config = AIRouterSettings(
+        tasks={
+            AITask.REWRITE_MARKDOWN: TaskRouteSettings(
+                candidates=[
+                    ModelRouteSettings(
+                        provider="gemini", model="flash", thinking_budget=0,
+                        cost_per_million_tokens=0.3,
+                    ),
+                    ModelRouteSettings(provider="ollama", model="local", context_size=8192),
+                ],
+                **task_options,
+            )
+        }
+    )
+    return ModelRouter(config)
+
+
+async def test_routes_to_first_candidate_with_its_options(monkeypatch):
+    gemini, ollama = StubAIClient("gemini"), StubAIClient("ollama")
+    ai_router = make_router(monkeypatch, gemini, ollama)
+
+    response, route = await ai_router.generate(AITask.REWRITE_MARKDOWN, "hi")
+
+    assert response == "gemini: hi"
+    assert route.model == "flash"
+    assert gemini.calls == [{"model": "flash", "thinking_budget": 0, "context_size": None}]
+
+
+async def test_fails_over_and_skips_failed_backend(monkeypatch):
+    gemini, ollama = StubAIClient("gemini", fail=True), StubAIClient("ollama")
+    ai_router = make_router(monkeypatch, gemini, ollama)
+
+    response, route = await ai_router.generate(AITask.REWRITE_MARKDOWN, "hi")
+    assert response == "ollama: hi"
+    assert ollama.calls == [{"model": "local", "thinking_budget": None, "context_size": 8192}]
+
+    # During the cooldown the failed backend is not tried first anymore.
+    await ai_router.generate(AITask.REWRITE_MARKDOWN, "again")
+    assert len(gemini.calls) == 1
+    assert ai_router.failovers == 1
+
+
+async def test_raises_when_all_backends_fail(monkeypatch):
+    gemini, ollama = StubAIClient("gemini", fail=True), StubAIClient("ollama", fail=True)
+    ai_router = make_router(monkeypatch, gemini, ollama)
+
+    with pytest.raises(httpx.ConnectError, match="ollama is down"):
+        await ai_router.generate(AITask.REWRITE_MARKDOWN, "hi")
+
+
+async def test_request_errors_do_not_fail_over(monkeypatch):
+    gemini, ollama = StubAIClient("gemini", fail=True, error=ValueError), StubAIClient("ollama")
+    ai_router = make_router(monkeypatch, gemini, ollama)
+
+    with pytest.raises(ValueError):
+        await ai_router.generate(AITask.REWRITE_MARKDOWN, "hi")
+
+    assert ollama.calls == []
+    assert ai_router.failovers == 0
+    assert ai_router.route(AITask.REWRITE_MARKDOWN).provider == "gemini"
+
+
+def test_backend_failures():
+    request = httpx.Request("POST", "https://example.com")
+    assert router.is_backend_failure(httpx.ReadTimeout("slow"))
+    assert router.is_backend_failure(ConnectionError("ollama is not running"))
+    assert router.is_backend_failure(
+        httpx.HTTPStatusError("busy", request=request, response=httpx.Response(503, request=request))
+    )
+    assert not router.is_backend_failure(
+        httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request))
+    )
+    assert not router.is_backend_failure(ValueError("invalid JSON"))
+
+
+async def test_slow_backend_is_skipped(monkeypatch):
+    gemini, ollama = StubAIClient("gemini"), StubAIClient("ollama")
+    ai_router = make_router(monkeypatch, gemini, ollama, max_latency_seconds=1.0)
+    gemini_route = ai_router.route(AITask.REWRITE_MARKDOWN)
+    for _ in range(20):
+        ai_router._record_success(gemini_route, 5.0)
+
+    assert ai_router.route(AITask.REWRITE_MARKDOWN).provider == "ollama"
+
+
+async def test_cost_preference_tries_cheapest_first(monkeypatch):
+    gemini, ollama = StubAIClient("gemini"), StubAIClient("ollama")
+    ai_router = make_router(monkeypatch, gemini, ollama, prefer="cost")
+
+    assert ai_router.route(AITask.REWRITE_MARKDOWN).provider == "ollama"
+
+
+async def test_slow_request_is_hedged(monkeypatch):
+    ai_router = make_router(monkeypatch, StubAIClient("gemini"), StubAIClient("ollama"))
+    ai_router.config.hedging = True
+    ai_router.config.hedge_min_samples = 1
+    ai_router.config.hedge_min_delay_seconds = 0.01
+    route = ai_router.route(AITask.REWRITE_MARKDOWN)
+    ai_router._record_success(route, 0.01)
+
+    attempts = 0
+
+    async def request():
+        nonlocal attempts
+        attempts += 1
+        # The first request hangs, the hedge answers right away.
+        await asyncio.sleep(10 if attempts == 1 else 0)
+        return attempts
+
+    assert await ai_router._hedged(request, ai_router.hedge_delay(route)) == 2
+    assert ai_router.hedges_won == 1
@@ -0,0 +1,36 @@
+import asyncio
+
+from aanvraagapp.parsing.single_flight import SingleFlight
+
+
+async def test_identical_calls_share_one_result():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*[flight.do("page", fetch) for _ in range(5)])
+
+    assert results == [1] * 5
+    assert flight.coalesced == 4
+    # Finished calls are not reused.
+    assert await flight.do("page", fetch) == 2
+
+
+async def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.create_task(flight.do("page", fetch))
+    second = asyncio.create_task(flight.do("page", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"